@@ -1,49 +1,104 @@
-from flask import Flask
+from flask import Flask, jsonify
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from flask_mail import Mail
-from dotenv import load_dotenv
+from sqlalchemy.orm.exc import StaleDataError
+from app.replicas import RoutingSession
+from app.json_provider import FastJSONProvider
 import os
 
 
-# Load environment variables
-load_dotenv()
+# ✅ No load_dotenv() here: `flask` loads .env itself, run.py and wsgi.py load it before importing us
 
 # Initialize extensions
-db = SQLAlchemy()
-migrate = Migrate()
-mail = Mail()
+db = SQLAlchemy(session_options={'class_': RoutingSession})  # ✅ Read-replica aware
 
 def create_app():
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)  # ✅ orjson when installed, stdlib otherwise
 
     # 🔹 Ensure environment variables are loaded
     database_url = os.getenv('DATABASE_URL')
     secret_key = os.getenv('SECRET_KEY')
-    mail_username = os.getenv('MAIL_USERNAME')
-    mail_password = os.getenv('MAIL_PASSWORD')
 
-    if not all([database_url, secret_key, mail_username, mail_password]):
+    if not all([database_url, secret_key]):
         raise ValueError("Missing required environment variables! Check your .env file.")
 
     # 🔹 Fix PostgreSQL database URL if needed
     if database_url.startswith("postgres://"):
         database_url = database_url.replace("postgres://", "postgresql://", 1)
 
+    # 🔹 Engine profile (pool sizing, timeouts, SQLite pragmas) from the selected config class
+    from app.config import config
+    from app.engine_tuning import engine_options, connection_settings, init_engine_tuning
+    profile = config.get(os.getenv('FLASK_CONFIG', 'default'))
+    if profile is None:
+        raise ValueError(f"Unknown FLASK_CONFIG! Use one of: {', '.join(config)}")
+
     # Configurations
     app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(database_url, profile)
+    app.config['DB_CONNECTION_SETTINGS'] = connection_settings(profile)
+    app.config['WORKER_PROCESSES'] = profile.DB_WORKERS  # WEB_CONCURRENCY; in-process backends need 1
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['SECRET_KEY'] = secret_key
-    app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-    app.config['MAIL_PORT'] = 587
-    app.config['MAIL_USE_TLS'] = True
-    app.config['MAIL_USERNAME'] = mail_username
-    app.config['MAIL_PASSWORD'] = mail_password
+    app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
+    app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 587))
+    app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', 'true').lower() == 'true'
+    app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')  # Only the outbox sender needs these
+    app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
+    app.config['PRINCIPAL_CACHE_TTL'] = int(os.getenv('PRINCIPAL_CACHE_TTL', 60))  # seconds; bounds how long other workers admit a deactivated user
+    app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256')
+    if os.getenv('PASSWORD_HASH_WORKERS'):
+        app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS'))
+    app.config['QUERY_BUDGET_MODE'] = os.getenv('QUERY_BUDGET_MODE', 'off')  # off | warn | strict
+    app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')  # Bearer token for /metrics; unset = disabled
+    app.config['FRONTEND_URL'] = os.getenv('FRONTEND_URL', 'http://localhost:3000')  # Links in outgoing mail
+    app.config['CHANGE_STREAM_BACKEND'] = os.getenv('CHANGE_STREAM_BACKEND', 'sqlite')  # sqlite | memory
+    app.config['CHANGE_STREAM_PATH'] = os.getenv('CHANGE_STREAM_PATH')  # sqlite backend, shared by workers
+    app.config['SSE_MAX_STREAMS'] = int(os.getenv('SSE_MAX_STREAMS', max(1, profile.DB_THREADS // 2)))  # per process; each holds a request thread
+    app.config['MAIL_OUTBOX_WORKER'] = os.getenv('MAIL_OUTBOX_WORKER', 'off')  # off (run `flask outbox run`) | thread
+    app.config['RESPONSE_CACHE_BACKEND'] = os.getenv('RESPONSE_CACHE_BACKEND', 'sqlite')  # sqlite | memory | off
+    app.config['RESPONSE_CACHE_PATH'] = os.getenv('RESPONSE_CACHE_PATH')  # sqlite backend, shared by workers
+    app.config['RESPONSE_CACHE_TTL'] = int(os.getenv('RESPONSE_CACHE_TTL', 300))  # seconds, even without writes
+    app.config['CORS_ORIGINS'] = [o.strip() for o in os.getenv('CORS_ORIGINS', 'http://localhost:3000').split(',') if o.strip()]
+    app.config['CORS_MAX_AGE'] = int(os.getenv('CORS_MAX_AGE', 7200))  # seconds browsers may cache a preflight
+
+    # 🔹 Optional read replicas, comma-separated
+    from app.replicas import replica_binds, init_replicas
+    replica_urls = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    replica_urls = [url.replace("postgres://", "postgresql://", 1) for url in replica_urls]
+    app.config['SQLALCHEMY_BINDS'] = replica_binds(replica_urls, lambda url: engine_options(url, profile))
+    app.config['REPLICA_READ_YOUR_WRITES_SECONDS'] = int(os.getenv('REPLICA_READ_YOUR_WRITES_SECONDS', 5))
 
     # Initialize extensions
     db.init_app(app)
-    migrate.init_app(app, db)
-    mail.init_app(app)
+    init_engine_tuning(app, db)
+    init_replicas(app, db)
+
+    # ✅ `flask db` loads Flask-Migrate/Alembic on use; serving never imports them
+    from app.startup import init_migrate, check_schema_command, init_db_command
+    init_migrate(app)
+    app.cli.add_command(check_schema_command)
+    app.cli.add_command(init_db_command)
+
+    # ✅ One CORS layer in front of everything: preflights never reach routing, auth or the DB
+    from app.cors import init_cors
+    init_cors(app)
+
+    # ✅ Per-request wall/DB time, SQL counts, Server-Timing and /metrics
+    from app.instrumentation import init_instrumentation
+    init_instrumentation(app)
+
+    # ✅ Per-endpoint SQL budgets and N+1 detection (warn in staging, strict under pytest)
+    from app.query_budget import init_query_budget
+    init_query_budget(app)
+
+    # ✅ Report/graph responses cached per data version (bumped by every product/store/supply write)
+    from app.response_cache import init_response_cache
+    init_response_cache(app)
+
+    # ✅ Committed stock/payment/supply changes pushed to /api/store/stream subscribers
+    from app.change_stream import init_change_stream
+    init_change_stream(app)
 
     # ✅ Register Blueprints (API Routes)
     from app.auth import auth_blueprint  
@@ -58,4 +113,50 @@ def create_app():
     from app.store_routes import store_bp  # ✅ Removed stock_bp
     app.register_blueprint(store_bp, url_prefix='/api/store')
 
+    from app.export_routes import export_bp
+    app.register_blueprint(export_bp, url_prefix='/api/export')
+
+    from app.supply_routes import supply_bp
+    app.register_blueprint(supply_bp, url_prefix='/api')
+
+    from app.product_routes import product_bp
+    app.register_blueprint(product_bp, url_prefix='/api')
+
+    from app.payment_stock_routes import payment_stock_bp
+    app.register_blueprint(payment_stock_bp, url_prefix='/api')
+
+    from app.user_routes import user_bp
+    app.register_blueprint(user_bp, url_prefix='/api')
+
+    # ✅ Optimistic concurrency: the row changed between our read and our write
+    @app.errorhandler(StaleDataError)
+    def handle_stale_data(error):
+        db.session.rollback()
+        return jsonify({"message": "Record was changed by someone else, reload and retry"}), 409
+
+    @app.errorhandler(404)
+    def not_found(error):
+        return jsonify({"message": "Resource not found"}), 404
+
+    @app.errorhandler(500)
+    def server_error(error):
+        return jsonify({"message": "Internal server error"}), 500
+
+    # ✅ Keep store_inventory_summary in step with product writes
+    from app.inventory_summary import inventory_summary_cli
+    app.cli.add_command(inventory_summary_cli)
+
+    from app.exports import export_command
+    app.cli.add_command(export_command)
+
+    from app.seeding import seed_command, seed_defaults_command
+    app.cli.add_command(seed_command)
+    app.cli.add_command(seed_defaults_command)
+
+    # ✅ Mail goes through the outbox: requests only insert a row, a worker does the SMTP
+    from app.mail_outbox import outbox_cli, init_background_sender
+    app.cli.add_command(outbox_cli)
+    if app.config['MAIL_OUTBOX_WORKER'] == 'thread':
+        init_background_sender(app)
+
     return app
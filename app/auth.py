@@ -1,37 +1,30 @@
-from flask import Blueprint, jsonify, request, current_app, make_response
+from flask import Blueprint, jsonify, request, current_app
 from functools import wraps
 import jwt
 from datetime import datetime, timedelta
-from werkzeug.security import generate_password_hash, check_password_hash
-from flask_mail import Message
-from flask_cors import CORS, cross_origin
-from app import db, mail
+from app import db
 from app.models import User
+from app.principal_cache import load_principal, principal_cache
+from app.password_hashing import password_hasher, HashingPoolBusy
+from app.pagination import wants_pagination, keyset_page
+from app.serializers import CLERK
+from app.mail_outbox import queue_mail
 
 # Define authentication Blueprint
 auth_blueprint = Blueprint("auth", __name__)
 
-# Enable CORS for all routes
-CORS(auth_blueprint, resources={r"/*": {"origins": "http://localhost:3000"}}, supports_credentials=True)
-
-# Handle OPTIONS preflight requests
-@auth_blueprint.route("/<path:path>", methods=["OPTIONS"])
-def handle_options(path):
-    response = make_response()
-    response.status_code = 200
-    response.headers["Access-Control-Allow-Origin"] = "http://localhost:3000"
-    response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
-    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, x-access-token"
-    response.headers["Access-Control-Allow-Credentials"] = "true"
+# Password hashing pool saturated: ask the client to back off
+@auth_blueprint.errorhandler(HashingPoolBusy)
+def handle_hashing_busy(error):
+    response = jsonify({"message": "Server is busy, please retry shortly"})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(error.retry_after)
     return response
 
 # Token authentication decorator
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        if request.method == "OPTIONS":
-            return make_response(), 200
-        
         token = request.headers.get("x-access-token") or request.headers.get("Authorization")
         if not token:
             return jsonify({"message": "Token is missing!"}), 401
@@ -41,9 +34,11 @@ def token_required(f):
 
         try:
             data = jwt.decode(token, current_app.config["SECRET_KEY"], algorithms=["HS256"])
-            current_user = User.query.get(data["user_id"])
+            current_user = load_principal(data["user_id"], token)
             if not current_user:
                 return jsonify({"message": "User not found!"}), 401
+            if not current_user.is_active:
+                return jsonify({"message": "Account is deactivated!"}), 403
         except jwt.ExpiredSignatureError:
             return jsonify({"message": "Token has expired!"}), 401
         except jwt.InvalidTokenError:
@@ -55,19 +50,23 @@ def token_required(f):
 # Fetch all Clerks (Only Admins & Merchants)
 @auth_blueprint.route('/clerks', methods=['GET'])
 @token_required
-@cross_origin(origin="http://localhost:3000", supports_credentials=True)
 def get_clerks(current_user):
     if current_user.role not in ['admin', 'merchant']:
         return jsonify({'message': 'Permission denied'}), 403
 
-    clerks = User.query.filter_by(role='clerk').all()
-    clerk_data = [{"id": c.id, "email": c.email, "store_id": c.store_id} for c in clerks]
+    query = User.query.filter_by(role='clerk')
+    if wants_pagination(request.args):
+        page, error = keyset_page(query, User.id, CLERK.fields, request.args)
+        if error:
+            return jsonify({'message': error}), 400
+        return jsonify(page), 200
+
+    clerk_data = CLERK.dump_many(query.with_entities(*CLERK.columns()))
     return jsonify(clerk_data), 200
 
 # Register an Admin
 @auth_blueprint.route("/register-admin", methods=["POST"])
 @token_required
-@cross_origin(origin="http://localhost:3000", supports_credentials=True)
 def register_admin(current_user):
     if current_user.role not in ["merchant", "admin"]:
         return jsonify({"message": "Permission denied!"}), 403
@@ -80,7 +79,7 @@ def register_admin(current_user):
     if User.query.filter_by(email=data["email"]).first():
         return jsonify({"message": "Email already exists!"}), 400
 
-    hashed_password = generate_password_hash(data["password"], method="pbkdf2:sha256")
+    hashed_password = password_hasher.hash(data["password"])
     new_admin = User(
         username=data["username"],
         email=data["email"],
@@ -89,13 +88,16 @@ def register_admin(current_user):
         is_active=True,
     )
     db.session.add(new_admin)
+    queue_mail(new_admin.email, 'Your MyDuka admin account',
+               f"Hi {new_admin.username},\n\nAn admin account has been created for you. "
+               f"Sign in at {current_app.config['FRONTEND_URL']}/login\n")
     db.session.commit()
+    principal_cache.invalidate(new_admin.id)
     return jsonify({"message": "Admin registered successfully!"}), 201
 
 # Register a Clerk
 @auth_blueprint.route("/register-clerk", methods=["POST"])
 @token_required
-@cross_origin(origin="http://localhost:3000", supports_credentials=True)
 def register_clerk(current_user):
     if current_user.role != "admin":
         return jsonify({"message": "Permission denied!"}), 403
@@ -110,7 +112,7 @@ def register_clerk(current_user):
         print("❌ Email already exists!")
         return jsonify({"message": "Email already exists!"}), 400
 
-    hashed_password = generate_password_hash(data["password"], method="pbkdf2:sha256")
+    hashed_password = password_hasher.hash(data["password"])
     try:
         new_clerk = User(
             username=data["username"],
@@ -121,7 +123,11 @@ def register_clerk(current_user):
             is_active=True,
         )
         db.session.add(new_clerk)
+        queue_mail(new_clerk.email, 'Your MyDuka clerk account',
+                   f"Hi {new_clerk.username},\n\nA clerk account has been created for you. "
+                   f"Sign in at {current_app.config['FRONTEND_URL']}/login\n")
         db.session.commit()
+        principal_cache.invalidate(new_clerk.id)
         print("✅ Clerk registered successfully!")
         return jsonify({"message": "Clerk registered successfully!", "clerk_id": new_clerk.id}), 201
     except Exception as e:
@@ -131,19 +137,26 @@ def register_clerk(current_user):
 
 # User Login Route
 @auth_blueprint.route('/login', methods=['POST'])
-@cross_origin(origin="http://localhost:3000", supports_credentials=True)
 def login():
     data = request.get_json()
     if not data or 'email' not in data or 'password' not in data:
         return jsonify({'message': 'Missing email or password'}), 400
 
     user = User.query.filter_by(email=data['email']).first()
-    if not user or not check_password_hash(user.password_hash, data['password']):
+    if not user or not password_hasher.verify(user.password_hash, data['password']):
         return jsonify({'message': 'Invalid email or password'}), 401
 
     if not user.is_active:
         return jsonify({'message': 'Please verify your email before logging in!'}), 403
 
+    # Upgrade hashes made with older parameters while we still hold the plaintext
+    if password_hasher.needs_rehash(user.password_hash):
+        try:
+            user.password_hash = password_hasher.hash(data['password'])
+            db.session.commit()
+        except HashingPoolBusy:
+            pass  # Try again on a later login
+
     token = jwt.encode(
         {'user_id': user.id, 'exp': datetime.utcnow() + timedelta(hours=1)},
         current_app.config['SECRET_KEY'],
@@ -163,7 +176,6 @@ def login():
 # Logout Route (Optional, client-side token removal is sufficient in JWT)
 @auth_blueprint.route('/logout', methods=['POST'])
 @token_required
-@cross_origin(origin="http://localhost:3000", supports_credentials=True)
 def logout(current_user):
     # In a JWT system, logout is typically handled client-side by removing the token
     return jsonify({"message": "Logged out successfully (remove token client-side)"}), 200
\ No newline at end of file
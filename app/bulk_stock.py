@@ -0,0 +1,170 @@
+import csv
+import io
+from sqlalchemy import bindparam, func, insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from app import db
+from app.models import Product, Store
+from app.inventory_summary import track_product_changes
+
+DEFAULT_CHUNK_SIZE = 1000
+IN_CHUNK_SIZE = 500
+REQUIRED_FIELDS = ('item', 'quantity', 'buying_price', 'selling_price', 'store_id')  # Same as add_stock
+
+products_table = Product.__table__
+
+
+def parse_csv(text):
+    """Read CSV text with a header row into a list of dicts."""
+    return list(csv.DictReader(io.StringIO(text)))
+
+
+def _validate(row):
+    if not isinstance(row, dict):
+        return None, 'Row must be an object'
+    missing = [field for field in REQUIRED_FIELDS if row.get(field) in (None, '')]
+    if missing:
+        return None, f"Missing field: {', '.join(missing)}"
+    try:
+        clean = {
+            'name': str(row['item']).strip(),
+            'quantity': int(row['quantity']),
+            'buying_price': float(row['buying_price']),
+            'selling_price': float(row['selling_price']),
+            'store_id': int(row['store_id']),
+        }
+    except (TypeError, ValueError):
+        return None, 'quantity and store_id must be integers, prices must be numbers'
+    if not clean['name']:
+        return None, 'item must not be empty'
+    if clean['quantity'] < 0 or clean['buying_price'] < 0 or clean['selling_price'] < 0:
+        return None, 'quantity and prices must not be negative'
+    return clean, None
+
+
+def _existing_products(names):
+    found = {}
+    for start in range(0, len(names), IN_CHUNK_SIZE):
+        rows = db.session.execute(
+            select(Product.id, Product.name, Product.store_id).where(Product.name.in_(names[start:start + IN_CHUNK_SIZE]))
+        )
+        found.update({row.name: row for row in rows})
+    return found
+
+
+def _apply_chunk(groups):
+    """Upsert one chunk of (name, store_id) groups; returns {key: (status, product_id, message)}."""
+    outcomes = {}
+    existing = _existing_products([name for name, _ in groups])
+
+    updates, inserts = [], []
+    for key, group in groups.items():
+        name, store_id = key
+        product = existing.get(name)
+        if product is None:
+            inserts.append({
+                'name': name,
+                'buying_price': group['buying_price'],
+                'selling_price': group['selling_price'],
+                'stock_quantity': group['quantity'],
+                'spoiled_quantity': 0,
+                'payment_status': 'not paid',
+                'version': 1,
+                'store_id': store_id,
+            })
+        elif product.store_id != store_id:
+            outcomes[key] = ('error', None, 'Product name is already used by another store')
+        else:
+            updates.append({
+                'b_id': product.id,
+                'b_quantity': group['quantity'],
+                'b_buying_price': group['buying_price'],
+                'b_selling_price': group['selling_price'],
+            })
+            outcomes[key] = ('updated', product.id, None)
+
+    with track_product_changes([u['b_id'] for u in updates]) as tracker:
+        if updates:
+            # Additive increment in SQL, so concurrent receipts of the same SKU never overwrite each other
+            db.session.execute(
+                update(products_table)
+                .where(products_table.c.id == bindparam('b_id'))
+                .values(
+                    stock_quantity=func.coalesce(products_table.c.stock_quantity, 0) + bindparam('b_quantity'),
+                    version=products_table.c.version + 1,
+                    buying_price=bindparam('b_buying_price'),
+                    selling_price=bindparam('b_selling_price'),
+                ),
+                updates,
+            )
+        if inserts:
+            created = db.session.execute(
+                insert(products_table).returning(products_table.c.id, products_table.c.name),
+                inserts,
+            ).all()
+            tracker.inserted([row.id for row in created])
+            by_name = {row.name: row.id for row in created}
+            for row in inserts:
+                outcomes[(row['name'], row['store_id'])] = ('created', by_name.get(row['name']), None)
+    db.session.commit()
+    return outcomes
+
+
+# ✅ Bulk stock receipt: one validation pass, one IN lookup and batched upserts per chunk
+def ingest_stock(rows, current_user, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Add stock for many items at once with add_stock semantics.
+
+    Rows for the same item and store are merged (quantities add up, the last prices
+    win). Work is committed per chunk of ``chunk_size`` items; a chunk that fails is
+    rolled back and its rows are reported as errors. Returns per-row results.
+    """
+    results = [None] * len(rows)
+    groups = {}
+    row_keys = {}
+    store_by_name = {}  # Product names are globally unique
+
+    for index, row in enumerate(rows):
+        clean, error = _validate(row)
+        if error is None and current_user.role == 'clerk' and current_user.store_id != clean['store_id']:
+            error = 'Unauthorized to add stock to this store'
+        if error is None and store_by_name.setdefault(clean['name'], clean['store_id']) != clean['store_id']:
+            error = 'Item appears for more than one store in this upload'
+        if error:
+            results[index] = {'row': index, 'status': 'error', 'message': error}
+            continue
+
+        key = (clean['name'], clean['store_id'])
+        group = groups.setdefault(key, {'quantity': 0})
+        group['quantity'] += clean['quantity']
+        group['buying_price'] = clean['buying_price']
+        group['selling_price'] = clean['selling_price']
+        row_keys[index] = key
+
+    store_ids = sorted({store_id for _, store_id in groups})
+    known_stores = set()
+    for start in range(0, len(store_ids), IN_CHUNK_SIZE):
+        known_stores.update(db.session.execute(
+            select(Store.id).where(Store.id.in_(store_ids[start:start + IN_CHUNK_SIZE]))
+        ).scalars())
+
+    outcomes = {}
+    for key in [key for key in groups if key[1] not in known_stores]:
+        outcomes[key] = ('error', None, 'Store not found')
+        del groups[key]
+
+    keys = list(groups)
+    for start in range(0, len(keys), chunk_size):
+        chunk = {key: groups[key] for key in keys[start:start + chunk_size]}
+        try:
+            outcomes.update(_apply_chunk(chunk))
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            for key in chunk:
+                outcomes[key] = ('error', None, f'Chunk failed and was rolled back: {e.__class__.__name__}')
+
+    for index, key in row_keys.items():
+        status, product_id, message = outcomes[key]
+        result = {'row': index, 'status': status, 'product_id': product_id}
+        if message:
+            result['message'] = message
+        results[index] = result
+    return results
@@ -0,0 +1,96 @@
+from datetime import datetime
+from sqlalchemy import case, func, select, update
+from app import db
+from app.models import Product, SupplyRequest
+from app.inventory_summary import track_product_changes
+from app.change_stream import note_changes
+
+MAX_BULK_REQUESTS = 1000  # Requests decided per call; a filter claims the oldest this many
+DECISIONS = ('approved', 'declined')
+
+supply_table = SupplyRequest.__table__
+products_table = Product.__table__
+
+
+def _claim(decision, ids=None, store_id=None, product_id=None, limit=MAX_BULK_REQUESTS):
+    """Move pending requests to ``decision`` in one UPDATE ... RETURNING; rows already decided are left alone.
+
+    The ``status = 'pending'`` condition is re-checked under the row lock, so when two admins decide
+    the same request concurrently exactly one of them gets it back.
+    """
+    pending = supply_table.c.status == 'pending'
+    if ids is not None:
+        target = supply_table.c.id.in_(ids)
+    else:
+        matching = select(supply_table.c.id).where(pending)
+        if store_id is not None:
+            matching = matching.where(supply_table.c.store_id == store_id)
+        if product_id is not None:
+            matching = matching.where(supply_table.c.product_id == product_id)
+        # Requests another admin is deciding right now are skipped, not waited for
+        target = supply_table.c.id.in_(
+            matching.order_by(supply_table.c.id).limit(limit).with_for_update(skip_locked=True).scalar_subquery()
+        )
+    return db.session.execute(
+        update(supply_table)
+        .where(target, pending)
+        .values(status=decision, approved_at=datetime.utcnow() if decision == 'approved' else None)
+        .returning(supply_table.c.id, supply_table.c.product_id, supply_table.c.quantity_requested)
+    ).all()
+
+
+def _add_stock(quantities):
+    """Add each product's total in a single UPDATE: stock_quantity + CASE id WHEN ... END."""
+    product_ids = sorted(quantities)
+    with track_product_changes(product_ids):
+        db.session.execute(
+            update(products_table)
+            .where(products_table.c.id.in_(product_ids))
+            .values(
+                stock_quantity=func.coalesce(products_table.c.stock_quantity, 0)
+                + case(quantities, value=products_table.c.id, else_=0),
+                version=products_table.c.version + 1,
+            )
+        )
+
+
+# ✅ Bulk decision: one status UPDATE, one stock UPDATE grouped by product, one transaction
+def decide_supply_requests(decision, ids=None, store_id=None, product_id=None):
+    """Approve or decline many supply requests at once with update_supply_request semantics.
+
+    Pass ``ids``, or filter the pending requests by ``store_id`` and/or ``product_id``. Approved
+    quantities are summed per product before stock is touched. Everything commits together.
+    Returns (per-request results, whether a filter left more pending requests than one call takes).
+    """
+    if ids is not None:
+        ids = list(dict.fromkeys(ids))
+    claimed = _claim(decision, ids=ids, store_id=store_id, product_id=product_id) if ids != [] else []
+
+    if claimed:
+        note_changes(db.session, 'supply_request', [row.id for row in claimed])  # Core UPDATE: tell the change stream
+    if decision == 'approved' and claimed:
+        quantities = {}
+        for row in claimed:
+            quantities[row.product_id] = quantities.get(row.product_id, 0) + row.quantity_requested
+        _add_stock(quantities)
+
+    outcomes = {row.id: {'id': row.id, 'status': decision, 'product_id': row.product_id} for row in claimed}
+    if ids is None:
+        db.session.commit()
+        return [outcomes[request_id] for request_id in sorted(outcomes)], len(claimed) == MAX_BULK_REQUESTS
+
+    unclaimed = [request_id for request_id in ids if request_id not in outcomes]
+    current = {}
+    if unclaimed:
+        current = dict(db.session.execute(
+            select(supply_table.c.id, supply_table.c.status).where(supply_table.c.id.in_(unclaimed))
+        ).all())
+    db.session.commit()
+
+    for request_id in unclaimed:
+        if request_id in current:
+            outcomes[request_id] = {'id': request_id, 'status': 'skipped',
+                                    'message': f'Supply request is already {current[request_id]}'}
+        else:
+            outcomes[request_id] = {'id': request_id, 'status': 'not_found', 'message': 'Supply request not found'}
+    return [outcomes[request_id] for request_id in ids], False
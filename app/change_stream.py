@@ -0,0 +1,321 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque, namedtuple
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select
+from app import db
+from app.models import Product, SupplyRequest
+
+DEFAULT_HISTORY = 1000  # Events kept in memory for Last-Event-ID resume
+DEFAULT_CLIENT_BUFFER = 256  # Events queued per connection before it is told to resync
+DEFAULT_RETENTION = 10000  # Events kept in the shared log
+DEFAULT_POLL_INTERVAL = 0.25  # Seconds between shared-log reads
+
+STREAMED_PRODUCT_FIELDS = ('stock_quantity', 'spoiled_quantity', 'payment_status', 'store_id')
+STREAMED_SUPPLY_FIELDS = ('status',)
+
+ChangeEvent = namedtuple('ChangeEvent', ['id', 'type', 'store_id', 'data'])
+
+RESYNC = object()  # Tells a subscriber it missed events and must refetch
+REAUTH = object()  # Tells a subscriber its credentials ran out; the stream ends after it
+
+
+class StreamLimitReached(Exception):
+    """Raised by ChangeBus.subscribe when this process already serves ``max_subscribers`` streams."""
+
+_PENDING_KEY = 'change_stream_pending'
+_EVENTS_KEY = 'change_stream_events'
+
+
+class Subscription:
+    """One stream connection: a bounded queue filtered to the stores the client may see."""
+
+    def __init__(self, store_ids, buffer_size):
+        self.store_ids = store_ids  # None = every store
+        self._queue = deque()
+        self._buffer_size = buffer_size
+        self._overflowed = False
+        self._ready = threading.Condition()
+
+    def wants(self, change):
+        return self.store_ids is None or change.store_id in self.store_ids
+
+    def deliver(self, changes):
+        with self._ready:
+            for change in changes:
+                if not self.wants(change):
+                    continue
+                if len(self._queue) >= self._buffer_size:
+                    # A slow client must not grow memory without bound: drop its backlog
+                    self._queue.clear()
+                    self._overflowed = True
+                    continue
+                self._queue.append(change)
+            self._ready.notify()
+
+    def resync(self):
+        with self._ready:
+            self._queue.clear()
+            self._overflowed = True
+            self._ready.notify()
+
+    def next(self, timeout):
+        """The next event, RESYNC, or None when ``timeout`` passes without any (heartbeat time)."""
+        with self._ready:
+            if not self._queue and not self._overflowed:
+                self._ready.wait(timeout)
+            if self._overflowed:
+                self._overflowed = False
+                return RESYNC
+            return self._queue.popleft() if self._queue else None
+
+
+class SQLiteChangeLog:
+    """An append-only event log in a local SQLite file, shared by every worker on the host."""
+
+    def __init__(self, path, retention=DEFAULT_RETENTION):
+        self.path = path
+        self.retention = retention
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                         'type TEXT NOT NULL, store_id INTEGER, data TEXT NOT NULL)')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def append(self, changes):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('INSERT INTO events (type, store_id, data) VALUES (?, ?, ?)',
+                             [(c.type, c.store_id, json.dumps(c.data)) for c in changes])
+            last_id = conn.execute('SELECT max(id) FROM events').fetchone()[0]
+            if last_id // 100 != (last_id - len(changes)) // 100:  # Prune every ~100 events
+                conn.execute('DELETE FROM events WHERE id <= ?', (last_id - self.retention,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def read_after(self, last_id, limit=1000):
+        rows = self._connect().execute(
+            'SELECT id, type, store_id, data FROM events WHERE id > ? ORDER BY id LIMIT ?', (last_id, limit)
+        ).fetchall()
+        return [ChangeEvent(row[0], row[1], row[2], json.loads(row[3])) for row in rows]
+
+    def oldest_id(self):
+        return self._connect().execute('SELECT min(id) FROM events').fetchone()[0]
+
+    def last_id(self):
+        return self._connect().execute('SELECT coalesce(max(id), 0) FROM events').fetchone()[0]
+
+
+class ChangeBus:
+    """Fans committed changes out to stream subscribers.
+
+    Without a ``log`` events stay in this process. With a shared log every worker
+    appends to it and a tail thread in each worker (started with the first
+    subscriber) delivers what any worker wrote, so event ids are global and a
+    client can resume on a different worker.
+    """
+
+    def __init__(self, log=None, history=DEFAULT_HISTORY, buffer_size=DEFAULT_CLIENT_BUFFER,
+                 poll_interval=DEFAULT_POLL_INTERVAL, max_subscribers=None):
+        self.log = log
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers  # None = no limit
+        self.poll_interval = poll_interval
+        self._history = deque(maxlen=history)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._tail = None
+        self._tail_pid = None
+        self._tailed_id = 0  # Last log id handed to subscribers; replays stop here so nothing arrives twice
+
+    def publish(self, changes):
+        """Send new changes (id None) to every subscriber, through the shared log if there is one."""
+        if not changes:
+            return
+        if self.log is not None:
+            self.log.append(changes)
+            return
+        with self._lock:
+            numbered = []
+            for change in changes:
+                numbered.append(change._replace(id=self._next_id))
+                self._next_id += 1
+        self._dispatch(numbered)
+
+    def _dispatch(self, changes):
+        with self._lock:
+            self._history.extend(changes)
+            self._tailed_id = changes[-1].id
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.deliver(changes)
+
+    def subscribe(self, store_ids=None, last_event_id=None):
+        """Register a subscriber, replaying what it missed since ``last_event_id`` if still retained."""
+        subscription = Subscription(store_ids, self.buffer_size)
+        with self._lock:
+            if self.max_subscribers is not None and len(self._subscribers) >= self.max_subscribers:
+                raise StreamLimitReached()
+            # Registered before the tail starts, or the tail finds nobody listening and exits
+            self._subscribers.add(subscription)
+            if self.log is not None:
+                self._ensure_tail()
+            if last_event_id is not None:
+                missed = self._missed_since(last_event_id)
+                if missed is None:
+                    subscription.resync()
+                else:
+                    subscription.deliver(missed)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def _missed_since(self, last_event_id):
+        if self.log is not None:
+            oldest = self.log.oldest_id()
+            if oldest is not None and oldest > last_event_id + 1:
+                return None
+            missed = self.log.read_after(last_event_id, limit=self.buffer_size + 1)
+            return [change for change in missed if change.id <= self._tailed_id]  # The tail sends the rest
+        if self._history and self._history[0].id > last_event_id + 1:
+            return None
+        return [change for change in self._history if change.id > last_event_id]
+
+    def _ensure_tail(self):
+        """Start this process's tail thread unless it is running; the caller holds ``_lock``."""
+        if self._tail is not None and self._tail.is_alive() and self._tail_pid == os.getpid():
+            return
+        self._tailed_id = self.log.last_id()
+        self._tail = threading.Thread(target=self._follow_log, args=(self._tailed_id,), daemon=True,
+                                      name='change-stream-tail')
+        self._tail_pid = os.getpid()
+        self._tail.start()
+
+    def _follow_log(self, last_id):
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._tail = None
+                    return  # Restarted by the next subscriber
+            try:
+                changes = self.log.read_after(last_id)
+            except sqlite3.Error:
+                changes = []
+            if changes:
+                last_id = changes[-1].id
+                self._dispatch(changes)
+            else:
+                time.sleep(self.poll_interval)
+
+
+def note_changes(session, kind, ids):
+    """Record rows written outside the ORM unit of work so they are streamed on commit."""
+    pending = session.info.setdefault(_PENDING_KEY, {'product': set(), 'supply_request': set(), 'deleted': []})
+    pending[kind].update(ids)
+
+
+def _changed(obj, fields):
+    state = inspect(obj)
+    return any(state.attrs[key].history.has_changes() for key in fields)
+
+
+# ✅ Collect ORM changes while the flush still knows what changed
+@event.listens_for(db.session, 'after_flush')
+def _collect_flushed(session, flush_context):
+    product_ids = [p.id for p in session.new if isinstance(p, Product)]
+    product_ids += [p.id for p in session.dirty if isinstance(p, Product) and _changed(p, STREAMED_PRODUCT_FIELDS)]
+    supply_ids = [r.id for r in session.new if isinstance(r, SupplyRequest)]
+    supply_ids += [r.id for r in session.dirty if isinstance(r, SupplyRequest) and _changed(r, STREAMED_SUPPLY_FIELDS)]
+    deleted = [ChangeEvent(None, 'product_deleted', p.store_id, {'id': p.id})
+               for p in session.deleted if isinstance(p, Product)]
+    if product_ids or supply_ids or deleted:
+        note_changes(session, 'product', product_ids)
+        note_changes(session, 'supply_request', supply_ids)
+        session.info[_PENDING_KEY]['deleted'].extend(deleted)
+
+
+# ✅ Read the committed state once, just before commit, so subscribers get full rows
+@event.listens_for(db.session, 'before_commit')
+def _build_events(session):
+    if not (has_app_context() and 'change_bus' in current_app.extensions):
+        session.info.pop(_PENDING_KEY, None)
+        return
+    session.flush()
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+
+    changes = list(pending['deleted'])
+    if pending['product']:
+        rows = session.execute(select(
+            Product.id, Product.store_id, Product.stock_quantity, Product.spoiled_quantity,
+            Product.payment_status, Product.version,
+        ).where(Product.id.in_(sorted(pending['product']))))
+        changes += [ChangeEvent(None, 'product', row.store_id, dict(row._mapping)) for row in rows]
+    if pending['supply_request']:
+        rows = session.execute(select(
+            SupplyRequest.id, SupplyRequest.store_id, SupplyRequest.product_id,
+            SupplyRequest.quantity_requested, SupplyRequest.status,
+        ).where(SupplyRequest.id.in_(sorted(pending['supply_request']))))
+        changes += [ChangeEvent(None, 'supply_request', row.store_id, dict(row._mapping)) for row in rows]
+    session.info[_EVENTS_KEY] = changes
+
+
+@event.listens_for(db.session, 'after_commit')
+def _publish(session):
+    changes = session.info.pop(_EVENTS_KEY, None)
+    if changes and has_app_context():
+        bus = current_app.extensions.get('change_bus')
+        if bus is not None:
+            bus.publish(changes)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard(session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_EVENTS_KEY, None)
+
+
+def format_sse(change):
+    if change is RESYNC:
+        return 'event: resync\ndata: {}\n\n'
+    if change is REAUTH:
+        return 'event: reauth\ndata: {}\n\n'
+    return f'id: {change.id}\nevent: {change.type}\ndata: {json.dumps(change.data)}\n\n'
+
+
+def init_change_stream(app):
+    """Create the change bus selected by CHANGE_STREAM_BACKEND: 'sqlite' (default, shared) or 'memory' (one process)."""
+    kind = app.config.get('CHANGE_STREAM_BACKEND', 'sqlite')
+    log = None
+    if kind == 'sqlite':
+        path = app.config.get('CHANGE_STREAM_PATH') or os.path.join(app.instance_path, 'change_stream.db')
+        log = SQLiteChangeLog(path, app.config.get('CHANGE_STREAM_RETENTION', DEFAULT_RETENTION))
+    elif kind == 'memory':
+        if app.config.get('WORKER_PROCESSES', 1) > 1:
+            raise ValueError("CHANGE_STREAM_BACKEND='memory' needs a single worker process; use 'sqlite'")
+    else:
+        raise ValueError("CHANGE_STREAM_BACKEND must be 'memory' or 'sqlite'")
+    app.extensions['change_bus'] = ChangeBus(
+        log,
+        buffer_size=app.config.get('SSE_CLIENT_BUFFER', DEFAULT_CLIENT_BUFFER),
+        poll_interval=app.config.get('CHANGE_STREAM_POLL_INTERVAL', DEFAULT_POLL_INTERVAL),
+        max_subscribers=app.config.get('SSE_MAX_STREAMS'),
+    )
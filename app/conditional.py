@@ -0,0 +1,50 @@
+import hashlib
+from collections import namedtuple
+from flask import make_response, request
+from sqlalchemy import func
+from app.models import Product
+
+Validators = namedtuple('Validators', 'etag last_modified')
+
+
+# ✅ One aggregate over the listing's rows instead of loading them
+def listing_validators(query, scope=''):
+    """ETag and Last-Modified for a product listing ``query``.
+
+    The fingerprint is count, max(id), max(updated_at) and sum(version) of the matching
+    rows: inserts, deletes and every write (ORM or Core, all bump the version) change it.
+    ``scope`` and the request's path and query string are mixed in, so different users
+    or pages never share an ETag.
+    """
+    count, max_id, last_modified, version_sum = query.with_entities(
+        func.count(Product.id), func.max(Product.id), func.max(Product.updated_at),
+        func.coalesce(func.sum(Product.version), 0),
+    ).order_by(None).one()
+    raw = f'{scope}|{request.full_path}|{count}|{max_id}|{last_modified}|{version_sum}'
+    return Validators(hashlib.sha1(raw.encode()).hexdigest()[:32], last_modified)
+
+
+def is_not_modified(validators):
+    """True when the client's cached copy (If-None-Match) is current.
+
+    If-Modified-Since is not honoured: deleting a row leaves max(updated_at) where it
+    was (or moves it back), so only the ETag notices. Last-Modified is informational.
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains(validators.etag)
+    return False
+
+
+def with_validators(response, validators):
+    """Attach ETag / Last-Modified and make clients revalidate every time."""
+    response = make_response(response)
+    response.set_etag(validators.etag)
+    if validators.last_modified is not None:
+        response.last_modified = validators.last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Authorization')
+    return response
+
+
+def not_modified(validators):
+    return with_validators(('', 304), validators)
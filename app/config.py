@@ -1,12 +1,6 @@
 import os
-from dotenv import load_dotenv
 
-# ✅ Ensure .env file is loaded
-dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
-if os.path.exists(dotenv_path):
-    load_dotenv(dotenv_path)
-else:
-    print("⚠️ Warning: .env file not found!")
+# ✅ Read from the environment as the entry point left it (`flask`, run.py and wsgi.py load .env first)
 
 class Config:
     """Base configuration with default settings."""
@@ -26,17 +20,34 @@ class Config:
 
     DEBUG = False  
 
+    # ✅ Engine profile: create_app() turns these into engine options (see app/engine_tuning.py)
+    DB_WORKERS = int(os.getenv('WEB_CONCURRENCY', 2))  # Processes sharing the database
+    DB_THREADS = int(os.getenv('WEB_THREADS', 4))  # Concurrent requests per process
+    DB_MAX_CONNECTIONS = int(os.getenv('DB_MAX_CONNECTIONS', 20))  # Budget across all processes
+    DB_POOL_TIMEOUT = 10  # Seconds to wait for a free connection
+    DB_POOL_RECYCLE = 1800  # Seconds before a connection is replaced
+    DB_POOL_PRE_PING = True
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 30000))  # PostgreSQL only
+    SQLITE_JOURNAL_MODE = 'WAL'
+    SQLITE_SYNCHRONOUS = 'NORMAL'  # Safe with WAL; only the last commits can be lost on power failure
+    SQLITE_BUSY_TIMEOUT_MS = 5000
+
 class DevelopmentConfig(Config):
     """Configuration for development environment."""
     
     DEBUG = True
     SQLALCHEMY_ECHO = True  
+    DB_WORKERS = int(os.getenv('WEB_CONCURRENCY', 1))
+    DB_MAX_CONNECTIONS = int(os.getenv('DB_MAX_CONNECTIONS', 10))
 
 class ProductionConfig(Config):
     """Configuration for production environment."""
     
     DEBUG = False
     SQLALCHEMY_ECHO = False 
+    DB_MAX_CONNECTIONS = int(os.getenv('DB_MAX_CONNECTIONS', 90))  # PostgreSQL default is 100, keep headroom
+    DB_POOL_RECYCLE = 300  # Hosted Postgres/proxies drop idle connections
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 15000))
 
 class TestingConfig(Config):
     """Configuration for testing environment."""
@@ -44,6 +55,12 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"  
     BCRYPT_LOG_ROUNDS = 4  
+    DB_WORKERS = 1
+    DB_THREADS = 8  # Concurrency tests run this many request threads
+    DB_MAX_CONNECTIONS = 16
+    DB_POOL_RECYCLE = -1
+    DB_POOL_PRE_PING = False
+    SQLITE_BUSY_TIMEOUT_MS = 15000
 
 config = {
     'development': DevelopmentConfig,
@@ -0,0 +1,70 @@
+DEFAULT_ORIGINS = ('http://localhost:3000',)
+DEFAULT_METHODS = ('GET', 'POST', 'PUT', 'DELETE', 'OPTIONS')
+DEFAULT_ALLOW_HEADERS = ('Authorization', 'Content-Type', 'x-access-token', 'If-None-Match', 'If-Modified-Since')
+DEFAULT_EXPOSE_HEADERS = ('ETag', 'Last-Modified', 'Retry-After', 'Server-Timing')
+DEFAULT_MAX_AGE = 7200  # Chromium caps preflight caching at 2 hours
+DEFAULT_PATH_PREFIX = '/api/'
+
+
+class CORSMiddleware:
+    """WSGI-level CORS: preflights are answered here, before Flask routes, authenticates or opens a session.
+
+    Header sets are built once per allowed origin; other requests from an allowed
+    origin get the response headers appended, everything else passes through untouched.
+    """
+
+    def __init__(self, wsgi_app, origins=DEFAULT_ORIGINS, methods=DEFAULT_METHODS,
+                 allow_headers=DEFAULT_ALLOW_HEADERS, expose_headers=DEFAULT_EXPOSE_HEADERS,
+                 max_age=DEFAULT_MAX_AGE, supports_credentials=True, path_prefix=DEFAULT_PATH_PREFIX):
+        self.wsgi_app = wsgi_app
+        self.path_prefix = path_prefix
+        self._preflight = {}
+        self._actual = {}
+        for origin in origins:
+            common = [('Access-Control-Allow-Origin', origin), ('Vary', 'Origin')]
+            if supports_credentials:
+                common.append(('Access-Control-Allow-Credentials', 'true'))
+            self._preflight[origin] = common + [
+                ('Access-Control-Allow-Methods', ', '.join(methods)),
+                ('Access-Control-Allow-Headers', ', '.join(allow_headers)),
+                ('Access-Control-Max-Age', str(max_age)),
+                ('Content-Length', '0'),
+            ]
+            self._actual[origin] = common + (
+                [('Access-Control-Expose-Headers', ', '.join(expose_headers))] if expose_headers else []
+            )
+
+    def __call__(self, environ, start_response):
+        if not environ.get('PATH_INFO', '').startswith(self.path_prefix):
+            return self.wsgi_app(environ, start_response)
+
+        origin = environ.get('HTTP_ORIGIN')
+        if environ['REQUEST_METHOD'] == 'OPTIONS' and 'HTTP_ACCESS_CONTROL_REQUEST_METHOD' in environ:
+            # Unknown origins get a bare 204: the browser blocks the real request
+            start_response('204 No Content', self._preflight.get(origin, [('Vary', 'Origin'), ('Content-Length', '0')]))
+            return [b'']
+
+        headers = self._actual.get(origin)
+        if headers is None:
+            return self.wsgi_app(environ, start_response)
+
+        def cors_start_response(status, response_headers, exc_info=None):
+            response_headers = [(name, value) for name, value in response_headers
+                                if not name.lower().startswith('access-control-')]
+            return start_response(status, response_headers + headers, exc_info)
+
+        return self.wsgi_app(environ, cors_start_response)
+
+
+def init_cors(app):
+    """Install the CORS layer in front of ``app`` using the CORS_* config keys."""
+    app.wsgi_app = CORSMiddleware(
+        app.wsgi_app,
+        origins=app.config.get('CORS_ORIGINS', DEFAULT_ORIGINS),
+        methods=app.config.get('CORS_METHODS', DEFAULT_METHODS),
+        allow_headers=app.config.get('CORS_ALLOW_HEADERS', DEFAULT_ALLOW_HEADERS),
+        expose_headers=app.config.get('CORS_EXPOSE_HEADERS', DEFAULT_EXPOSE_HEADERS),
+        max_age=app.config.get('CORS_MAX_AGE', DEFAULT_MAX_AGE),
+        supports_credentials=app.config.get('CORS_SUPPORTS_CREDENTIALS', True),
+        path_prefix=app.config.get('CORS_PATH_PREFIX', DEFAULT_PATH_PREFIX),
+    )
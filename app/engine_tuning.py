@@ -0,0 +1,73 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+def _is_memory_sqlite(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(database_url, profile):
+    """Build SQLALCHEMY_ENGINE_OPTIONS for ``database_url`` from a config class's DB_* settings.
+
+    Each process gets ``DB_THREADS`` pooled connections plus overflow, capped so that
+    ``DB_WORKERS`` processes together stay under ``DB_MAX_CONNECTIONS``.
+    """
+    url = make_url(database_url)
+    if _is_memory_sqlite(url):
+        return {}  # One shared in-memory connection; nothing to pool
+
+    per_worker = max(1, profile.DB_MAX_CONNECTIONS // max(1, profile.DB_WORKERS))
+    pool_size = max(1, min(profile.DB_THREADS, per_worker))
+    return {
+        'pool_size': pool_size,
+        'max_overflow': max(0, min(profile.DB_THREADS, per_worker - pool_size)),
+        'pool_timeout': profile.DB_POOL_TIMEOUT,
+        'pool_recycle': profile.DB_POOL_RECYCLE,
+        'pool_pre_ping': profile.DB_POOL_PRE_PING,
+    }
+
+
+def connection_settings(profile):
+    """The per-connection settings the connect event applies."""
+    return {
+        'statement_timeout_ms': profile.DB_STATEMENT_TIMEOUT_MS,
+        'sqlite_journal_mode': profile.SQLITE_JOURNAL_MODE,
+        'sqlite_synchronous': profile.SQLITE_SYNCHRONOUS,
+        'sqlite_busy_timeout_ms': profile.SQLITE_BUSY_TIMEOUT_MS,
+    }
+
+
+def _configure_connection(settings, backend, dbapi_connection):
+    cursor = dbapi_connection.cursor()
+    try:
+        if backend == 'sqlite':
+            # WAL lets readers keep reading while one writer commits
+            if settings['sqlite_journal_mode']:
+                cursor.execute(f"PRAGMA journal_mode={settings['sqlite_journal_mode']}")
+            if settings['sqlite_synchronous']:
+                cursor.execute(f"PRAGMA synchronous={settings['sqlite_synchronous']}")
+            cursor.execute(f"PRAGMA busy_timeout={int(settings['sqlite_busy_timeout_ms'])}")
+        elif backend == 'postgresql' and settings['statement_timeout_ms']:
+            cursor.execute(f"SET statement_timeout = {int(settings['statement_timeout_ms'])}")
+            dbapi_connection.commit()  # Keep the SET when the pool rolls back on return
+    finally:
+        cursor.close()
+
+
+def tune_engine(engine, settings):
+    """Apply pragmas / session settings to every new DBAPI connection of ``engine``."""
+    backend = engine.url.get_backend_name()
+    if backend == 'sqlite' and _is_memory_sqlite(engine.url):
+        settings = dict(settings, sqlite_journal_mode=None)  # In-memory databases cannot use WAL
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        _configure_connection(settings, backend, dbapi_connection)
+
+
+def init_engine_tuning(app, db):
+    """Hook the connection settings into every engine Flask-SQLAlchemy created for ``app``."""
+    settings = app.config['DB_CONNECTION_SETTINGS']
+    with app.app_context():
+        for engine in db.engines.values():
+            tune_engine(engine, settings)
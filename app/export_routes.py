@@ -0,0 +1,44 @@
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from app.routes import token_required
+from app.replicas import read_only
+from app.exports import CONTENT_TYPES, FORMATS, export_stream, product_export_query, supply_request_export_query
+
+export_bp = Blueprint('export', __name__)
+
+
+def _streamed(query, filename):
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in FORMATS:
+        return jsonify({'message': f"format must be one of: {', '.join(FORMATS)}"}), 400
+    compress = request.args.get('gzip', '').lower() in ['1', 'true', 'yes']
+
+    # Gzip is served as a .gz download rather than Content-Encoding so clients keep the compressed file
+    mimetype = 'application/gzip' if compress else CONTENT_TYPES[fmt]
+    extension = f"{fmt}.gz" if compress else fmt
+    response = Response(stream_with_context(export_stream(query, fmt, compress)), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}.{extension}"'
+    return response
+
+# ✅ Export Products (Admins: all stores, Merchants: their own stores)
+@export_bp.route('/products', methods=['GET'])
+@read_only
+@token_required
+def export_products(current_user):
+    if current_user.role == 'admin':
+        query = product_export_query()
+    elif current_user.role == 'merchant':
+        query = product_export_query(merchant_id=current_user.id)
+    else:
+        return jsonify({'message': 'Permission denied'}), 403
+
+    return _streamed(query, 'products')
+
+# ✅ Export Supply Requests (Admins Only)
+@export_bp.route('/supply-requests', methods=['GET'])
+@read_only
+@token_required
+def export_supply_requests(current_user):
+    if current_user.role != 'admin':
+        return jsonify({'message': 'Permission denied'}), 403
+
+    return _streamed(supply_request_export_query(), 'supply_requests')
@@ -0,0 +1,123 @@
+import csv
+import io
+import json
+import sys
+import zlib
+from datetime import date, datetime
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select
+from app import db
+from app.models import Product, SupplyRequest, Store
+
+EXPORT_BATCH_SIZE = 1000
+FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+PRODUCT_EXPORT_COLUMNS = [
+    Product.id, Product.name, Product.buying_price, Product.selling_price, Product.stock_quantity,
+    Product.spoiled_quantity, Product.payment_status, Product.store_id, Product.updated_at,
+]
+SUPPLY_REQUEST_EXPORT_COLUMNS = [
+    SupplyRequest.id, SupplyRequest.product_id, SupplyRequest.quantity_requested, SupplyRequest.status,
+    SupplyRequest.requested_at, SupplyRequest.approved_at, SupplyRequest.requested_by, SupplyRequest.store_id,
+]
+
+
+def product_export_query(merchant_id=None):
+    query = select(*PRODUCT_EXPORT_COLUMNS).order_by(Product.id)
+    if merchant_id is not None:
+        query = query.join(Store, Store.id == Product.store_id).where(Store.merchant_id == merchant_id)
+    return query
+
+
+def supply_request_export_query():
+    return select(*SUPPLY_REQUEST_EXPORT_COLUMNS).order_by(SupplyRequest.id)
+
+
+def _jsonable(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def iter_rows(query, batch_size=EXPORT_BATCH_SIZE):
+    """Yield result rows in batches from a server-side cursor instead of loading them all."""
+    result = db.session.execute(query.execution_options(yield_per=batch_size))
+    try:
+        yield list(result.keys())
+        for partition in result.partitions():
+            yield from partition
+    finally:
+        result.close()
+
+
+def _ndjson_chunks(rows):
+    columns = next(rows)
+    buffer = []
+    for row in rows:
+        buffer.append(json.dumps({c: _jsonable(v) for c, v in zip(columns, row)}, separators=(',', ':')))
+        if len(buffer) >= EXPORT_BATCH_SIZE:
+            yield '\n'.join(buffer) + '\n'
+            buffer = []
+    if buffer:
+        yield '\n'.join(buffer) + '\n'
+
+
+def _csv_chunks(rows):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(next(rows))
+    count = 0
+    for row in rows:
+        writer.writerow([_jsonable(v) for v in row])
+        count += 1
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+    yield out.getvalue()
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# ✅ Constant-memory export: rows -> NDJSON/CSV text -> optional gzip, one batch at a time
+def export_stream(query, fmt='ndjson', compress=False):
+    """Return a generator of bytes for ``query`` in the requested format."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format '{fmt}'. Use one of: {', '.join(FORMATS)}")
+    chunks = _ndjson_chunks(iter_rows(query)) if fmt == 'ndjson' else _csv_chunks(iter_rows(query))
+    encoded = (chunk.encode() for chunk in chunks)
+    return _gzip(encoded) if compress else encoded
+
+
+EXPORT_QUERIES = {
+    'products': product_export_query,
+    'supply-requests': supply_request_export_query,
+}
+
+
+@click.command('export')
+@click.argument('table', type=click.Choice(list(EXPORT_QUERIES)))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), default='ndjson', show_default=True)
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output.')
+@click.option('--output', '-o', type=click.Path(dir_okay=False, writable=True), help='Defaults to stdout.')
+@with_appcontext
+def export_command(table, fmt, compress, output):
+    """Export TABLE (products or supply-requests) as NDJSON or CSV."""
+    stream = open(output, 'wb') if output else sys.stdout.buffer
+    try:
+        for chunk in export_stream(EXPORT_QUERIES[table](), fmt, compress):
+            stream.write(chunk)
+    finally:
+        if output:
+            stream.close()
+        else:
+            stream.flush()
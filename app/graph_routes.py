@@ -1,59 +1,70 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 from app.models import Product, Store
 from app.routes import token_required
 from app import db
+from app.query_budget import query_budget
+from app.replicas import read_only
+from app.response_cache import cached_response
+from app.reports import store_performance_rows, top_selling_products, most_spoiled_products, ranking_args
 
 graph_bp = Blueprint('graph', __name__)
 
 # ✅ Store Performance Graph Data
 @graph_bp.route('/graph/store-performance', methods=['GET'])
+@read_only
+@query_budget(2)
 @token_required
+@cached_response
 def store_performance_graph(current_user):
     if current_user.role not in ['admin', 'merchant']:
         return jsonify({'message': 'Permission denied'}), 403
 
-    stores = Store.query.all()
-    store_data = []
-
-    for store in stores:
-        products = Product.query.filter_by(store_id=store.id).all()
-        total_revenue = sum(p.selling_price * p.stock_quantity for p in products)
-        total_stock = sum(p.stock_quantity for p in products)
-        spoiled_stock = sum(p.spoiled_quantity for p in products)
-
-        store_data.append({
-            "store_id": store.id,
-            "store_name": store.name,
-            "total_revenue": total_revenue,
-            "total_stock": total_stock,
-            "spoiled_stock": spoiled_stock
-        })
+    store_data = [
+        {
+            "store_id": row.store_id,
+            "store_name": row.store_name,
+            "total_revenue": row.total_revenue,
+            "total_stock": row.total_stock,
+            "spoiled_stock": row.spoiled_stock
+        } for row in store_performance_rows()
+    ]
 
     return jsonify(store_data), 200
 
 # ✅ Top-Selling Products Graph Data
 @graph_bp.route('/graph/top-products', methods=['GET'])
+@read_only
+@query_budget(2)
 @token_required
+@cached_response
 def top_selling_products_graph(current_user):
     if current_user.role not in ['admin', 'merchant']:
         return jsonify({'message': 'Permission denied'}), 403
 
-    products = Product.query.all()
-    sorted_products = sorted(products, key=lambda p: p.selling_price * p.stock_quantity, reverse=True)[:5]
+    limit, store_id, error = ranking_args(request.args)
+    if error:
+        return jsonify({'message': error}), 400
 
     return jsonify([
-        {"id": p.id, "name": p.name, "revenue": p.selling_price * p.stock_quantity}
-        for p in sorted_products
+        {"id": p.id, "name": p.name, "revenue": p.revenue}
+        for p in top_selling_products(limit, store_id)
     ]), 200
 
 # ✅ Spoiled Products Graph Data
 @graph_bp.route('/graph/spoiled-products', methods=['GET'])
+@read_only
+@query_budget(2)
 @token_required
+@cached_response
 def spoiled_products_graph(current_user):
     if current_user.role not in ['admin', 'merchant']:
         return jsonify({'message': 'Permission denied'}), 403
 
-    spoiled_products = sorted(Product.query.all(), key=lambda p: p.spoiled_quantity, reverse=True)[:5]
+    limit, store_id, error = ranking_args(request.args)
+    if error:
+        return jsonify({'message': error}), 400
+
+    spoiled_products = most_spoiled_products(limit, store_id)
 
     return jsonify([
         {"id": p.id, "name": p.name, "spoiled_quantity": p.spoiled_quantity}
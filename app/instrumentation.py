@@ -0,0 +1,189 @@
+import hmac
+import threading
+import time
+from flask import Response, abort, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+
+_STATS_KEY = '_perf_stats'
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Per-process request metrics keyed by (blueprint, endpoint, method, status)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def record(self, labels, wall, db_time, statements, size):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {
+                    'latency': _Histogram(LATENCY_BUCKETS),
+                    'statements': _Histogram(STATEMENT_BUCKETS),
+                    'db_seconds': 0.0,
+                    'response_bytes': 0,
+                }
+            series['latency'].observe(wall)
+            series['statements'].observe(statements)
+            series['db_seconds'] += db_time
+            series['response_bytes'] += size
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            items = sorted(self._series.items())
+            histograms = [
+                ('http_request_duration_seconds', 'latency', 'Request wall time in seconds.'),
+                ('http_request_sql_statements', 'statements', 'SQL statements executed per request.'),
+            ]
+            for name, key, help_text in histograms:
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for labels, series in items:
+                    hist = series[key]
+                    cumulative = 0
+                    for bound, count in zip(hist.buckets + ('+Inf',), hist.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{_labels(labels, le=bound)}}} {cumulative}')
+                    lines.append(f'{name}_sum{{{_labels(labels)}}} {hist.total}')
+                    lines.append(f'{name}_count{{{_labels(labels)}}} {hist.count}')
+
+            counters = [
+                ('http_request_db_seconds_total', 'db_seconds', 'Time spent executing SQL in seconds.'),
+                ('http_response_size_bytes_total', 'response_bytes', 'Response body bytes sent.'),
+            ]
+            for name, key, help_text in counters:
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                for labels, series in items:
+                    lines.append(f'{name}{{{_labels(labels)}}} {series[key]}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, **extra):
+    blueprint, endpoint, method, status = labels
+    pairs = [('blueprint', blueprint), ('endpoint', endpoint), ('method', method), ('status', status)]
+    pairs += list(extra.items())
+    return ','.join(f'{key}="{_escape(value)}"' for key, value in pairs)
+
+
+metrics = MetricsRegistry()
+
+
+# ✅ SQL accounting: every statement run while serving a request is timed and counted
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_perf_query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('_perf_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    if has_request_context():
+        stats = g.get(_STATS_KEY)
+        if stats is not None:
+            stats['db_time'] += elapsed
+            stats['statements'] += 1
+
+
+def current_request_stats():
+    """SQL count and DB time so far for the request being served, or None outside a request."""
+    return g.get(_STATS_KEY) if has_request_context() else None
+
+
+def _start_timer():
+    setattr(g, _STATS_KEY, {'start': time.perf_counter(), 'db_time': 0.0, 'statements': 0})
+
+
+def _record(response):
+    stats = g.get(_STATS_KEY)
+    if stats is None:
+        return response
+
+    wall = time.perf_counter() - stats['start']
+    size = 0 if response.is_streamed else (response.calculate_content_length() or 0)
+    labels = (request.blueprint or '', request.endpoint or '<unmatched>', request.method, response.status_code)
+    metrics.record(labels, wall, stats['db_time'], stats['statements'], size)
+
+    response.headers.add(
+        'Server-Timing',
+        f'app;dur={wall * 1000:.1f}, db;dur={stats["db_time"] * 1000:.1f};desc="{stats["statements"]} queries"'
+    )
+    return response
+
+
+def _authorize_scrape():
+    """/metrics is off unless METRICS_TOKEN is set, and then needs it as a bearer token."""
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token:
+        abort(404)
+    sent = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(sent.encode(), f'Bearer {token}'.encode()):
+        abort(401)
+
+
+def _metrics_view():
+    from app.principal_cache import principal_cache
+    from app.password_hashing import password_hasher
+
+    _authorize_scrape()
+    lines = [metrics.render()]
+    cache = principal_cache.stats()
+    lines += [
+        '# HELP principal_cache_hits_total token_required lookups served from the cache.',
+        '# TYPE principal_cache_hits_total counter',
+        f'principal_cache_hits_total {cache["hits"]}',
+        '# HELP principal_cache_misses_total token_required lookups that queried the database.',
+        '# TYPE principal_cache_misses_total counter',
+        f'principal_cache_misses_total {cache["misses"]}',
+        '# HELP password_hash_seconds_total Time spent hashing or verifying passwords, including queueing.',
+        '# TYPE password_hash_seconds_total counter',
+    ]
+    hashing = password_hasher.stats()
+    for operation, m in sorted(hashing.items()):
+        lines.append(f'password_hash_seconds_total{{operation="{operation}"}} {m["total_seconds"]}')
+    lines += ['# HELP password_hash_rejected_total Hash operations refused because the pool was saturated.',
+              '# TYPE password_hash_rejected_total counter']
+    for operation, m in sorted(hashing.items()):
+        lines.append(f'password_hash_rejected_total{{operation="{operation}"}} {m["rejected"]}')
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+def init_instrumentation(app):
+    """Time every request, count its SQL, add Server-Timing and expose /metrics (see _authorize_scrape)."""
+    app.before_request(_start_timer)
+    app.after_request(_record)
+    app.add_url_rule('/metrics', 'metrics', _metrics_view, methods=['GET'])
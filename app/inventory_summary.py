@@ -0,0 +1,225 @@
+import math
+import click
+from flask.cli import AppGroup
+from sqlalchemy import event, false, inspect, insert, select, update, delete
+from app import db
+from app.models import Product, Store, StoreInventorySummary
+from app.reports import aggregate_store_performance_rows
+from app.change_stream import note_changes
+
+SUMMARY_FIELDS = ('total_stock_value', 'total_stock', 'spoiled_stock', 'paid_count', 'unpaid_count')
+TRACKED_PRODUCT_FIELDS = ('store_id', 'selling_price', 'stock_quantity', 'spoiled_quantity', 'payment_status')
+IN_CHUNK_SIZE = 500
+
+_PENDING_KEY = 'inventory_summary_pending'
+
+summary_table = StoreInventorySummary.__table__
+
+
+def _contribution(row):
+    stock = row.stock_quantity or 0
+    return (
+        (row.selling_price or 0) * stock,
+        stock,
+        row.spoiled_quantity or 0,
+        1 if row.payment_status == 'paid' else 0,
+        1 if row.payment_status == 'not paid' else 0,
+    )
+
+
+def _accumulate(totals, store_id, values, sign=1):
+    current = totals.get(store_id, (0,) * len(SUMMARY_FIELDS))
+    totals[store_id] = tuple(c + sign * v for c, v in zip(current, values))
+
+
+def product_contributions(connection, product_ids, for_update=False):
+    """Return each store's share of the summary figures for the given product rows.
+
+    ``for_update`` locks the rows so nobody can change them between this read and
+    the caller's write.
+    """
+    totals = {}
+    product_ids = sorted(product_ids) if for_update else list(product_ids)
+    if for_update and product_ids and connection.dialect.name == 'sqlite':
+        # SQLite has no row locks: a no-op write takes the database write lock for this transaction
+        connection.execute(update(summary_table).where(false()).values(store_id=summary_table.c.store_id))
+    for start in range(0, len(product_ids), IN_CHUNK_SIZE):
+        query = select(
+            Product.store_id,
+            Product.selling_price,
+            Product.stock_quantity,
+            Product.spoiled_quantity,
+            Product.payment_status,
+        ).where(Product.id.in_(product_ids[start:start + IN_CHUNK_SIZE]))
+        if for_update:
+            query = query.order_by(Product.id).with_for_update()
+        rows = connection.execute(query)
+        for row in rows:
+            _accumulate(totals, row.store_id, _contribution(row))
+    return totals
+
+
+def diff_contributions(after, before):
+    """Subtract two product_contributions() results, store by store."""
+    deltas = dict(after)
+    for store_id, values in before.items():
+        _accumulate(deltas, store_id, values, sign=-1)
+    return deltas
+
+
+def apply_deltas(connection, deltas):
+    """Add per-store deltas to the summary rows, creating rows that do not exist yet."""
+    for store_id, values in deltas.items():
+        if not any(values):
+            continue
+        changes = dict(zip(SUMMARY_FIELDS, values))
+        result = connection.execute(
+            update(summary_table)
+            .where(summary_table.c.store_id == store_id)
+            .values({name: summary_table.c[name] + value for name, value in changes.items()})
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(summary_table).values(store_id=store_id, **changes))
+
+
+class track_product_changes:
+    """Keep the summary in step with statements that bypass the ORM unit of work.
+
+    Wrap bulk or Core-level writes to ``products``; rows inserted inside the block
+    are registered with ``inserted()``::
+
+        with track_product_changes(product_ids) as tracker:
+            db.session.execute(update(Product)...)
+            tracker.inserted(new_ids)
+    """
+
+    def __init__(self, product_ids, session=None):
+        self.product_ids = list(product_ids)
+        self.inserted_ids = []
+        self.session = session or db.session
+
+    def inserted(self, product_ids):
+        self.inserted_ids.extend(product_ids)
+
+    def __enter__(self):
+        self.before = product_contributions(self.session.connection(), self.product_ids, for_update=True)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            connection = self.session.connection()
+            after = product_contributions(connection, self.product_ids + self.inserted_ids)
+            apply_deltas(connection, diff_contributions(after, self.before))
+            note_changes(self.session, 'product', self.product_ids + self.inserted_ids)
+        return False
+
+
+def _touches_summary(product):
+    state = inspect(product)
+    return any(state.attrs[key].history.has_changes() for key in TRACKED_PRODUCT_FIELDS)
+
+
+# ✅ Snapshot the old figures of every product this flush is about to change
+@event.listens_for(db.session, 'before_flush')
+def _capture_product_changes(session, flush_context, instances):
+    changed_ids = [
+        p.id for p in session.dirty
+        if isinstance(p, Product) and p.id is not None and _touches_summary(p)
+    ]
+    deleted_ids = [p.id for p in session.deleted if isinstance(p, Product) and p.id is not None]
+    new_products = [p for p in session.new if isinstance(p, Product)]
+    new_stores = [s for s in session.new if isinstance(s, Store)]
+    deleted_store_ids = [s.id for s in session.deleted if isinstance(s, Store) and s.id is not None]
+
+    if not (changed_ids or deleted_ids or new_products or new_stores or deleted_store_ids):
+        session.info.pop(_PENDING_KEY, None)
+        return
+
+    connection = session.connection()
+    if deleted_store_ids:
+        connection.execute(delete(summary_table).where(summary_table.c.store_id.in_(deleted_store_ids)))
+
+    session.info[_PENDING_KEY] = {
+        'before': product_contributions(connection, changed_ids + deleted_ids),
+        'changed_ids': changed_ids,
+        'new_products': new_products,
+        'new_stores': new_stores,
+    }
+
+
+# ✅ Apply the difference in the same transaction as the product write
+@event.listens_for(db.session, 'after_flush')
+def _apply_product_changes(session, flush_context):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+
+    connection = session.connection()
+    if pending['new_stores']:
+        connection.execute(insert(summary_table), [{'store_id': store.id} for store in pending['new_stores']])
+
+    after_ids = pending['changed_ids'] + [p.id for p in pending['new_products'] if p.id is not None]
+    after = product_contributions(connection, after_ids)
+    apply_deltas(connection, diff_contributions(after, pending['before']))
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_pending(session, previous_transaction):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def rebuild_summary():
+    """Recompute every summary row from the products table."""
+    rows = aggregate_store_performance_rows()
+    db.session.execute(delete(summary_table))
+    if rows:
+        db.session.execute(insert(summary_table), [
+            {
+                'store_id': row.store_id,
+                'total_stock_value': row.total_revenue,
+                'total_stock': row.total_stock,
+                'spoiled_stock': row.spoiled_stock,
+                'paid_count': row.paid_count,
+                'unpaid_count': row.unpaid_count,
+            } for row in rows
+        ])
+    db.session.commit()
+    return len(rows)
+
+
+def find_drift():
+    """Compare the summary table with a fresh aggregate; return (store_id, field, stored, actual)."""
+    stored = {row.store_id: row for row in db.session.execute(select(summary_table))}
+    drift = []
+    for row in aggregate_store_performance_rows():
+        actual = (row.total_revenue, row.total_stock, row.spoiled_stock, row.paid_count, row.unpaid_count)
+        summary = stored.pop(row.store_id, None)
+        for field, expected in zip(SUMMARY_FIELDS, actual):
+            value = getattr(summary, field) if summary is not None else None
+            if value is None or not math.isclose(value, expected, rel_tol=1e-9, abs_tol=1e-6):
+                drift.append((row.store_id, field, value, expected))
+    for store_id in stored:
+        drift.append((store_id, 'store_id', store_id, None))
+    return drift
+
+
+inventory_summary_cli = AppGroup('inventory-summary', help='Maintain the per-store inventory summary table.')
+
+
+@inventory_summary_cli.command('rebuild')
+def rebuild_command():
+    """Rebuild store_inventory_summary from scratch."""
+    count = rebuild_summary()
+    click.echo(f"✅ Rebuilt inventory summary for {count} stores")
+
+
+@inventory_summary_cli.command('check')
+def check_command():
+    """Report stores whose summary no longer matches the products table."""
+    drift = find_drift()
+    if not drift:
+        click.echo("✅ Inventory summary is in sync")
+        return
+    for store_id, field, stored, actual in drift:
+        click.echo(f"❌ store {store_id}: {field} is {stored}, expected {actual}")
+    raise SystemExit(1)
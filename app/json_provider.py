@@ -0,0 +1,50 @@
+import json
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # Optional speed-up; the stdlib encoder is used without it
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """``app.json`` provider that encodes with orjson when it is installed.
+
+    Output matches the default provider (keys sorted when ``sort_keys`` is set, dates
+    as HTTP dates, Decimal/UUID/dataclass via the same ``default`` hook) except that
+    non-ASCII text is sent as UTF-8 instead of \\u escapes.
+    Pretty-printed debug output and custom ``dumps`` arguments fall back to the stdlib.
+    """
+
+    def _orjson_options(self):
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        return options
+
+    def _encode(self, obj):
+        try:
+            return orjson.dumps(obj, default=self.default, option=self._orjson_options())
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits: let the stdlib have a go
+            return json.dumps(obj, default=self.default, sort_keys=self.sort_keys, ensure_ascii=False,
+                              separators=(',', ':')).encode()
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._encode(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError as e:
+            raise json.JSONDecodeError(str(e), e.doc, e.pos) from None
+
+    def response(self, *args, **kwargs):
+        if orjson is None or self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._encode(obj) + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,303 @@
+import os
+import smtplib
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import bindparam, event, func, select, update
+from app import db
+from app.models import OutboxMessage
+
+DEFAULT_BATCH_SIZE = 50  # Messages claimed and sent per SMTP round
+DEFAULT_MAX_ATTEMPTS = 8  # ~2 hours of retries with the default backoff
+DEFAULT_BACKOFF_BASE = 30  # Seconds before the first retry, doubled each attempt
+DEFAULT_BACKOFF_MAX = 3600
+DEFAULT_CLAIM_SECONDS = 300  # A crashed sender's claims become sendable again after this
+DEFAULT_POLL_INTERVAL = 5
+DEFAULT_SMTP_IDLE = 60  # Close the SMTP session after this long without mail
+
+outbox = OutboxMessage.__table__
+
+_QUEUED_KEY = 'mail_outbox_queued'
+_wakeup = threading.Event()  # Set after a commit that queued mail, so the in-process sender reacts at once
+
+
+def queue_mail(recipient, subject, body, session=None):
+    """Add a message to the outbox in the caller's transaction; nothing is sent unless it commits."""
+    session = session or db.session
+    message = OutboxMessage(recipient=recipient, subject=subject, body=body)
+    session.add(message)
+    session.info[_QUEUED_KEY] = True
+    return message
+
+
+@event.listens_for(db.session, 'after_commit')
+def _wake_sender(session):
+    if session.info.pop(_QUEUED_KEY, False):
+        _wakeup.set()
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _forget_queued(session, previous_transaction):
+    session.info.pop(_QUEUED_KEY, None)
+
+
+def backoff_delay(attempts, base=DEFAULT_BACKOFF_BASE, maximum=DEFAULT_BACKOFF_MAX):
+    """Seconds to wait after the ``attempts``-th failed try: base, 2*base, 4*base, ... capped at ``maximum``."""
+    return min(base * 2 ** (attempts - 1), maximum)
+
+
+def is_permanent(error):
+    """5xx replies and refused recipients will fail the same way again; everything else is retried."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+class SMTPConnection:
+    """A persistent SMTP session reused across batches, reopened when dropped or idle too long."""
+
+    def __init__(self, host, port, username=None, password=None, use_tls=False, use_ssl=False,
+                 timeout=30, idle_timeout=DEFAULT_SMTP_IDLE):
+        self.host, self.port = host, port
+        self.username, self.password = username, password
+        self.use_tls, self.use_ssl = use_tls, use_ssl
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._smtp = None
+        self._last_used = 0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config.get('MAIL_SERVER', 'localhost'), config.get('MAIL_PORT', 25),
+            username=config.get('MAIL_USERNAME'), password=config.get('MAIL_PASSWORD'),
+            use_tls=config.get('MAIL_USE_TLS', False), use_ssl=config.get('MAIL_USE_SSL', False),
+            timeout=config.get('MAIL_TIMEOUT', 30), idle_timeout=config.get('MAIL_SMTP_IDLE', DEFAULT_SMTP_IDLE),
+        )
+
+    def _open(self):
+        smtp_class = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        smtp = smtp_class(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            smtp.starttls()
+        if self.username and self.password:
+            smtp.login(self.username, self.password)
+        self._smtp = smtp
+
+    def send(self, message):
+        if self._smtp is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self.close()
+        if self._smtp is None:
+            self._open()
+        try:
+            self._smtp.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            # The server timed the idle session out: one fresh connection, then give up
+            self.close()
+            self._open()
+            self._smtp.send_message(message)
+        self._last_used = time.monotonic()
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+
+class OutboxSender:
+    """Claims due outbox rows in batches and sends them over one SMTP connection.
+
+    Claims are made with a single UPDATE (SKIP LOCKED on PostgreSQL) so several
+    senders can run at once; a sender that dies mid-batch loses its claim after
+    MAIL_OUTBOX_CLAIM_SECONDS. Failed messages are retried with exponential
+    backoff until MAIL_OUTBOX_MAX_ATTEMPTS, permanent SMTP errors fail at once.
+    """
+
+    def __init__(self, app, connection=None):
+        config = app.config
+        self.app = app
+        self.connection = connection or SMTPConnection.from_config(config)
+        self.sender = config.get('MAIL_DEFAULT_SENDER') or config.get('MAIL_USERNAME')
+        if not self.sender:
+            raise ValueError("Set MAIL_DEFAULT_SENDER or MAIL_USERNAME to send queued mail")
+        self.batch_size = config.get('MAIL_OUTBOX_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+        self.max_attempts = config.get('MAIL_OUTBOX_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+        self.backoff_base = config.get('MAIL_OUTBOX_BACKOFF_BASE', DEFAULT_BACKOFF_BASE)
+        self.backoff_max = config.get('MAIL_OUTBOX_BACKOFF_MAX', DEFAULT_BACKOFF_MAX)
+        self.claim_seconds = config.get('MAIL_OUTBOX_CLAIM_SECONDS', DEFAULT_CLAIM_SECONDS)
+        self.poll_interval = config.get('MAIL_OUTBOX_POLL_INTERVAL', DEFAULT_POLL_INTERVAL)
+
+    def claim(self):
+        """Take up to ``batch_size`` due messages (pending, or claimed by a sender that timed out)."""
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        due = (outbox.c.status.in_(('pending', 'sending')), outbox.c.next_attempt_at <= now)
+        batch = (
+            select(outbox.c.id).where(*due)
+            .order_by(outbox.c.next_attempt_at, outbox.c.id)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        db.session.execute(
+            update(outbox)
+            .where(outbox.c.id.in_(batch.scalar_subquery()), *due)
+            .values(status='sending', claimed_by=token, next_attempt_at=now + timedelta(seconds=self.claim_seconds))
+        )
+        rows = db.session.execute(
+            select(outbox.c.id, outbox.c.recipient, outbox.c.subject, outbox.c.body, outbox.c.attempts)
+            .where(outbox.c.claimed_by == token, outbox.c.status == 'sending')
+            .order_by(outbox.c.id)
+        ).all()
+        db.session.commit()
+        return token, rows
+
+    def _message(self, row):
+        message = EmailMessage()
+        message['From'] = self.sender
+        message['To'] = row.recipient
+        message['Subject'] = row.subject
+        message.set_content(row.body)
+        return message
+
+    def send_batch(self):
+        """Send one claimed batch; returns counts of sent, retried and failed messages."""
+        token, rows = self.claim()
+        sent, failures = [], []
+        for position, row in enumerate(rows):
+            try:
+                self.connection.send(self._message(row))
+                sent.append(row.id)
+            except (smtplib.SMTPException, OSError) as error:
+                if is_permanent(error):
+                    failures.append((row, error, True))
+                    continue
+                # The server is unreachable: defer the rest of the batch rather than retrying each
+                self.connection.close()
+                failures += [(pending, error, False) for pending in rows[position:]]
+                break
+
+        now = datetime.utcnow()
+        if sent:
+            db.session.execute(
+                update(outbox)
+                .where(outbox.c.id.in_(sent), outbox.c.claimed_by == token)
+                .values(status='sent', sent_at=now, attempts=outbox.c.attempts + 1, claimed_by=None, last_error=None)
+            )
+        counts = {'sent': len(sent), 'retried': 0, 'failed': 0}
+        if failures:
+            params = []
+            for row, error, permanent in failures:
+                attempts = row.attempts + 1
+                gave_up = permanent or attempts >= self.max_attempts
+                counts['failed' if gave_up else 'retried'] += 1
+                params.append({
+                    'b_id': row.id,
+                    'b_status': 'failed' if gave_up else 'pending',
+                    'b_attempts': attempts,
+                    'b_next': now + timedelta(seconds=backoff_delay(attempts, self.backoff_base, self.backoff_max)),
+                    'b_error': str(error)[:500],
+                })
+            db.session.execute(
+                update(outbox)
+                .where(outbox.c.id == bindparam('b_id'), outbox.c.claimed_by == token)
+                .values(status=bindparam('b_status'), attempts=bindparam('b_attempts'),
+                        next_attempt_at=bindparam('b_next'), last_error=bindparam('b_error'), claimed_by=None),
+                params,
+            )
+        db.session.commit()
+        return counts
+
+    def run(self, stop=None, once=False):
+        """Send until nothing is due (``once``) or until ``stop`` is set, sleeping between empty polls.
+
+        A polling sender logs a failed round (a locked database, a message that
+        cannot be built) and tries again after ``poll_interval``; its claims
+        expire, so nothing is lost. With ``once`` the error is raised instead.
+        """
+        stop = stop or threading.Event()
+        totals = {'sent': 0, 'retried': 0, 'failed': 0}
+        try:
+            while not stop.is_set():
+                with self.app.app_context():
+                    try:
+                        counts = self.send_batch()
+                    except Exception:
+                        db.session.rollback()
+                        if once:
+                            raise
+                        self.app.logger.exception('Mail outbox: send round failed; retrying')
+                        stop.wait(self.poll_interval)
+                        continue
+                    finally:
+                        db.session.remove()
+                for key in totals:
+                    totals[key] += counts[key]
+                if sum(counts.values()) < self.batch_size:
+                    if once:
+                        break
+                    _wakeup.wait(self.poll_interval)
+                    _wakeup.clear()
+        finally:
+            self.connection.close()
+        return totals
+
+
+def outbox_status():
+    """Message counts per status."""
+    rows = db.session.execute(select(outbox.c.status, func.count()).group_by(outbox.c.status))
+    return dict(rows.all())
+
+
+def start_background_sender(app):
+    """Run a sender on a daemon thread in this process (MAIL_OUTBOX_WORKER='thread')."""
+    stop = threading.Event()
+    thread = threading.Thread(target=OutboxSender(app).run, kwargs={'stop': stop}, daemon=True,
+                              name='mail-outbox-sender')
+    thread.start()
+    return stop
+
+
+def init_background_sender(app):
+    """Start the thread sender on each process's first request rather than at boot.
+
+    A gunicorn master that preloads the app then forks workers with no thread
+    to lose: each worker starts its own sender when it begins serving.
+    """
+    if not (app.config.get('MAIL_DEFAULT_SENDER') or app.config.get('MAIL_USERNAME')):
+        raise ValueError("MAIL_OUTBOX_WORKER='thread' needs MAIL_DEFAULT_SENDER or MAIL_USERNAME")
+    lock = threading.Lock()
+    started_in = []
+
+    @app.before_request
+    def ensure_sender():
+        if started_in[-1:] != [os.getpid()]:
+            with lock:
+                if started_in[-1:] != [os.getpid()]:
+                    start_background_sender(app)
+                    started_in.append(os.getpid())
+
+
+outbox_cli = AppGroup('outbox', help='Send and inspect queued mail.')
+
+
+@outbox_cli.command('run')
+@click.option('--once', is_flag=True, help='Exit when nothing is due instead of polling.')
+def run_command(once):
+    """Send queued mail; point MAIL_SERVER/MAIL_PORT at a debugging SMTP server to test locally."""
+    totals = OutboxSender(current_app._get_current_object()).run(once=once)
+    click.echo(f"✅ Sent {totals['sent']}, retrying {totals['retried']}, failed {totals['failed']}")
+
+
+@outbox_cli.command('status')
+def status_command():
+    """Show how many messages are pending, sending, sent and failed."""
+    for status, count in sorted(outbox_status().items()):
+        click.echo(f"{status}: {count}")
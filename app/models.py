@@ -1,7 +1,7 @@
 from app import db
 from datetime import datetime, timedelta
 from sqlalchemy.orm import relationship
-from sqlalchemy import ForeignKey
+from sqlalchemy import DDL, ForeignKey, event
 
 
 class User(db.Model):
@@ -16,7 +16,7 @@ class User(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    store = db.relationship('Store', back_populates='merchant')
+    store = db.relationship('Store', foreign_keys=[store_id])
     supply_requests = db.relationship('SupplyRequest', backref='requesting_clerk', lazy=True)
 
     def __repr__(self):
@@ -30,7 +30,7 @@ class Store(db.Model):
     merchant_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    merchant = db.relationship('User', back_populates='store', foreign_keys=[merchant_id])
+    merchant = db.relationship('User', foreign_keys=[merchant_id])
     products = db.relationship('Product', backref='store', lazy=True)
     supply_requests = db.relationship('SupplyRequest', backref='store', lazy=True)
 
@@ -48,13 +48,50 @@ class Product(db.Model):
     spoiled_quantity = db.Column(db.Integer, default=0)
     payment_status = db.Column(db.String(20), default="not paid")  # paid/not paid
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    revenue = db.Column(db.Float, db.Computed('selling_price * stock_quantity', persisted=True))  # stored, indexed for rankings
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # optimistic concurrency
 
     store_id = db.Column(db.Integer, db.ForeignKey('stores.id'), nullable=False)
     supply_requests = db.relationship('SupplyRequest', backref='requested_product', lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_products_revenue', 'revenue'),
+        db.Index('ix_products_stock_quantity', 'stock_quantity'),
+        db.Index('ix_products_spoiled_quantity', 'spoiled_quantity'),
+        db.Index('ix_products_store_id_revenue', 'store_id', 'revenue'),
+        db.Index('ix_products_store_id_stock_quantity', 'store_id', 'stock_quantity'),
+        db.Index('ix_products_store_id_spoiled_quantity', 'store_id', 'spoiled_quantity'),
+        db.Index('ix_products_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),  # product search
+    )
+    __mapper_args__ = {'version_id_col': version}
+
     def __repr__(self):
         return f'<Product {self.name} - Stock: {self.stock_quantity}>'
 
+# ✅ Product search index (app/product_search.py). SQLite: a contentless FTS5 table of name + store token,
+# kept in step by triggers (stock writes don't touch it). PostgreSQL: the trigram index above.
+PRODUCT_SEARCH_SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS products_search USING fts5("
+    "name, store, content='', prefix='1 2 3', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS products_search_terms USING fts5vocab(products_search, 'col')",
+    "CREATE TRIGGER IF NOT EXISTS products_search_insert AFTER INSERT ON products BEGIN "
+    "INSERT INTO products_search (rowid, name, store) VALUES (new.id, new.name, 's' || new.store_id); END",
+    "CREATE TRIGGER IF NOT EXISTS products_search_delete AFTER DELETE ON products BEGIN "
+    "INSERT INTO products_search (products_search, rowid, name, store) "
+    "VALUES ('delete', old.id, old.name, 's' || old.store_id); END",
+    "CREATE TRIGGER IF NOT EXISTS products_search_update AFTER UPDATE OF name, store_id ON products BEGIN "
+    "INSERT INTO products_search (products_search, rowid, name, store) "
+    "VALUES ('delete', old.id, old.name, 's' || old.store_id); "
+    "INSERT INTO products_search (rowid, name, store) VALUES (new.id, new.name, 's' || new.store_id); END",
+)
+event.listen(Product.__table__, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+for _statement in PRODUCT_SEARCH_SQLITE_DDL:
+    event.listen(Product.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+for _table in ('products_search_terms', 'products_search'):
+    event.listen(Product.__table__, 'after_drop', DDL(f'DROP TABLE IF EXISTS {_table}').execute_if(dialect='sqlite'))
+
 class SupplyRequest(db.Model):
     __tablename__ = "supply_requests"
 
@@ -70,3 +107,50 @@ class SupplyRequest(db.Model):
 
     def __repr__(self):
         return f'<SupplyRequest {self.id} - {self.status}>'
+
+class StoreInventorySummary(db.Model):
+    __tablename__ = "store_inventory_summary"
+
+    store_id = db.Column(db.Integer, db.ForeignKey('stores.id'), primary_key=True)
+    total_stock_value = db.Column(db.Float, nullable=False, default=0)
+    total_stock = db.Column(db.Integer, nullable=False, default=0)
+    spoiled_stock = db.Column(db.Integer, nullable=False, default=0)
+    paid_count = db.Column(db.Integer, nullable=False, default=0)
+    unpaid_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<StoreInventorySummary store={self.store_id} - Stock: {self.total_stock}>'
+
+class InviteToken(db.Model):
+    __tablename__ = "invite_tokens"
+
+    id = db.Column(db.Integer, primary_key=True)
+    token = db.Column(db.String(128), unique=True, nullable=False)
+    email = db.Column(db.String(120), nullable=False)
+    role = db.Column(db.String(20), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<InviteToken {self.email} - {self.role}>'
+
+class OutboxMessage(db.Model):
+    __tablename__ = "mail_outbox"
+
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claimed_by = db.Column(db.String(32), nullable=True)  # Sender currently holding the row
+    last_error = db.Column(db.String(500), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_mail_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+    def __repr__(self):
+        return f'<OutboxMessage {self.id} to {self.recipient} - {self.status}>'
@@ -0,0 +1,80 @@
+import base64
+import binascii
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+PAGINATION_ARGS = ('limit', 'cursor', 'fields')
+
+
+def wants_pagination(args):
+    """Clients opt into the paginated envelope by sending limit, cursor or fields."""
+    return any(name in args for name in PAGINATION_ARGS)
+
+
+def encode_cursor(key):
+    payload = json.dumps({'k': key}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the integer key stored in an opaque cursor, or raise ValueError."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode()))['k']
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+        raise ValueError('Invalid cursor') from None
+    if type(key) is not int:  # Cursors are client-supplied: never hand the database a string, list or bool
+        raise ValueError('Invalid cursor')
+    return key
+
+
+def _parse_args(args, fields):
+    limit = args.get('limit', type=int) if 'limit' in args else DEFAULT_PAGE_SIZE
+    if limit is None or limit < 1:
+        return None, None, None, 'limit must be a positive integer'
+
+    after = None
+    if args.get('cursor'):
+        try:
+            after = decode_cursor(args['cursor'])
+        except ValueError as e:
+            return None, None, None, str(e)
+
+    selected = list(fields)
+    if args.get('fields'):
+        selected = [name.strip() for name in args['fields'].split(',') if name.strip()]
+        unknown = [name for name in selected if name not in fields]
+        if unknown or not selected:
+            return None, None, None, f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(fields)}"
+
+    return min(limit, MAX_PAGE_SIZE), after, selected, None
+
+
+# ✅ Keyset (seek) pagination: deep pages cost the same as the first one
+def keyset_page(query, key_column, fields, args):
+    """Run ``query`` one page at a time, selecting only the requested columns.
+
+    ``fields`` maps output names to columns; ``key_column`` must be unique and indexed
+    (normally the primary key). Returns ``(envelope, error)``.
+    """
+    limit, after, selected, error = _parse_args(args, fields)
+    if error:
+        return None, error
+
+    query = query.with_entities(key_column.label('_key'), *(fields[name].label(name) for name in selected))
+    if after is not None:
+        query = query.filter(key_column > after)
+    rows = query.order_by(key_column).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "items": [{name: getattr(row, name) for name in selected} for row in rows],
+        "pagination": {
+            "limit": limit,
+            "has_more": has_more,
+            "next_cursor": encode_cursor(rows[-1]._key) if has_more else None
+        }
+    }, None
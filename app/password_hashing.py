@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+DEFAULT_METHOD = 'pbkdf2:sha256'
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_TIMEOUT = 10  # seconds to wait for a hash before giving up
+DEFAULT_RETRY_AFTER = 1  # seconds, sent to clients when the pool is saturated
+
+
+class HashingPoolBusy(Exception):
+    """Raised when the hashing pool is saturated or too slow; maps to HTTP 503."""
+
+    def __init__(self, retry_after=DEFAULT_RETRY_AFTER):
+        super().__init__('Password hashing pool is busy')
+        self.retry_after = retry_after
+
+
+def normalise_method(method):
+    """Spell out werkzeug's implicit defaults, e.g. 'pbkdf2:sha256' -> 'pbkdf2:sha256:1000000'."""
+    name, *args = method.split(':')
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = args[1] if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    if name == 'scrypt' and not args:
+        return 'scrypt:32768:8:1'
+    return method
+
+
+class PasswordHasher:
+    """Runs password hashing and verification on a process pool so request threads stay free.
+
+    At most ``max_pending`` operations may be queued or running; beyond that callers get
+    HashingPoolBusy immediately instead of piling up behind the CPU-bound work. With
+    ``workers=0`` everything runs inline, which is what tests and one-off scripts want.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._executor_pid = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._metrics = {}
+
+    def _config(self, key, default):
+        return current_app.config.get(key, default)
+
+    def _pool(self):
+        workers = self._config('PASSWORD_HASH_WORKERS', DEFAULT_WORKERS)
+        if workers <= 0:
+            return None
+
+        # Recreate after fork so gunicorn workers never share a parent's pool
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=workers)
+                self._executor_pid = os.getpid()
+                max_pending = self._config('PASSWORD_HASH_MAX_PENDING', workers * 8)
+                self._slots = threading.BoundedSemaphore(max_pending)
+            return self._executor
+
+    def _run(self, operation, fn, *args):
+        started = time.perf_counter()
+        pool = self._pool()
+        if pool is None:
+            result = fn(*args)
+            self._record(operation, time.perf_counter() - started)
+            return result
+
+        retry_after = self._config('PASSWORD_HASH_RETRY_AFTER', DEFAULT_RETRY_AFTER)
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            self._record(operation, None, rejected=True)
+            raise HashingPoolBusy(retry_after)
+        try:
+            future = pool.submit(fn, *args)
+        except BaseException:
+            slots.release()
+            raise
+        # Freed when the worker is done, not when we stop waiting: a timed-out hash still occupies it
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            result = future.result(timeout=self._config('PASSWORD_HASH_TIMEOUT', DEFAULT_TIMEOUT))
+        except FutureTimeoutError:
+            future.cancel()  # Only stops it if it has not started yet
+            self._record(operation, None, rejected=True)
+            raise HashingPoolBusy(retry_after) from None
+
+        self._record(operation, time.perf_counter() - started)
+        return result
+
+    def _record(self, operation, elapsed, rejected=False):
+        with self._metrics_lock:
+            m = self._metrics.setdefault(operation, {'count': 0, 'rejected': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+            if rejected:
+                m['rejected'] += 1
+                return
+            m['count'] += 1
+            m['total_seconds'] += elapsed
+            m['max_seconds'] = max(m['max_seconds'], elapsed)
+
+    def stats(self):
+        """Per-operation counts, rejections and timings (queue wait included)."""
+        with self._metrics_lock:
+            return {op: dict(m) for op, m in self._metrics.items()}
+
+    def target_method(self):
+        return normalise_method(self._config('PASSWORD_HASH_METHOD', DEFAULT_METHOD))
+
+    def hash(self, password):
+        return self._run('hash', generate_password_hash, password, self.target_method())
+
+    def verify(self, password_hash, password):
+        return self._run('verify', check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True when a stored hash was produced with different parameters than configured."""
+        stored_method = password_hash.split('$', 1)[0]
+        return stored_method != self.target_method()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._executor_pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._executor_pid = None
+
+
+password_hasher = PasswordHasher()
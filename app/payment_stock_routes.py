@@ -2,11 +2,18 @@ from flask import Blueprint, jsonify, request
 from app.models import Product, User
 from app import db
 from app.routes import token_required
+from app.stock_service import set_stock, StockConflict
+from app.query_budget import query_budget
+from app.replicas import read_only
+from app.serializers import PAYMENT_ITEM
+from app.conditional import listing_validators, is_not_modified, not_modified, with_validators
 
 payment_stock_bp = Blueprint('payment_stock', __name__)
 
 # ✅ View Paid & Unpaid Products (Admins & Merchants)
 @payment_stock_bp.route('/payments', methods=['GET'])
+@read_only
+@query_budget(4)
 @token_required
 def get_payment_status(current_user):
     if current_user.role not in ['admin', 'merchant']:
@@ -18,19 +25,18 @@ def get_payment_status(current_user):
     if store_id:
         query = query.filter_by(store_id=store_id)
 
-    paid_products = query.filter_by(payment_status='paid').all()
-    unpaid_products = query.filter_by(payment_status='not paid').all()
+    validators = listing_validators(query)
+    if is_not_modified(validators):
+        return not_modified(validators)
 
-    return jsonify({
-        "paid_products": [
-            {"id": p.id, "name": p.name, "price": p.selling_price, "stock": p.stock_quantity}
-            for p in paid_products
-        ],
-        "unpaid_products": [
-            {"id": p.id, "name": p.name, "price": p.selling_price, "stock": p.stock_quantity}
-            for p in unpaid_products
-        ]
-    }), 200
+    rows = query.with_entities(*PAYMENT_ITEM.columns())
+    paid_products = PAYMENT_ITEM.dump_many(rows.filter(Product.payment_status == 'paid'))
+    unpaid_products = PAYMENT_ITEM.dump_many(rows.filter(Product.payment_status == 'not paid'))
+
+    return with_validators(jsonify({
+        "paid_products": paid_products,
+        "unpaid_products": unpaid_products
+    }), validators), 200
 
 # ✅ Mark Product as Paid (Admins Only)
 @payment_stock_bp.route('/payments/<int:product_id>', methods=['PUT'])
@@ -58,18 +64,15 @@ def update_stock(current_user, product_id):
     if current_user.role != 'clerk':
         return jsonify({'message': 'Permission denied'}), 403
 
-    product = Product.query.get(product_id)
-    if not product:
-        return jsonify({'message': 'Product not found'}), 404
-
     data = request.get_json()
-    stock_quantity = data.get('stock_quantity')
-    spoiled_quantity = data.get('spoiled_quantity')
+    changes = {key: data[key] for key in ['stock_quantity', 'spoiled_quantity'] if data.get(key) is not None}
 
-    if stock_quantity is not None:
-        product.stock_quantity = stock_quantity
-    if spoiled_quantity is not None:
-        product.spoiled_quantity = spoiled_quantity
+    try:
+        row = set_stock(product_id, expected_version=data.get('version'), **changes)
+    except StockConflict as e:
+        return jsonify({'message': 'Stock was changed by someone else, reload and retry', 'version': e.current_version}), 409
+    if row is None:
+        return jsonify({'message': 'Product not found'}), 404
 
     db.session.commit()
-    return jsonify({'message': 'Stock details updated successfully'}), 200
+    return jsonify({'message': 'Stock details updated successfully', 'version': row.version}), 200
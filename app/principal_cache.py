@@ -0,0 +1,99 @@
+"""Authenticated principals cached for token_required, so most requests skip the users query.
+
+The cache is per process. The user routes drop a user's entries on the worker that changed
+them; every other worker keeps its cached principal until the entry's PRINCIPAL_CACHE_TTL
+runs out. That TTL is therefore the longest a deactivated or deleted user stays signed in.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from flask import current_app
+from app import db
+from app.models import User
+
+DEFAULT_TTL = 60  # seconds
+DEFAULT_MAX_SIZE = 1024
+
+# Immutable, session-free snapshot of the authenticated user
+Principal = namedtuple('Principal', ['id', 'email', 'role', 'store_id', 'is_active'])
+
+
+class PrincipalCache:
+    """Bounded LRU of (user_id, token) -> Principal with a per-entry TTL."""
+
+    def __init__(self, ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (user_id, token) -> (expires_at, principal)
+        self._keys_by_user = {}  # user_id -> set of keys, for invalidation
+        self._lock = threading.Lock()
+
+    def get(self, user_id, token):
+        key = (user_id, token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._discard(key)
+            self.misses += 1
+            return None
+
+    def put(self, user_id, token, principal, ttl=None):
+        key = (user_id, token)
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, principal)
+            self._entries.move_to_end(key)
+            self._keys_by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, user_id):
+        """Drop every cached token for a user, e.g. after a status change or deletion."""
+        with self._lock:
+            for key in self._keys_by_user.pop(user_id, ()):
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+    def _discard(self, key):
+        self._entries.pop(key, None)
+        keys = self._keys_by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[key[0]]
+
+
+principal_cache = PrincipalCache()
+
+
+def snapshot(user):
+    return Principal(id=user.id, email=user.email, role=user.role, store_id=user.store_id, is_active=user.is_active)
+
+
+def load_principal(user_id, token):
+    """Return the cached Principal for a decoded token, querying the user only on a miss."""
+    principal = principal_cache.get(user_id, token)
+    if principal is not None:
+        return principal
+
+    user = db.session.get(User, user_id)
+    if not user:
+        return None
+
+    principal = snapshot(user)
+    principal_cache.put(user_id, token, principal, ttl=current_app.config.get('PRINCIPAL_CACHE_TTL'))
+    return principal
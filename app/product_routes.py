@@ -2,6 +2,12 @@ from flask import Blueprint, jsonify, request
 from app.models import Product, Store
 from app import db
 from app.routes import token_required
+from app.pagination import wants_pagination, keyset_page
+from app.stock_service import set_stock, StockConflict
+from app.query_budget import query_budget
+from app.replicas import read_only
+from app.serializers import PRODUCT
+from app.conditional import listing_validators, is_not_modified, not_modified, with_validators
 
 product_bp = Blueprint('product', __name__)
 
@@ -40,42 +46,52 @@ def add_product(current_user):
 
 # ✅ Get All Products (Merchant & Admin)
 @product_bp.route('/products', methods=['GET'])
+@read_only
+@query_budget(3)
 @token_required
 def get_products(current_user):
     if current_user.role == 'admin':
-        products = Product.query.all()
+        query = Product.query
     elif current_user.role == 'merchant':
-        products = Product.query.join(Store).filter(Store.merchant_id == current_user.id).all()
+        query = Product.query.join(Store).filter(Store.merchant_id == current_user.id)
     else:
         return jsonify({'message': 'Permission denied'}), 403
 
-    return jsonify([
-        {
-            "id": product.id,
-            "name": product.name,
-            "buying_price": product.buying_price,
-            "selling_price": product.selling_price,
-            "stock_quantity": product.stock_quantity,
-            "store_id": product.store_id
-        }
-        for product in products
-    ]), 200
+    validators = listing_validators(query, scope=f'{current_user.role}:{current_user.id}')
+    if is_not_modified(validators):
+        return not_modified(validators)
+
+    if wants_pagination(request.args):
+        page, error = keyset_page(query, Product.id, PRODUCT.fields, request.args)
+        if error:
+            return jsonify({'message': error}), 400
+        return with_validators(jsonify(page), validators), 200
+
+    products = PRODUCT.dump_many(query.with_entities(*PRODUCT.columns()))
+
+    return with_validators(jsonify(products), validators), 200
 
 # ✅ Update Product (Merchant Only)
 @product_bp.route('/products/<int:product_id>', methods=['PUT'])
+@query_budget(8)
 @token_required
 def update_product(current_user, product_id):
     if current_user.role != 'merchant':
         return jsonify({'message': 'Permission denied'}), 403
 
-    product = Product.query.get(product_id)
-    if not product or product.store.merchant_id != current_user.id:
+    # One query for the product and its owner instead of lazy-loading product.store
+    product = Product.query.join(Store).filter(Product.id == product_id, Store.merchant_id == current_user.id).first()
+    if not product:
         return jsonify({'message': 'Product not found or unauthorized access'}), 403
 
     data = request.get_json()
-    for key in ['name', 'buying_price', 'selling_price', 'stock_quantity']:
-        if key in data:
-            setattr(product, key, data[key])
+    changes = {key: data[key] for key in ['name', 'buying_price', 'selling_price', 'stock_quantity'] if key in data}
+
+    try:
+        # Compare-and-set against the version the client saw (or the one we just read)
+        set_stock(product.id, expected_version=data.get('version', product.version), **changes)
+    except StockConflict as e:
+        return jsonify({'message': 'Product was changed by someone else, reload and retry', 'version': e.current_version}), 409
 
     db.session.commit()
     return jsonify({'message': 'Product updated successfully'}), 200
@@ -87,8 +103,9 @@ def delete_product(current_user, product_id):
     if current_user.role != 'merchant':
         return jsonify({'message': 'Permission denied'}), 403
 
-    product = Product.query.get(product_id)
-    if not product or product.store.merchant_id != current_user.id:
+    # One query for the product and its owner instead of lazy-loading product.store
+    product = Product.query.join(Store).filter(Product.id == product_id, Store.merchant_id == current_user.id).first()
+    if not product:
         return jsonify({'message': 'Product not found or unauthorized access'}), 403
 
     db.session.delete(product)
@@ -0,0 +1,221 @@
+"""Product name search within one store: prefix and typo-tolerant matching, ranked.
+
+SQLite matches every query word as a prefix in the products_search FTS5 table
+(see PRODUCT_SEARCH_SQLITE_DDL in models.py); when that finds fewer rows than
+asked for, alphabetic words are also matched against close spellings taken
+from the index vocabulary (cached per process). PostgreSQL matches substrings and word similarity
+(``<%``) through the pg_trgm index on products.name.
+
+Either way at most SEARCH_CANDIDATES rows come back from the database, and
+rank() orders them: exact name, name prefix, every word prefix-matched, fuzzy.
+"""
+import re
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+from flask import current_app
+from sqlalchemy import and_, event, func, literal, or_, select, text
+from app import db
+from app.models import Product, PRODUCT_SEARCH_SQLITE_DDL
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+MAX_TERMS = 6
+SEARCH_CANDIDATES = 200  # Rows fetched per query before ranking; bounds the work for common prefixes
+FUZZY_MIN_LENGTH = 3  # Shorter words are only prefix-matched
+PREFIX_INDEXED = 3  # Longest prefix in the FTS5 prefix index (prefix='1 2 3' in models.py)
+MAX_COMPLETIONS = 20  # Known words a longer prefix may expand to before it is left as a prefix query
+VOCABULARY_TTL = 300  # seconds
+TIERS = ('exact', 'prefix', 'words', 'fuzzy')
+
+SQLITE_TRIGGERS = ('products_search_insert', 'products_search_delete', 'products_search_update')
+
+_WORD = re.compile(r'\w+')
+_vocabulary = {}  # database URL -> (expires_at, {first letter: [words]}), SQLite only
+_vocabulary_lock = threading.Lock()
+
+
+def fold(value):
+    """Lower-case and strip accents the way the FTS5 tokenizer does."""
+    value = unicodedata.normalize('NFKD', value.casefold())
+    return ''.join(char for char in value if not unicodedata.combining(char))
+
+
+def terms_of(query):
+    return _WORD.findall(fold(query))[:MAX_TERMS]
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance (a swap counts as one edit), or limit + 1 once it is exceeded."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, char_b in enumerate(b, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def max_typos(term):
+    return 1 if len(term) < 6 else 2
+
+
+def _tier(name, terms):
+    words = _WORD.findall(fold(name))
+    if words == terms:
+        return 0
+    if ' '.join(words).startswith(' '.join(terms)):
+        return 1
+    if all(any(word.startswith(term) for word in words) for term in terms):
+        return 2
+    return 3
+
+
+def rank(rows, terms, limit):
+    """Best ``limit`` rows (with a ``name`` attribute) and their tier, best first; ties go to shorter names."""
+    tiered = sorted(((_tier(row.name, terms), row) for row in rows),
+                    key=lambda pair: (pair[0], len(pair[1].name), pair[1].name, pair[1].id))
+    return [(row, TIERS[tier]) for tier, row in tiered[:limit]]
+
+
+def _fts_phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _sqlite_vocabulary(connection):
+    """Alphabetic words of the name index by first letter, re-read every SEARCH_VOCABULARY_TTL seconds.
+
+    fts5vocab walks every posting list on each read (~100 ms at 1M products), far too slow per keystroke;
+    the words themselves change rarely, so a new word is completed and corrected after at most one TTL.
+    """
+    key = str(connection.engine.url)
+    entry = _vocabulary.get(key)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+    with _vocabulary_lock:
+        entry = _vocabulary.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        words = {}
+        for word, in connection.exec_driver_sql(
+                "SELECT term FROM products_search_terms WHERE col = 'name' AND term >= 'a'"):
+            if word.isalpha():
+                words.setdefault(word[0], []).append(word)
+        ttl = current_app.config.get('SEARCH_VOCABULARY_TTL', VOCABULARY_TTL)
+        _vocabulary[key] = (time.monotonic() + ttl, words)
+        return words
+
+
+@event.listens_for(Product, 'after_insert')
+@event.listens_for(Product, 'after_update')
+def _forget_vocabulary(mapper, connection, target):
+    """A product written here with a word the cached vocabulary lacks makes this process re-read it."""
+    entry = _vocabulary.get(str(connection.engine.url))
+    name = target.__dict__.get('name')  # Unloaded means unchanged; never lazy-load inside a flush
+    if entry is not None and name and any(word not in entry[1].get(word[0], ())
+                                          for word in _WORD.findall(fold(name)) if word.isalpha()):
+        _vocabulary.pop(str(connection.engine.url), None)
+
+
+def _sqlite_corrections(vocabulary, terms):
+    """Indexed words within a few typos of each term, or of its first len(term) letters (a word still being typed)."""
+    # Numbers and codes are only prefix-matched; so are words with a typo in the first letter
+    fuzzy = [term for term in terms if len(term) >= FUZZY_MIN_LENGTH and term.isalpha()]
+    if not fuzzy:
+        return {}
+    corrections = {}
+    for term in fuzzy:
+        typos = max_typos(term)
+        corrections[term] = [word for word in vocabulary.get(term[0], ()) if word != term and
+                             len(word) >= len(term) - typos and
+                             min(edit_distance(term, word, typos), edit_distance(term, word[:len(term)], typos)) <= typos]
+    return corrections
+
+
+def _sqlite_alternatives(term, vocabulary, corrections):
+    """FTS5 OR-group for one term.
+
+    Prefixes up to PREFIX_INDEXED letters are read straight from the prefix index. Longer ones
+    would make FTS5 merge every posting of the prefix before the store filter applies, so they
+    become the known words they start (falling back to a prefix query when none are known).
+    """
+    completions = []
+    if len(term) > PREFIX_INDEXED and term.isalpha():
+        completions = [word for word in vocabulary.get(term[0], ()) if word.startswith(term)]
+    if completions and len(completions) <= MAX_COMPLETIONS:
+        alternatives = [_fts_phrase(word) for word in completions]
+    else:
+        alternatives = [_fts_phrase(term) + '*']
+    alternatives += [_fts_phrase(word) for word in corrections if word not in completions]
+    return '(' + ' OR '.join(alternatives) + ')'
+
+
+def _sqlite_candidates(store_id, terms, columns, fuzzy):
+    # Bound as a SELECT so a read-only request stays on its replica (a bare connection() pins the primary)
+    connection = db.session.connection(bind_arguments={'clause': select(Product.id)})
+    vocabulary = _sqlite_vocabulary(connection)
+    corrections = _sqlite_corrections(vocabulary, terms) if fuzzy else {}
+    groups = [_sqlite_alternatives(term, vocabulary, corrections.get(term, ())) for term in terms]
+    match = f"store:{_fts_phrase(f's{store_id}')} AND name:({' AND '.join(groups)})"
+    ids = select(text('rowid')).select_from(text('products_search')).where(
+        text('products_search MATCH :match')).limit(SEARCH_CANDIDATES).scalar_subquery()
+    query = select(*columns).where(Product.id.in_(ids))
+    return db.session.execute(query, {'match': match}).all()
+
+
+def _postgresql_candidates(store_id, terms, columns):
+    phrase = ' '.join(terms)
+    matches = or_(
+        and_(*[Product.name.icontains(term, autoescape=True) for term in terms]),
+        literal(phrase).op('<%')(Product.name),  # word_similarity above pg_trgm.word_similarity_threshold
+    )
+    query = (select(*columns).where(Product.store_id == store_id, matches)
+             .order_by(func.word_similarity(phrase, Product.name).desc()).limit(SEARCH_CANDIDATES))
+    return db.session.execute(query).all()
+
+
+def search_products(store_id, query, columns, limit=DEFAULT_LIMIT):
+    """Ranked ``(row, tier)`` pairs for ``query`` in one store; ``columns`` must include id and name."""
+    terms = terms_of(query)
+    if not terms:
+        return []
+    if db.engine.dialect.name == 'postgresql':  # Not session.get_bind(): without a SELECT it pins the primary
+        return rank(_postgresql_candidates(store_id, terms, columns), terms, limit)
+
+    rows = _sqlite_candidates(store_id, terms, columns, fuzzy=False)
+    if len(rows) < limit:  # Typo tolerance only when the prefixes alone come up short
+        rows = _sqlite_candidates(store_id, terms, columns, fuzzy=True)
+    return rank(rows, terms, limit)
+
+
+def rebuild_search_index(connection):
+    """Refill products_search from products (SQLite), e.g. after loading rows with the triggers dropped."""
+    if connection.dialect.name != 'sqlite':
+        return
+    connection.exec_driver_sql("INSERT INTO products_search (products_search) VALUES ('delete-all')")
+    connection.exec_driver_sql(
+        "INSERT INTO products_search (rowid, name, store) SELECT id, name, 's' || store_id FROM products"
+    )
+
+
+@contextmanager
+def search_index_deferred(connection):
+    """SQLite: drop the sync triggers for a bulk load into products and index the table once afterwards."""
+    if connection.dialect.name != 'sqlite':
+        yield
+        return
+    for trigger in SQLITE_TRIGGERS:
+        connection.exec_driver_sql(f'DROP TRIGGER IF EXISTS {trigger}')
+    try:
+        yield
+    finally:
+        for statement in PRODUCT_SEARCH_SQLITE_DDL:
+            connection.exec_driver_sql(statement)
+    rebuild_search_index(connection)
@@ -0,0 +1,147 @@
+import re
+import threading
+from collections import Counter
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_MAX_REPEATS = 5  # same statement shape more often than this in one request = N+1
+MODES = ('off', 'warn', 'strict')
+
+_local = threading.local()
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAM = re.compile(r"%\(\w+\)s|%s|\?|\$\d+|(?<!:):\w+")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+# Filled in strict mode so the pytest plugin can fail the test that caused them
+violations = []
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A request ran more SQL than its endpoint's budget allows, or repeated one statement too often."""
+
+
+def fingerprint(statement):
+    """Reduce a SQL statement to its shape: literals and parameters become ?, IN lists collapse."""
+    shape = _STRING_LITERAL.sub('?', statement)
+    shape = _PARAM.sub('?', shape)
+    shape = _NUMBER.sub('?', shape)
+    shape = _VALUE_LIST.sub('(?...)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+class QueryRecorder:
+    """Collect every SQL statement executed on this thread while active.
+
+        with QueryRecorder() as queries:
+            client.get('/api/report/store', headers=headers)
+        assert queries.count <= 2
+    """
+
+    def __init__(self):
+        self.statements = []
+
+    def __enter__(self):
+        _stack().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        stack = _stack()
+        if self in stack:
+            stack.remove(self)
+        return False
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def fingerprints(self):
+        return Counter(fingerprint(statement) for statement in self.statements)
+
+    def repeated(self, max_repeats=DEFAULT_MAX_REPEATS):
+        """Statement shapes executed more than ``max_repeats`` times, with their counts."""
+        return {shape: n for shape, n in self.fingerprints().items() if n > max_repeats}
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    for recorder in getattr(_local, 'stack', ()):
+        recorder.statements.append(statement)
+
+
+def query_budget(max_queries=None, max_repeats=DEFAULT_MAX_REPEATS):
+    """Declare an endpoint's SQL budget; place it under ``@bp.route``.
+
+    ``max_queries`` caps statements per request (None = no cap); ``max_repeats`` caps how
+    often one statement shape may repeat (None disables the N+1 check for this view).
+    """
+    def decorator(view):
+        view.__query_budget__ = (max_queries, max_repeats)
+        return view
+    return decorator
+
+
+def check_budget(recorder, budget, endpoint):
+    """Return a list of human-readable problems, empty when the request stayed within budget."""
+    max_queries, max_repeats = budget
+    problems = []
+    if max_queries is not None and recorder.count > max_queries:
+        problems.append(f'{endpoint} ran {recorder.count} SQL statements (budget {max_queries})')
+    if max_repeats is not None:
+        for shape, n in recorder.repeated(max_repeats).items():
+            problems.append(f'{endpoint} repeated a statement {n} times (N+1?): {shape}')
+    return problems
+
+
+def _start_recording():
+    recorder = QueryRecorder()
+    recorder.__enter__()
+    g._query_recorder = recorder
+
+
+def _stop_recording(error=None):
+    recorder = g.pop('_query_recorder', None)
+    if recorder is not None:
+        recorder.__exit__(None, None, None)
+    return recorder
+
+
+def _enforce(response):
+    recorder = _stop_recording()
+    if recorder is None or request.endpoint is None:
+        return response
+
+    view = current_app.view_functions.get(request.endpoint)
+    budget = getattr(view, '__query_budget__', (None, current_app.config.get('QUERY_BUDGET_MAX_REPEATS', DEFAULT_MAX_REPEATS)))
+    problems = check_budget(recorder, budget, request.endpoint)
+    if not problems:
+        return response
+
+    for problem in problems:
+        current_app.logger.warning('Query budget: %s', problem)
+    if current_app.config.get('QUERY_BUDGET_MODE') == 'strict':
+        violations.extend(problems)
+        raise QueryBudgetExceeded('; '.join(problems))
+    return response
+
+
+def init_query_budget(app):
+    """Check every request against its endpoint's budget in 'warn' (log) or 'strict' (raise) mode."""
+    mode = app.config.get('QUERY_BUDGET_MODE', 'off')
+    if mode not in MODES:
+        raise ValueError(f"QUERY_BUDGET_MODE must be one of {', '.join(MODES)}")
+    if mode == 'off':
+        return
+    app.before_request(_start_recording)
+    app.after_request(_enforce)
+    app.teardown_request(_stop_recording)
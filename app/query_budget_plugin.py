@@ -0,0 +1,31 @@
+"""pytest plugin: fail any test whose requests break an endpoint's query budget.
+
+Load it from a conftest with ``config.pluginmanager.import_plugin('app.query_budget_plugin')``
+or on the command line with ``-p app.query_budget_plugin``. Apps created during the run
+default to QUERY_BUDGET_MODE=strict unless the environment says otherwise.
+"""
+import os
+import pytest
+from app import query_budget
+
+
+def pytest_configure(config):
+    os.environ.setdefault('QUERY_BUDGET_MODE', 'strict')
+    config.addinivalue_line('markers', 'no_query_budget: do not fail this test on query budget violations')
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    query_budget.violations.clear()
+    outcome = yield
+    problems = list(query_budget.violations)
+    query_budget.violations.clear()
+    # A violation caught inside the test (e.g. by a thread) must still fail it
+    if problems and outcome.excinfo is None and item.get_closest_marker('no_query_budget') is None:
+        pytest.fail('Query budget exceeded:\n  ' + '\n  '.join(problems), pytrace=False)
+
+
+@pytest.fixture
+def query_counter():
+    """Count SQL run inside a block: ``with query_counter() as queries: ...; queries.count``."""
+    return query_budget.QueryRecorder
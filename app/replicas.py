@@ -0,0 +1,176 @@
+import itertools
+import threading
+import time
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.sql import Select
+
+REPLICA_BIND_PREFIX = 'replica_'
+PRIMARY_COOKIE = 'db_primary_until'
+READ_METHODS = ('GET', 'HEAD')
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+_HEALTH_QUERY = text('SELECT 1 FROM users LIMIT 1')  # Also proves the schema is there
+_PG_LAG_QUERY = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+def replica_binds(urls, options_for=None):
+    """SQLALCHEMY_BINDS entries for the replica URLs, each with its own engine options."""
+    binds = {}
+    for i, url in enumerate(urls):
+        binds[f'{REPLICA_BIND_PREFIX}{i}'] = dict(options_for(url) if options_for else {}, url=url)
+    return binds
+
+
+def read_only(view):
+    """Allow a GET endpoint to be served from a read replica; place it under ``@bp.route``."""
+    view.__read_only__ = True
+    return view
+
+
+class ReplicaPool:
+    """Round-robin over the replicas that passed their last health check."""
+
+    def __init__(self, keys, check_interval, max_lag):
+        self.keys = list(keys)
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self._lock = threading.Lock()
+        self._healthy = {key: True for key in self.keys}
+        self._checked_at = {key: 0.0 for key in self.keys}
+        self._next = itertools.cycle(self.keys) if self.keys else None
+
+    def mark_down(self, key):
+        with self._lock:
+            self._healthy[key] = False
+            self._checked_at[key] = time.monotonic()
+
+    def check(self, key, engine):
+        """Probe one replica: reachable, has the schema and (PostgreSQL) is not lagging too far."""
+        try:
+            with engine.connect() as conn:
+                conn.execute(_HEALTH_QUERY)
+                lag = conn.execute(_PG_LAG_QUERY).scalar() if engine.dialect.name == 'postgresql' else 0
+            healthy = lag is None or lag <= self.max_lag
+        except DBAPIError:
+            healthy = False
+        with self._lock:
+            self._healthy[key] = healthy
+            self._checked_at[key] = time.monotonic()
+        return healthy
+
+    def pick(self, engines):
+        """A healthy replica bind key, or None to use the primary."""
+        for _ in range(len(self.keys)):
+            with self._lock:
+                key = next(self._next)
+                stale = time.monotonic() - self._checked_at[key] >= self.check_interval
+                healthy = self._healthy[key]
+            if stale:
+                healthy = self.check(key, engines[key])
+            if healthy:
+                return key
+        return None
+
+    def status(self):
+        with self._lock:
+            return dict(self._healthy)
+
+
+class RoutingSession(Session):
+    """Sends plain SELECTs of read-only requests to the replica chosen for the request.
+
+    Flushes, writes, locking reads and anything after the first write in the request
+    go to the primary, and so does a read the replica failed to answer.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            key = g.get('_db_replica')
+            if key is not None:
+                if not self._flushing and isinstance(clause, Select) and clause._for_update_arg is None:
+                    return self._db.engines[key]
+                g._db_replica = None  # Pin the rest of the request to the primary
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _with_primary_fallback(self, run, *args, **kwargs):
+        """Run a statement; if the replica it went to fails, run it once more on the primary."""
+        key = g.get('_db_replica') if has_request_context() else None
+        try:
+            return run(*args, **kwargs)
+        except OperationalError:
+            if key is None or g.get('_db_replica') != key:
+                raise  # Not a replica read: the primary failed
+            g._db_replica = None  # handle_error already marked the replica down; stay on the primary
+            return run(*args, **kwargs)
+
+    def execute(self, *args, **kwargs):
+        return self._with_primary_fallback(super().execute, *args, **kwargs)
+
+    def scalar(self, *args, **kwargs):
+        return self._with_primary_fallback(super().scalar, *args, **kwargs)
+
+    def scalars(self, *args, **kwargs):
+        return self._with_primary_fallback(super().scalars, *args, **kwargs)
+
+
+def _client_key():
+    return request.headers.get('Authorization') or request.remote_addr
+
+
+def _in_write_window(recent_writers):
+    now = time.time()
+    try:
+        if float(request.cookies.get(PRIMARY_COOKIE, 0)) > now:
+            return True
+    except ValueError:
+        pass
+    return recent_writers.get(_client_key(), 0) > now
+
+
+def init_replicas(app, db):
+    """Route read-only GET endpoints to healthy replicas, keeping read-your-writes on the primary."""
+    keys = [key for key in app.config.get('SQLALCHEMY_BINDS', {}) if key.startswith(REPLICA_BIND_PREFIX)]
+    if not keys:
+        return
+
+    pool = ReplicaPool(keys, app.config.get('REPLICA_HEALTH_INTERVAL', 10), app.config.get('REPLICA_MAX_LAG', 10))
+    window = app.config.get('REPLICA_READ_YOUR_WRITES_SECONDS', 5)
+    recent_writers = {}  # client key -> primary-until timestamp, for clients that drop cookies
+    app.extensions['db_replicas'] = pool
+
+    with app.app_context():
+        for key in keys:
+            engine = db.engines[key]
+
+            @event.listens_for(engine, 'handle_error')
+            def on_error(context, key=key):
+                if context.is_disconnect or isinstance(context.sqlalchemy_exception, OperationalError):
+                    pool.mark_down(key)  # Fall back to the primary until the next health check
+
+    @app.before_request
+    def choose_database():
+        g._db_replica = None
+        if request.method not in READ_METHODS:
+            return
+        view = current_app.view_functions.get(request.endpoint)
+        if getattr(view, '__read_only__', False) and not _in_write_window(recent_writers):
+            g._db_replica = pool.pick(db.engines)
+
+    @app.after_request
+    def open_write_window(response):
+        if request.method in WRITE_METHODS and response.status_code < 400:
+            until = time.time() + window
+            if len(recent_writers) > 10000:
+                now = time.time()
+                for client, expires in list(recent_writers.items()):
+                    if expires < now:
+                        recent_writers.pop(client, None)
+            recent_writers[_client_key()] = until
+            response.set_cookie(PRIMARY_COOKIE, f'{until:.3f}', max_age=window, httponly=True, samesite='Lax')
+        return response
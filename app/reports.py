@@ -0,0 +1,93 @@
+from sqlalchemy import case, func
+from app import db
+from app.models import Product, Store, StoreInventorySummary
+
+
+def _sum(expr):
+    return func.coalesce(func.sum(expr), 0)
+
+
+def _count_where(condition):
+    return _sum(case((condition, 1), else_=0))
+
+
+# ✅ Per-store revenue, stock, spoilage and payment counts in a single grouped query
+def aggregate_store_performance_rows():
+    """Return one plain row per store, aggregated in SQL rather than over ORM objects."""
+    query = (
+        db.session.query(
+            Store.id.label('store_id'),
+            Store.name.label('store_name'),
+            _sum(Product.selling_price * Product.stock_quantity).label('total_revenue'),
+            _sum(Product.stock_quantity).label('total_stock'),
+            _sum(Product.spoiled_quantity).label('spoiled_stock'),
+            _count_where(Product.payment_status == 'paid').label('paid_count'),
+            _count_where(Product.payment_status == 'not paid').label('unpaid_count'),
+        )
+        .outerjoin(Product, Product.store_id == Store.id)
+        .group_by(Store.id, Store.name)
+        .order_by(Store.id)
+    )
+    return query.all()
+
+
+# ✅ Same figures read from the maintained store_inventory_summary table (O(stores))
+def store_performance_rows():
+    """Return one plain row per store from the incrementally maintained summary."""
+    summary = StoreInventorySummary
+    query = (
+        db.session.query(
+            Store.id.label('store_id'),
+            Store.name.label('store_name'),
+            func.coalesce(summary.total_stock_value, 0).label('total_revenue'),
+            func.coalesce(summary.total_stock, 0).label('total_stock'),
+            func.coalesce(summary.spoiled_stock, 0).label('spoiled_stock'),
+            func.coalesce(summary.paid_count, 0).label('paid_count'),
+            func.coalesce(summary.unpaid_count, 0).label('unpaid_count'),
+        )
+        .outerjoin(summary, summary.store_id == Store.id)
+        .order_by(Store.id)
+    )
+    return query.all()
+
+
+DEFAULT_RANKING_LIMIT = 5
+MAX_RANKING_LIMIT = 100
+
+
+def _ranking(value_column, label, descending, limit, store_id):
+    order = value_column.desc() if descending else value_column.asc()
+    query = db.session.query(Product.id, Product.name, value_column.label(label)).filter(value_column.isnot(None))
+    if store_id is not None:
+        query = query.filter(Product.store_id == store_id)
+    return query.order_by(order, Product.id).limit(limit).all()
+
+
+# ✅ Top-K rankings served by ORDER BY ... LIMIT against the product indexes
+def top_selling_products(limit=DEFAULT_RANKING_LIMIT, store_id=None):
+    """Products with the highest stored selling_price * stock_quantity."""
+    return _ranking(Product.revenue, 'revenue', True, limit, store_id)
+
+
+def low_stock_products(limit=DEFAULT_RANKING_LIMIT, store_id=None):
+    """Products with the lowest stock_quantity."""
+    return _ranking(Product.stock_quantity, 'stock_quantity', False, limit, store_id)
+
+
+def most_spoiled_products(limit=DEFAULT_RANKING_LIMIT, store_id=None):
+    """Products with the highest spoiled_quantity."""
+    return _ranking(Product.spoiled_quantity, 'spoiled_quantity', True, limit, store_id)
+
+
+def ranking_args(args):
+    """Parse the optional ``limit`` and ``store_id`` query parameters.
+
+    Returns ``(limit, store_id, error)``; ``error`` is a message when the values are invalid.
+    """
+    limit = args.get('limit', type=int) if 'limit' in args else DEFAULT_RANKING_LIMIT
+    store_id = args.get('store_id', None, type=int)
+    if limit is None or limit < 1:
+        return None, None, 'limit must be a positive integer'
+    if 'store_id' in args and store_id is None:
+        return None, None, 'store_id must be an integer'
+    return min(limit, MAX_RANKING_LIMIT), store_id, None
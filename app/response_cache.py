@@ -0,0 +1,273 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, current_app, g, has_app_context, make_response, request
+from sqlalchemy import event
+from app import db
+from app.models import Product, Store, SupplyRequest, StoreInventorySummary
+
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_TTL = 300  # seconds; bounds staleness from writes no hook sees (other tools, raw SQL)
+LEASE_SECONDS = 30  # How long other workers wait on a computation before doing it themselves
+# The summary is rewritten by `flask seed` and `flask inventory-summary rebuild`, which skip the ORM
+WATCHED_TABLES = {Product.__tablename__, Store.__tablename__, SupplyRequest.__tablename__,
+                  StoreInventorySummary.__tablename__}
+
+_CHANGED_KEY = 'response_cache_data_changed'
+
+
+class MemoryBackend:
+    """In-process LRU. Only correct with a single worker process: the data version lives here."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def version(self):
+        return self._version
+
+    def bump_version(self):
+        with self._lock:
+            self._version += 1
+            return self._version
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic() - self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, version):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def acquire(self, key):
+        return True  # The in-process single-flight lock already covers this process
+
+    def release(self, key):
+        pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteBackend:
+    """A cache file shared by every worker on the host; the data version is stored in it too.
+
+    The file is opened (and created) on first use, not at app creation.
+    """
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS meta (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)')
+            conn.execute('INSERT OR IGNORE INTO meta (id, version) VALUES (1, 0)')
+            conn.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+                         'version INTEGER NOT NULL, stored_at REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_entries_version ON entries (version)')
+            conn.execute('CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def version(self):
+        return self._connect().execute('SELECT version FROM meta WHERE id = 1').fetchone()[0]
+
+    def bump_version(self):
+        conn = self._connect()
+        version = conn.execute('UPDATE meta SET version = version + 1 WHERE id = 1 RETURNING version').fetchone()[0]
+        conn.execute('DELETE FROM entries WHERE version < ?', (version,))  # Can never be served again
+        return version
+
+    def get(self, key):
+        row = self._connect().execute('SELECT value FROM entries WHERE key = ? AND stored_at >= ?',
+                                      (key, time.time() - self.ttl)).fetchone()
+        return bytes(row[0]) if row else None
+
+    def set(self, key, value, version):
+        conn = self._connect()
+        conn.execute('INSERT OR REPLACE INTO entries (key, value, version, stored_at) VALUES (?, ?, ?, ?)',
+                     (key, value, version, time.time()))
+        conn.execute('DELETE FROM entries WHERE key NOT IN (SELECT key FROM entries ORDER BY stored_at DESC LIMIT ?)',
+                     (self.max_entries,))
+
+    def acquire(self, key):
+        """Take the cross-worker lease for computing ``key``; False if another worker holds it."""
+        conn = self._connect()
+        now = time.time()
+        conn.execute('DELETE FROM leases WHERE key = ? AND expires_at < ?', (key, now))
+        return conn.execute('INSERT OR IGNORE INTO leases (key, expires_at) VALUES (?, ?)',
+                            (key, now + LEASE_SECONDS)).rowcount == 1
+
+    def release(self, key):
+        self._connect().execute('DELETE FROM leases WHERE key = ?', (key,))
+
+    def clear(self):
+        self._connect().execute('DELETE FROM entries')
+
+
+class ResponseCache:
+    """Versioned response cache: keys embed the data version, so a write makes old entries unreachable."""
+
+    def __init__(self, backend, wait_timeout=LEASE_SECONDS):
+        self.backend = backend
+        self.wait_timeout = wait_timeout
+        self.hits = 0
+        self.misses = 0
+        self._inflight = {}  # key -> Lock, single-flight within this process
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, base_key, compute):
+        """Return cached bytes for ``base_key`` at the current data version, computing them at most once.
+
+        ``compute()`` returns ``(body_bytes, cacheable)``.
+        """
+        version = self.backend.version()
+        key = f'v{version}|{base_key}'
+        body = self.backend.get(key)
+        if body is not None:
+            self.hits += 1
+            return body
+
+        with self._lock:
+            lock = self._inflight.setdefault(key, threading.Lock())
+        with lock:
+            try:
+                body = self.backend.get(key)  # Filled by the thread we waited for
+                if body is not None:
+                    self.hits += 1
+                    return body
+                body = self._wait_for_other_worker(key)
+                if body is not None:
+                    self.hits += 1
+                    return body
+                self.misses += 1
+                try:
+                    body, cacheable = compute()
+                    if cacheable:
+                        self.backend.set(key, body, version)
+                finally:
+                    self.backend.release(key)
+                return body
+            finally:
+                with self._lock:
+                    if self._inflight.get(key) is lock:
+                        del self._inflight[key]
+
+    def _wait_for_other_worker(self, key):
+        deadline = time.monotonic() + self.wait_timeout
+        while not self.backend.acquire(key):
+            if time.monotonic() > deadline:
+                return None  # Give up waiting and compute it ourselves
+            time.sleep(0.05)
+            body = self.backend.get(key)
+            if body is not None:
+                return body
+        return None
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+def _scope(current_user):
+    """Role and tenant: admins share one view, merchants see their stores, clerks their store."""
+    tenant = {'merchant': current_user.id, 'clerk': current_user.store_id}.get(current_user.role, 'all')
+    return f'{current_user.role}:{tenant}'
+
+
+def cached_response(view):
+    """Cache a JSON view's 200 responses per role/tenant and query string; place it under ``@token_required``."""
+    @wraps(view)
+    def decorated(current_user, *args, **kwargs):
+        cache = current_app.extensions.get('response_cache')
+        if cache is None:
+            return view(current_user, *args, **kwargs)
+
+        outcome = {}
+
+        def compute():
+            # Fill the cache from the primary: a lagging replica's answer would be stored as current
+            g._db_replica = None
+            response = make_response(view(current_user, *args, **kwargs))
+            outcome['response'] = response
+            return response.get_data(), response.status_code == 200 and response.mimetype == 'application/json'
+
+        base_key = f'{request.endpoint}|{_scope(current_user)}|{sorted(request.args.items(multi=True))}|{kwargs}'
+        body = cache.get_or_compute(base_key, compute)
+        if 'response' in outcome:
+            outcome['response'].headers['X-Cache'] = 'MISS'
+            return outcome['response']
+        return Response(body, status=200, mimetype='application/json', headers={'X-Cache': 'HIT'})
+    return decorated
+
+
+# ✅ Any committed write to products, stores or supply requests bumps the data version
+@event.listens_for(db.session, 'before_flush')
+def _note_orm_changes(session, flush_context, instances):
+    if any(obj.__table__.name in WATCHED_TABLES
+           for obj in (*session.new, *session.dirty, *session.deleted) if hasattr(obj, '__table__')):
+        session.info[_CHANGED_KEY] = True
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _note_core_changes(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if getattr(table, 'name', None) in WATCHED_TABLES:
+            orm_execute_state.session.info[_CHANGED_KEY] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def _bump_version(session):
+    if session.info.pop(_CHANGED_KEY, False) and has_app_context():
+        cache = current_app.extensions.get('response_cache')
+        if cache is not None:
+            cache.backend.bump_version()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_changes(session):
+    session.info.pop(_CHANGED_KEY, None)
+
+
+def init_response_cache(app):
+    """Set up the cache backend chosen by RESPONSE_CACHE_BACKEND: 'sqlite' (default), 'memory' or 'off'."""
+    kind = app.config.get('RESPONSE_CACHE_BACKEND', 'sqlite')
+    max_entries = app.config.get('RESPONSE_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+    ttl = app.config.get('RESPONSE_CACHE_TTL', DEFAULT_TTL)
+    if kind == 'off':
+        return
+    if kind == 'memory':
+        if app.config.get('WORKER_PROCESSES', 1) > 1:
+            raise ValueError("RESPONSE_CACHE_BACKEND='memory' needs a single worker process; use 'sqlite'")
+        backend = MemoryBackend(max_entries, ttl)
+    elif kind == 'sqlite':
+        path = app.config.get('RESPONSE_CACHE_PATH') or os.path.join(app.instance_path, 'response_cache.db')
+        backend = SQLiteBackend(path, max_entries, ttl)
+    else:
+        raise ValueError("RESPONSE_CACHE_BACKEND must be 'memory', 'sqlite' or 'off'")
+    app.extensions['response_cache'] = ResponseCache(backend)
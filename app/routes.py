@@ -1,85 +1,137 @@
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, g, jsonify, request, current_app
 from app.models import Product, User, Store, SupplyRequest
 from app import db  
+from app.principal_cache import load_principal
+from app.reports import (
+    store_performance_rows, top_selling_products, low_stock_products, most_spoiled_products, ranking_args
+)
+from app.query_budget import query_budget
+from app.replicas import read_only
+from app.response_cache import cached_response
 from functools import wraps
 import jwt
+import time
 
 bp = Blueprint('main', __name__)
 
-def token_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        auth_header = request.headers.get('Authorization')
+STREAM_TICKET_SECONDS = 30  # How long a ticket can be used to open a stream
+STREAM_AUDIENCE = 'stream'  # Stream tickets carry it; a bearer token never does
+
+def _bearer_token():
+    auth_header = request.headers.get('Authorization')
+    if auth_header and auth_header.startswith("Bearer "):
+        return auth_header.split("Bearer ")[1]
+    return None
+
+def _authenticate(token, audience=None):
+    """Decode ``token`` and load its user: (principal, None), or (None, error response)."""
+    if not token:
+        return None, (jsonify({'message': 'Token is missing!'}), 401)
 
-        if not auth_header or not auth_header.startswith("Bearer "):
-            return jsonify({'message': 'Token is missing!'}), 401
+    try:
+        data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"], audience=audience)
+        current_user = load_principal(data['user_id'], token)
 
-        token = auth_header.split("Bearer ")[1]
+        if not current_user:
+            return None, (jsonify({'message': 'Invalid token!'}), 401)
+        if not current_user.is_active:
+            return None, (jsonify({'message': 'Account is deactivated!'}), 403)
 
-        try:
-            data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
-            current_user = User.query.get(data['user_id'])
+    except jwt.ExpiredSignatureError:
+        return None, (jsonify({'message': 'Token has expired!'}), 401)
+    except jwt.InvalidTokenError:
+        return None, (jsonify({'message': 'Invalid token!'}), 401)
+
+    g.auth_token, g.auth_claims = token, data
+    return current_user, None
+
+def token_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        current_user, error = _authenticate(_bearer_token())
+        if error:
+            return error
+        return f(current_user, *args, **kwargs)
 
-            if not current_user:
-                return jsonify({'message': 'Invalid token!'}), 401
+    return decorated
 
-        except jwt.ExpiredSignatureError:
-            return jsonify({'message': 'Token has expired!'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'message': 'Invalid token!'}), 401
+def stream_token_required(f):
+    """token_required that also accepts ?ticket= (see issue_stream_ticket), for EventSource clients.
 
+    EventSource cannot send headers, but a bearer token in the URL would end up in
+    access logs; a ticket is only good for opening a stream for a few seconds.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        ticket = request.args.get('ticket')
+        if ticket is not None:
+            current_user, error = _authenticate(ticket, audience=STREAM_AUDIENCE)
+        else:
+            current_user, error = _authenticate(_bearer_token())
+        if error:
+            return error
         return f(current_user, *args, **kwargs)
 
     return decorated
 
+def issue_stream_ticket(user_id):
+    """A short-lived token for opening the change stream; the stream itself ends with the bearer token."""
+    claims = g.auth_claims
+    session_expires_at = claims.get('session_exp', claims.get('exp'))
+    expires_at = time.time() + current_app.config.get('SSE_TICKET_SECONDS', STREAM_TICKET_SECONDS)
+    if session_expires_at is not None:
+        expires_at = min(expires_at, session_expires_at)
+    return jwt.encode({'user_id': user_id, 'aud': STREAM_AUDIENCE, 'exp': int(expires_at),
+                       'session_exp': session_expires_at},
+                      current_app.config['SECRET_KEY'], algorithm="HS256")
+
+@bp.route('/protected-endpoint', methods=['GET'])
+@token_required
+def protected(current_user):
+    return jsonify({"message": f"Protected data for {current_user.email}!"})
+
 @bp.route('/report/store', methods=['GET'])
+@read_only
+@query_budget(2)
 @token_required
+@cached_response
 def store_report(current_user):
     if current_user.role != 'admin':
         return jsonify({'message': 'Permission denied'}), 403
 
-    stores = Store.query.all()
-    report_data = []
-
-    for store in stores:
-        products = Product.query.filter_by(store_id=store.id).all()
-
-        total_revenue = sum(p.selling_price * p.stock_quantity for p in products)
-        total_stock = sum(p.stock_quantity for p in products)
-        spoiled_stock = sum(p.spoiled_quantity for p in products)
-        paid_count = sum(1 for p in products if p.payment_status == 'paid')
-        unpaid_count = sum(1 for p in products if p.payment_status == 'not paid')
-
-        report_data.append({
-            "store_id": store.id,
-            "store_name": store.name,
-            "total_revenue": total_revenue,
-            "total_stock": total_stock,
-            "spoiled_stock": spoiled_stock,
+    report_data = [
+        {
+            "store_id": row.store_id,
+            "store_name": row.store_name,
+            "total_revenue": row.total_revenue,
+            "total_stock": row.total_stock,
+            "spoiled_stock": row.spoiled_stock,
             "payment_status": {
-                "paid": paid_count,
-                "unpaid": unpaid_count
+                "paid": row.paid_count,
+                "unpaid": row.unpaid_count
             }
-        })
+        } for row in store_performance_rows()
+    ]
 
     return jsonify({"store_performance": report_data}), 200
 
 @bp.route('/report/products', methods=['GET'])
+@read_only
+@query_budget(4)
 @token_required
+@cached_response
 def product_report(current_user):
     if current_user.role not in ['admin', 'merchant']:
         return jsonify({'message': 'Permission denied'}), 403
 
-    products = Product.query.all()
-
-    top_selling = sorted(products, key=lambda p: p.selling_price * p.stock_quantity, reverse=True)[:5]
-    low_stock = sorted(products, key=lambda p: p.stock_quantity)[:5]
-    spoiled = sorted(products, key=lambda p: p.spoiled_quantity, reverse=True)[:5]
+    limit, store_id, error = ranking_args(request.args)
+    if error:
+        return jsonify({'message': error}), 400
 
     report_data = {
-        "top_selling": [{"id": p.id, "name": p.name, "revenue": p.selling_price * p.stock_quantity} for p in top_selling],
-        "low_stock": [{"id": p.id, "name": p.name, "stock_quantity": p.stock_quantity} for p in low_stock],
-        "spoiled_products": [{"id": p.id, "name": p.name, "spoiled_quantity": p.spoiled_quantity} for p in spoiled]
+        "top_selling": [{"id": p.id, "name": p.name, "revenue": p.revenue} for p in top_selling_products(limit, store_id)],
+        "low_stock": [{"id": p.id, "name": p.name, "stock_quantity": p.stock_quantity} for p in low_stock_products(limit, store_id)],
+        "spoiled_products": [{"id": p.id, "name": p.name, "spoiled_quantity": p.spoiled_quantity} for p in most_spoiled_products(limit, store_id)]
     }
 
     return jsonify(report_data), 200
@@ -0,0 +1,48 @@
+from operator import attrgetter
+from app.models import User, Store, Product, SupplyRequest
+
+
+class Serializer:
+    """Declarative output shape for one model, compiled once into a single attrgetter.
+
+    Positional names are copied as-is, keyword names rename a model attribute::
+
+        STOCK_ITEM = Serializer(Product, 'id', 'name', quantity='stock_quantity')
+
+    ``dump``/``dump_many`` accept ORM instances or Row tuples from
+    ``query.with_entities(*serializer.columns())``, so listings can skip building objects.
+    """
+
+    def __init__(self, model, *names, **renamed):
+        self.model = model
+        self.sources = {name: name for name in names}
+        self.sources.update(renamed)
+        self.keys = tuple(self.sources)
+        getter = attrgetter(*self.sources.values())
+        self._get = getter if len(self.keys) > 1 else (lambda obj: (getter(obj),))
+
+    @property
+    def fields(self):
+        """Output name -> column, the mapping keyset_page selects from."""
+        return {name: getattr(self.model, source) for name, source in self.sources.items()}
+
+    def columns(self):
+        """Columns to load (distinct, labelled by attribute name) for Row-based dumping."""
+        return [getattr(self.model, source) for source in dict.fromkeys(self.sources.values())]
+
+    def dump(self, obj):
+        return dict(zip(self.keys, self._get(obj)))
+
+    def dump_many(self, objs):
+        keys, get = self.keys, self._get
+        return [dict(zip(keys, get(obj))) for obj in objs]
+
+
+USER = Serializer(User, 'id', 'username', 'email', 'role', 'is_active')
+CLERK = Serializer(User, 'id', 'email', 'store_id')
+STORE = Serializer(Store, 'id', 'name', 'merchant_id')
+PRODUCT = Serializer(Product, 'id', 'name', 'buying_price', 'selling_price', 'stock_quantity', 'store_id')
+STOCK_ITEM = Serializer(Product, 'id', 'name', 'buying_price', 'selling_price', 'spoiled_quantity', 'payment_status',
+                        'version', quantity='stock_quantity')  # Match ClerkDashboard.js field
+PAYMENT_ITEM = Serializer(Product, 'id', 'name', price='selling_price', stock='stock_quantity')
+SUPPLY_REQUEST = Serializer(SupplyRequest, 'id', 'product_id', 'quantity_requested', 'status', 'requested_by')
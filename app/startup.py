@@ -0,0 +1,141 @@
+"""Boot-time helpers: schema revision check, lazy `flask db`, fork-safe engines.
+
+create_app() does no I/O and imports nothing it doesn't need to serve a request:
+Alembic (via Flask-Migrate) is only loaded when a `flask db` command runs, and the
+schema is checked once by whoever boots the process (run.py, wsgi.py, `flask check-schema`)
+with a single read of alembic_version instead of create_all().
+
+With gunicorn ``preload_app`` the app is built once in the master and inherited by
+every worker; gunicorn.conf.py calls dispose_engines() after the fork so no worker
+reuses a pooled connection (socket) that belongs to its parent.
+"""
+import os
+import click
+from flask import current_app, g
+from flask.cli import ScriptInfo, with_appcontext
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+class LazyMigrateGroup(click.Group):
+    """`flask db ...`: Flask-Migrate (and Alembic) are imported when a subcommand is looked up."""
+
+    def _group(self, ctx):
+        from flask_migrate import Migrate
+        from flask_migrate.cli import db as db_group
+        from app import db
+
+        app = ctx.ensure_object(ScriptInfo).load_app()
+        if 'migrate' not in app.extensions:
+            Migrate(app, db, directory=MIGRATIONS_DIR)
+        return db_group
+
+    def list_commands(self, ctx):
+        return self._group(ctx).list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self._group(ctx).get_command(ctx, name)
+
+
+@click.group('db', cls=LazyMigrateGroup)
+@click.option('-d', '--directory', default=None, help='Migration script directory (default is "migrations")')
+@click.option('-x', '--x-arg', multiple=True, help='Additional arguments consumed by custom env.py scripts')
+@with_appcontext
+def db_command(directory, x_arg):
+    """Perform database migrations."""
+    g.directory = directory  # Read by Flask-Migrate exactly as if its own group had run
+    g.x_arg = x_arg
+
+
+def init_migrate(app):
+    app.cli.add_command(db_command)
+
+
+def _script_directory(directory=MIGRATIONS_DIR):
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    config = Config()
+    config.set_main_option('script_location', directory)
+    return ScriptDirectory.from_config(config)
+
+
+def migration_heads(directory=MIGRATIONS_DIR):
+    """Head revision(s) of the migration scripts."""
+    return set(_script_directory(directory).get_heads())
+
+
+def database_revisions(connection):
+    """Revision(s) stamped in alembic_version: one SELECT, empty when the database was never migrated."""
+    from alembic.runtime.migration import MigrationContext
+
+    return set(MigrationContext.configure(connection).get_current_heads())
+
+
+def check_schema(app):
+    """Raise SchemaOutOfDate unless the primary database is at the migrations' head revision."""
+    from app import db
+
+    expected = migration_heads()
+    with app.app_context():
+        with db.engine.connect() as connection:
+            current = database_revisions(connection)
+    if current != expected:
+        found = ', '.join(sorted(current)) or 'none'
+        hint = 'flask db upgrade' if current else 'flask init-db` (new database) or `flask db upgrade'
+        raise SchemaOutOfDate(f"Database schema is at revision {found}, expected {', '.join(sorted(expected))}. "
+                              f"Run `{hint}`.")
+    return current
+
+
+def init_database(app):
+    """Create the schema on an empty database and stamp it at head; returns False if it has tables.
+
+    The first migration alters tables that an older create_all() made, so a new database
+    is built from the models and stamped, as Alembic recommends, rather than upgraded.
+    """
+    from alembic.runtime.migration import MigrationContext
+    from sqlalchemy import inspect
+    from app import db
+
+    with app.app_context():
+        with db.engine.begin() as connection:
+            if inspect(connection).get_table_names():
+                return False
+            db.metadata.create_all(connection)
+            context = MigrationContext.configure(connection)
+            context.stamp(_script_directory(), 'heads')
+    return True
+
+
+def dispose_engines(app):
+    """Drop pooled connections inherited across a fork without closing the parent's sockets."""
+    from app import db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+@click.command('check-schema')
+@with_appcontext
+def check_schema_command():
+    """Exit non-zero unless the database is migrated to the latest revision."""
+    try:
+        revisions = check_schema(current_app._get_current_object())
+    except SchemaOutOfDate as error:
+        raise click.ClickException(str(error))
+    click.echo(f"✅ Schema at {', '.join(sorted(revisions))}")
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create the tables of a new, empty database and stamp it at the latest migration."""
+    if not init_database(current_app._get_current_object()):
+        raise click.ClickException('Database already has tables; use `flask db upgrade`.')
+    click.echo(f"✅ Schema created at {', '.join(sorted(migration_heads()))}")
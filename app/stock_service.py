@@ -0,0 +1,82 @@
+from sqlalchemy import func, select, update
+from app import db
+from app.models import Product
+from app.inventory_summary import track_product_changes
+
+products_table = Product.__table__
+
+# Columns callers may set alongside a stock change
+WRITABLE_FIELDS = ('name', 'buying_price', 'selling_price', 'stock_quantity', 'spoiled_quantity', 'payment_status')
+
+
+class StockConflict(Exception):
+    """The product changed since the caller read it (version mismatch); maps to HTTP 409."""
+
+    def __init__(self, product_id, expected_version, current_version):
+        super().__init__(f'Product {product_id} is at version {current_version}, not {expected_version}')
+        self.product_id = product_id
+        self.expected_version = expected_version
+        self.current_version = current_version
+
+
+def _returning():
+    return (products_table.c.id, products_table.c.stock_quantity, products_table.c.spoiled_quantity,
+            products_table.c.version, products_table.c.store_id)
+
+
+# ✅ Relative change: a single UPDATE ... SET stock_quantity = stock_quantity + :delta, no read first
+def increment_stock(product_id, delta, **values):
+    """Atomically add ``delta`` to a product's stock, optionally setting other columns in the same statement.
+
+    Returns the updated row (id, stock_quantity, spoiled_quantity, version, store_id) or None if the
+    product does not exist. Concurrent increments never lose each other's updates. Does not commit.
+    """
+    unknown = set(values) - set(WRITABLE_FIELDS)
+    if unknown:
+        raise ValueError(f"Cannot set {', '.join(sorted(unknown))}")
+
+    with track_product_changes([product_id]):
+        row = db.session.execute(
+            update(products_table)
+            .where(products_table.c.id == product_id)
+            .values(
+                stock_quantity=func.coalesce(products_table.c.stock_quantity, 0) + delta,
+                version=products_table.c.version + 1,
+                **values,
+            )
+            .returning(*_returning())
+        ).first()
+    return row
+
+
+# ✅ Absolute change: compare-and-set on the version column
+def set_stock(product_id, expected_version=None, **values):
+    """Set absolute column values in one statement.
+
+    With ``expected_version`` the write only happens if the product is still at that version,
+    otherwise StockConflict is raised; without it the write is last-writer-wins but still bumps
+    the version. Returns the updated row or None if the product does not exist. Does not commit.
+    """
+    unknown = set(values) - set(WRITABLE_FIELDS)
+    if unknown:
+        raise ValueError(f"Cannot set {', '.join(sorted(unknown))}")
+
+    statement = (
+        update(products_table)
+        .where(products_table.c.id == product_id)
+        .values(version=products_table.c.version + 1, **values)
+        .returning(*_returning())
+    )
+    if expected_version is not None:
+        statement = statement.where(products_table.c.version == expected_version)
+
+    with track_product_changes([product_id]):
+        row = db.session.execute(statement).first()
+
+    if row is None and expected_version is not None:
+        current = db.session.execute(
+            select(products_table.c.version).where(products_table.c.id == product_id)
+        ).scalar()
+        if current is not None:
+            raise StockConflict(product_id, expected_version, current)
+    return row
@@ -1,30 +1,25 @@
-from flask import Blueprint, jsonify, request
-from flask_cors import cross_origin
+import time
+from flask import Blueprint, Response, g, jsonify, request, current_app
+from sqlalchemy.exc import IntegrityError
 from app.models import Product, User, Store, SupplyRequest
 from app import db
-from app.routes import token_required  # Assuming token_required is defined here or in auth.py
+from app.routes import token_required, stream_token_required, issue_stream_ticket  # Assuming token_required is defined here or in auth.py
+from app.principal_cache import load_principal
+from app.pagination import wants_pagination, keyset_page
+from app.bulk_stock import ingest_stock, parse_csv, DEFAULT_CHUNK_SIZE
+from app.stock_service import increment_stock, set_stock, StockConflict
+from app.query_budget import query_budget
+from app.replicas import read_only
+from app.serializers import STOCK_ITEM
+from app.conditional import listing_validators, is_not_modified, not_modified, with_validators
+from app.change_stream import format_sse, REAUTH, StreamLimitReached
+from app.product_search import search_products, DEFAULT_LIMIT, MAX_LIMIT
 
 store_bp = Blueprint('store', __name__)
 
-# Handle CORS for all responses
-@store_bp.after_request
-def add_cors_headers(response):
-    response.headers["Access-Control-Allow-Origin"] = "http://localhost:3000"
-    response.headers["Access-Control-Allow-Credentials"] = "true"
-    response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
-    response.headers["Access-Control-Allow-Headers"] = "Authorization, Content-Type, x-access-token"
-    return response
-
-# Handle Preflight Requests Globally
-@store_bp.before_request
-def handle_preflight():
-    if request.method == "OPTIONS":
-        return jsonify({"message": "CORS preflight OK"}), 200
-
 # Get All Clerks (Admin/Merchant Only) - Move to auth.py if appropriate
 @store_bp.route('/auth/clerks', methods=['GET'])
 @token_required
-@cross_origin(origin="http://localhost:3000", supports_credentials=True)
 def get_clerks(current_user):
     if current_user.role not in ['admin', 'merchant']:
         return jsonify({'message': 'Permission denied'}), 403
@@ -32,10 +27,89 @@ def get_clerks(current_user):
     clerks = User.query.filter_by(role='clerk').all()
     return jsonify([{"id": c.id, "email": c.email} for c in clerks]), 200
 
+# Ticket for opening the stream from EventSource: GET /stream?ticket=...
+@store_bp.route('/stream/ticket', methods=['POST'])
+@token_required
+def stream_ticket(current_user):
+    return jsonify({'ticket': issue_stream_ticket(current_user.id)}), 200
+
+def _still_signed_in(app, user_id, token):
+    """Re-check a streaming user between events; the principal cache TTL bounds how stale this is."""
+    with app.app_context():
+        try:
+            principal = load_principal(user_id, token)
+            return principal is not None and principal.is_active
+        finally:
+            db.session.remove()
+
+# Live Stock/Payment/Supply Changes (Server-Sent Events)
+@store_bp.route('/stream', methods=['GET'])
+@stream_token_required
+def stream_changes(current_user):
+    if current_user.role == 'clerk':
+        if current_user.store_id is None:
+            return jsonify({'message': 'Clerk is not assigned to a store'}), 403
+        store_ids = {current_user.store_id}
+    elif current_user.role == 'merchant':
+        store_ids = {store_id for store_id, in db.session.query(Store.id).filter_by(merchant_id=current_user.id)}
+    elif current_user.role == 'admin':
+        store_id = request.args.get('store_id', type=int)
+        store_ids = {store_id} if store_id is not None else None
+    else:
+        return jsonify({'message': 'Permission denied'}), 403
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    if last_event_id is not None:
+        try:
+            last_event_id = int(last_event_id)
+        except ValueError:
+            return jsonify({'message': 'Last-Event-ID must be an integer'}), 400
+
+    bus = current_app.extensions['change_bus']
+    heartbeat = current_app.config.get('SSE_HEARTBEAT', 15)
+    retry_ms = current_app.config.get('SSE_RETRY_MS', 3000)
+    recheck_every = current_app.config.get('SSE_AUTH_RECHECK', 60)
+    try:
+        # Each open stream holds a request thread; past the cap the rest of the API would starve
+        subscription = bus.subscribe(store_ids, last_event_id)
+    except StreamLimitReached:
+        response = jsonify({'message': 'Too many open streams, please retry shortly'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(max(1, retry_ms // 1000))
+        return response
+    db.session.close()  # Don't hold a pooled connection for the life of the stream
+
+    app, user_id, token = current_app._get_current_object(), current_user.id, g.auth_token
+    expires_at = g.auth_claims.get('session_exp', g.auth_claims.get('exp'))
+
+    def events():
+        try:
+            yield f'retry: {retry_ms}\n\n'
+            recheck_at = time.monotonic() + recheck_every
+            while True:
+                wait = heartbeat
+                if expires_at is not None:
+                    wait = min(wait, expires_at - time.time())
+                if wait <= 0 or (time.monotonic() >= recheck_at and not _still_signed_in(app, user_id, token)):
+                    yield format_sse(REAUTH)  # Token expired or user deactivated: sign in and reconnect
+                    return
+                if time.monotonic() >= recheck_at:
+                    recheck_at = time.monotonic() + recheck_every
+                change = subscription.next(wait)
+                yield ': heartbeat\n\n' if change is None else format_sse(change)
+        finally:
+            bus.unsubscribe(subscription)
+
+    response = Response(events(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(lambda: bus.unsubscribe(subscription))  # Also when the client left before the first frame
+    return response
+
 # Clerk Views Stock Details by Store ID
 @store_bp.route('/stock/<int:store_id>', methods=['GET'])
+@read_only
+@query_budget(3)
 @token_required
-@cross_origin(origin="http://localhost:3000", supports_credentials=True)
 def view_stock_by_store(current_user, store_id):
     if current_user.role not in ['clerk', 'admin']:
         return jsonify({'message': 'Permission denied'}), 403
@@ -43,24 +117,50 @@ def view_stock_by_store(current_user, store_id):
     if current_user.role == 'clerk' and current_user.store_id != store_id:
         return jsonify({'message': 'Unauthorized to view this store’s stock'}), 403
 
-    products = Product.query.filter_by(store_id=store_id).all()
-    stock_data = [
-        {
-            "id": p.id,
-            "name": p.name,
-            "buying_price": float(p.buying_price),
-            "selling_price": float(p.selling_price),
-            "quantity": p.stock_quantity,  # Match ClerkDashboard.js field
-            "spoiled_quantity": p.spoiled_quantity,
-            "payment_status": p.payment_status
-        } for p in products
-    ]
-    return jsonify({'stock': stock_data}), 200
+    query = Product.query.filter_by(store_id=store_id)
+
+    # Dashboards poll this: answer 304 from a fingerprint before touching the rows
+    validators = listing_validators(query)
+    if is_not_modified(validators):
+        return not_modified(validators)
+
+    if wants_pagination(request.args):
+        page, error = keyset_page(query, Product.id, STOCK_ITEM.fields, request.args)
+        if error:
+            return jsonify({'message': error}), 400
+        return with_validators(jsonify(page), validators), 200
+
+    # Row tuples straight into dicts, no ORM instances
+    stock_data = STOCK_ITEM.dump_many(query.with_entities(*STOCK_ITEM.columns()))
+    return with_validators(jsonify({'stock': stock_data}), validators), 200
+
+# Clerk/Admin Searches a Store's Products (autocomplete: prefix and typo-tolerant, ranked)
+@store_bp.route('/<int:store_id>/products/search', methods=['GET'])
+@read_only
+@query_budget(4)
+@token_required
+def search_store_products(current_user, store_id):
+    if current_user.role not in ['clerk', 'admin']:
+        return jsonify({'message': 'Permission denied'}), 403
+
+    if current_user.role == 'clerk' and current_user.store_id != store_id:
+        return jsonify({'message': 'Unauthorized to search this store’s stock'}), 403
+
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'message': 'Missing query parameter: q'}), 400
+    limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+    if limit is None or limit < 1:
+        return jsonify({'message': 'limit must be a positive integer'}), 400
+
+    matches = search_products(store_id, query, STOCK_ITEM.columns(), min(limit, MAX_LIMIT))
+    results = [dict(STOCK_ITEM.dump(row), match=tier) for row, tier in matches]
+    return jsonify({'query': query, 'results': results}), 200
 
 # Clerk/Admin Adds New Stock
 @store_bp.route('/stock', methods=['POST'])
+@query_budget(9)
 @token_required
-@cross_origin(origin="http://localhost:3000", supports_credentials=True)
 def add_stock(current_user):
     if current_user.role not in ['admin', 'clerk']:
         return jsonify({'message': 'Permission denied'}), 403
@@ -82,56 +182,106 @@ def add_stock(current_user):
         if current_user.role == 'clerk' and current_user.store_id != store.id:
             return jsonify({'message': 'Unauthorized to add stock to this store'}), 403
 
-        # Check if product exists, update or create
+        quantity = int(data['quantity'])
+        prices = {'buying_price': float(data['buying_price']), 'selling_price': float(data['selling_price'])}
+
+        # Check if product exists, increment atomically or create
         product = Product.query.filter_by(name=data['item'], store_id=data['store_id']).first()
-        if product:
-            product.stock_quantity += int(data['quantity'])
-            product.buying_price = float(data['buying_price'])
-            product.selling_price = float(data['selling_price'])
+        if not product:
+            try:
+                with db.session.begin_nested():
+                    product = Product(
+                        name=data['item'],
+                        stock_quantity=quantity,
+                        spoiled_quantity=0,
+                        payment_status='not paid',
+                        store_id=store.id,
+                        **prices
+                    )
+                    db.session.add(product)
+            except IntegrityError:
+                # Another request created the same item first; add to it instead
+                product = Product.query.filter_by(name=data['item'], store_id=data['store_id']).first()
+                if not product:
+                    raise
+                increment_stock(product.id, quantity, **prices)
         else:
-            product = Product(
-                name=data['item'],
-                buying_price=float(data['buying_price']),
-                selling_price=float(data['selling_price']),
-                stock_quantity=int(data['quantity']),
-                spoiled_quantity=0,
-                payment_status='not paid',
-                store_id=store.id
-            )
-            db.session.add(product)
+            increment_stock(product.id, quantity, **prices)
 
+        product_id = product.id
         db.session.commit()
-        return jsonify({'message': 'Stock item added successfully', 'product_id': product.id}), 201
+        return jsonify({'message': 'Stock item added successfully', 'product_id': product_id}), 201
 
     except Exception as e:
         print("🔥 Error adding stock:", str(e))
         db.session.rollback()
         return jsonify({'message': 'Internal Server Error', 'error': str(e)}), 500
 
+# Clerk/Admin Adds Many Stock Items (JSON array or CSV upload)
+@store_bp.route('/stock/bulk', methods=['POST'])
+@query_budget(max_repeats=None)  # Repeats per chunk by design
+@token_required
+def add_stock_bulk(current_user):
+    if current_user.role not in ['admin', 'clerk']:
+        return jsonify({'message': 'Permission denied'}), 403
+
+    try:
+        if 'file' in request.files:
+            rows = parse_csv(request.files['file'].read().decode('utf-8-sig'))
+        elif request.mimetype == 'text/csv':
+            rows = parse_csv(request.get_data().decode('utf-8-sig'))
+        else:
+            data = request.get_json(silent=True)
+            rows = data.get('items') if isinstance(data, dict) else data
+    except UnicodeDecodeError:
+        return jsonify({'message': 'CSV must be UTF-8 encoded'}), 400
+
+    if not isinstance(rows, list) or not rows:
+        return jsonify({'message': 'Provide a non-empty JSON array, {"items": [...]} or a CSV upload'}), 400
+
+    chunk_size = current_app.config.get('BULK_STOCK_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+    results = ingest_stock(rows, current_user, chunk_size=chunk_size)
+
+    counts = {'created': 0, 'updated': 0, 'error': 0}
+    for result in results:
+        counts[result['status']] += 1
+
+    return jsonify({
+        'message': 'Bulk stock processed',
+        'created': counts['created'],
+        'updated': counts['updated'],
+        'failed': counts['error'],
+        'results': results
+    }), 200
+
 # Admin Updates Stock Quantity
 @store_bp.route('/stock/<int:product_id>', methods=['PUT'])
+@query_budget(7)
 @token_required
-@cross_origin(origin="http://localhost:3000", supports_credentials=True)
 def update_stock(current_user, product_id):
     if current_user.role != 'admin':
         return jsonify({'message': 'Permission denied'}), 403
 
-    product = Product.query.get_or_404(product_id)
     data = request.get_json()
-    
+
     stock_change = data.get('stock_quantity')
     if stock_change is None:
         return jsonify({'message': 'Stock quantity required'}), 400
 
-    product.stock_quantity = int(stock_change)  # Replace, not increment
-    db.session.commit()
+    try:
+        # Replace, not increment; pass "version" to only overwrite what you last read
+        row = set_stock(product_id, expected_version=data.get('version'), stock_quantity=int(stock_change))
+    except StockConflict as e:
+        return jsonify({'message': 'Stock was changed by someone else, reload and retry', 'version': e.current_version}), 409
+    if row is None:
+        return jsonify({'message': 'Product not found'}), 404
 
-    return jsonify({'message': 'Stock quantity updated successfully'}), 200
+    db.session.commit()
+    return jsonify({'message': 'Stock quantity updated successfully', 'version': row.version}), 200
 
 # Admin Updates Payment Status
 @store_bp.route('/stock/payment/<int:product_id>', methods=['PUT'])
 @token_required
-@cross_origin(origin="http://localhost:3000", supports_credentials=True)
 def update_payment_status(current_user, product_id):
     if current_user.role != 'admin':
         return jsonify({'message': 'Permission denied'}), 403
@@ -151,7 +301,6 @@ def update_payment_status(current_user, product_id):
 # Admin Deletes Stock
 @store_bp.route('/stock/<int:product_id>', methods=['DELETE'])
 @token_required
-@cross_origin(origin="http://localhost:3000", supports_credentials=True)
 def delete_stock(current_user, product_id):
     if current_user.role != 'admin':
         return jsonify({'message': 'Permission denied'}), 403
@@ -165,7 +314,6 @@ def delete_stock(current_user, product_id):
 # Admin Creates Store
 @store_bp.route('/create', methods=['POST'])
 @token_required
-@cross_origin(origin="http://localhost:3000", supports_credentials=True)
 def create_store(current_user):
     if current_user.role != 'admin':
         return jsonify({"message": "Permission denied"}), 403
@@ -187,7 +335,6 @@ def create_store(current_user):
 # Clerk Requests Stock
 @store_bp.route('/request', methods=['POST'])
 @token_required
-@cross_origin(origin="http://localhost:3000", supports_credentials=True)
 def request_stock(current_user):
     if current_user.role != 'clerk':
         return jsonify({'message': 'Permission denied'}), 403
@@ -216,7 +363,8 @@ def request_stock(current_user):
     supply_request = SupplyRequest(
         product_id=product.id,
         quantity_requested=10,  # Default, adjust via frontend if needed
-        requested_by=current_user.id
+        requested_by=current_user.id,
+        store_id=product.store_id
     )
     db.session.add(supply_request)
     db.session.commit()
@@ -2,6 +2,15 @@ from flask import Blueprint, jsonify, request
 from app.models import SupplyRequest, Product, User
 from app import db
 from app.routes import token_required
+from app.stock_service import increment_stock
+from sqlalchemy import update
+from datetime import datetime
+from app.pagination import wants_pagination, keyset_page
+from app.query_budget import query_budget
+from app.replicas import read_only
+from app.serializers import SUPPLY_REQUEST
+from app.change_stream import note_changes
+from app.bulk_supply import decide_supply_requests, DECISIONS, MAX_BULK_REQUESTS
 
 supply_bp = Blueprint('supply', __name__)
 
@@ -23,7 +32,8 @@ def request_supply(current_user):
     if not product:
         return jsonify({'message': 'Product not found'}), 404
 
-    new_request = SupplyRequest(product_id=product_id, quantity_requested=quantity_requested, requested_by=current_user.id)
+    new_request = SupplyRequest(product_id=product_id, quantity_requested=quantity_requested, requested_by=current_user.id,
+                                store_id=product.store_id)
     db.session.add(new_request)
     db.session.commit()
 
@@ -31,20 +41,22 @@ def request_supply(current_user):
 
 # ✅ Admin Views All Supply Requests
 @supply_bp.route('/supply/requests', methods=['GET'])
+@read_only
+@query_budget(2)
 @token_required
 def view_supply_requests(current_user):
     if current_user.role != 'admin':
         return jsonify({'message': 'Permission denied'}), 403
 
-    requests = SupplyRequest.query.all()
+    if wants_pagination(request.args):
+        page, error = keyset_page(SupplyRequest.query, SupplyRequest.id, SUPPLY_REQUEST.fields, request.args)
+        if error:
+            return jsonify({'message': error}), 400
+        return jsonify(page), 200
 
-    return jsonify([{
-        "id": req.id,
-        "product_id": req.product_id,
-        "quantity_requested": req.quantity_requested,
-        "status": req.status,
-        "requested_by": req.requested_by
-    } for req in requests]), 200
+    requests = SUPPLY_REQUEST.dump_many(SupplyRequest.query.with_entities(*SUPPLY_REQUEST.columns()))
+
+    return jsonify(requests), 200
 
 # ✅ Admin Approves/Declines Supply Request
 @supply_bp.route('/supply/request/<int:request_id>', methods=['PUT'])
@@ -63,13 +75,59 @@ def update_supply_request(current_user, request_id):
     if not supply_request:
         return jsonify({'message': 'Supply request not found'}), 404
 
+    # Claim the request atomically so two admins can never both apply it
+    claimed = db.session.execute(
+        update(SupplyRequest)
+        .where(SupplyRequest.id == request_id, SupplyRequest.status == 'pending')
+        .values(status=new_status, approved_at=datetime.utcnow() if new_status == 'approved' else None)
+    ).rowcount
+    if not claimed:
+        db.session.rollback()
+        return jsonify({'message': f'Supply request is already {supply_request.status}'}), 409
+    note_changes(db.session, 'supply_request', [request_id])  # Core UPDATE: tell the change stream
+
     if new_status == 'approved':
-        product = Product.query.get(supply_request.product_id)
-        if product:
-            product.stock_quantity += supply_request.quantity_requested  # Update stock
-            db.session.commit()
+        increment_stock(supply_request.product_id, supply_request.quantity_requested)  # Update stock
 
-    supply_request.status = new_status
     db.session.commit()
 
     return jsonify({'message': f'Supply request {new_status} successfully'}), 200
+
+# ✅ Admin Approves/Declines Many Supply Requests at Once
+@supply_bp.route('/supply/requests/bulk', methods=['POST'])
+@query_budget(max_repeats=None)  # One summary update per store touched
+@token_required
+def bulk_update_supply_requests(current_user):
+    if current_user.role != 'admin':
+        return jsonify({'message': 'Permission denied'}), 403
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or data.get('status') not in DECISIONS:
+        return jsonify({'message': 'Invalid status value'}), 400
+
+    ids, filters = data.get('ids'), data.get('filter')
+    if (ids is None) == (filters is None):
+        return jsonify({'message': 'Provide either "ids" or "filter"'}), 400
+    if ids is not None:
+        if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            return jsonify({'message': 'ids must be a list of integers'}), 400
+        if len(ids) > MAX_BULK_REQUESTS:
+            return jsonify({'message': f'At most {MAX_BULK_REQUESTS} ids per call'}), 400
+        results, has_more = decide_supply_requests(data['status'], ids=ids)
+    else:
+        if not isinstance(filters, dict) or not filters or set(filters) - {'store_id', 'product_id'}:
+            return jsonify({'message': 'filter takes store_id and/or product_id'}), 400
+        if not all(isinstance(value, int) and not isinstance(value, bool) for value in filters.values()):
+            return jsonify({'message': 'store_id and product_id must be integers'}), 400
+        results, has_more = decide_supply_requests(data['status'], **filters)
+
+    counts = {data['status']: 0, 'skipped': 0, 'not_found': 0}
+    for result in results:
+        counts[result['status']] += 1
+
+    return jsonify({
+        'message': f"Supply requests {data['status']}",
+        **counts,
+        'has_more': has_more,
+        'results': results
+    }), 200
@@ -1,7 +1,11 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, current_app
 from app.models import User, InviteToken
 from app import db
 from app.routes import token_required
+from app.principal_cache import principal_cache
+from app.pagination import wants_pagination, keyset_page
+from app.serializers import USER
+from app.mail_outbox import queue_mail
 from datetime import datetime, timedelta
 import jwt
 import os
@@ -27,7 +31,10 @@ def invite_admin(current_user):
 
     invite = InviteToken(token=token, email=email, role='admin', expires_at=expires_at)
     db.session.add(invite)
-    db.session.commit()
+    queue_mail(email, 'You have been invited to MyDuka',
+               f"You have been invited to join MyDuka as an admin.\n\n"
+               f"Accept the invite within 2 days: {current_app.config['FRONTEND_URL']}/register?token={token}\n")
+    db.session.commit()  # Invite and its email commit together; the outbox worker sends it
 
     return jsonify({'message': 'Admin invite sent!', 'token': token}), 200
 
@@ -49,6 +56,7 @@ def add_clerk(current_user):
     new_clerk = User(username=username, email=email, password_hash=password_hash, role='clerk')
     db.session.add(new_clerk)
     db.session.commit()
+    principal_cache.invalidate(new_clerk.id)
 
     return jsonify({'message': 'Clerk added successfully'}), 201
 
@@ -65,15 +73,15 @@ def get_users(current_user):
     if role_filter:
         query = query.filter_by(role=role_filter)
 
-    users = query.all()
+    if wants_pagination(request.args):
+        page, error = keyset_page(query, User.id, USER.fields, request.args)
+        if error:
+            return jsonify({'message': error}), 400
+        return jsonify(page), 200
+
+    users = USER.dump_many(query.with_entities(*USER.columns()))
 
-    return jsonify([{
-        "id": user.id,
-        "username": user.username,
-        "email": user.email,
-        "role": user.role,
-        "is_active": user.is_active
-    } for user in users]), 200
+    return jsonify(users), 200
 
 # ✅ Activate/Deactivate User (Admin)
 @user_bp.route('/user/<int:user_id>/status', methods=['PUT'])
@@ -94,6 +102,7 @@ def update_user_status(current_user, user_id):
 
     user.is_active = new_status
     db.session.commit()
+    principal_cache.invalidate(user_id)
 
     return jsonify({'message': f'User status updated to {"active" if new_status else "inactive"}'}), 200
 
@@ -110,5 +119,6 @@ def delete_user(current_user, user_id):
 
     db.session.delete(user)
     db.session.commit()
+    principal_cache.invalidate(user_id)
 
     return jsonify({'message': 'User deleted successfully'}), 200
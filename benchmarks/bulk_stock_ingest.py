@@ -0,0 +1,89 @@
+"""Throughput of POST /api/store/stock/bulk at several payload sizes.
+
+Usage:
+    python benchmarks/bulk_stock_ingest.py --sizes 10000 100000 1000000
+
+Runs against a throwaway SQLite file unless BENCH_DATABASE_URL is set; that database's
+tables are dropped first, so it also needs --yes-drop. Each size is sent twice: the first
+pass inserts every item, the second increments the same items.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jwt
+
+
+def build_app(database_url, workdir):
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['RESPONSE_CACHE_PATH'] = os.path.join(workdir, 'response_cache.db')
+    os.environ['CHANGE_STREAM_PATH'] = os.path.join(workdir, 'change_stream.db')
+    os.environ.setdefault('SECRET_KEY', 'benchmark-secret')
+    os.environ.setdefault('MAIL_USERNAME', 'benchmark')
+    os.environ.setdefault('MAIL_PASSWORD', 'benchmark')
+
+    from app import create_app, db
+    from app.models import User, Store
+
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        merchant = User(username='bench-merchant', email='merchant@bench', password_hash='x', role='merchant')
+        admin = User(username='bench-admin', email='admin@bench', password_hash='x', role='admin')
+        db.session.add_all([merchant, admin])
+        db.session.commit()
+        stores = [Store(name=f'Bench Store {i}', merchant_id=merchant.id) for i in range(20)]
+        db.session.add_all(stores)
+        db.session.commit()
+        token = jwt.encode({'user_id': admin.id, 'exp': datetime.utcnow() + timedelta(hours=6)},
+                           app.config['SECRET_KEY'], algorithm='HS256')
+        store_ids = [s.id for s in stores]
+    return app, token, store_ids
+
+
+def payload(size, store_ids, offset):
+    return [{
+        'item': f'sku-{offset}-{i}',
+        'quantity': 1 + i % 50,
+        'buying_price': 10 + i % 7,
+        'selling_price': 15 + i % 9,
+        'store_id': store_ids[i % len(store_ids)],
+    } for i in range(size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--yes-drop', action='store_true', help='Confirm BENCH_DATABASE_URL is a throwaway database')
+    args = parser.parse_args()
+    if os.getenv('BENCH_DATABASE_URL') and not args.yes_drop:
+        parser.error('every table in BENCH_DATABASE_URL is dropped; pass --yes-drop if it is a throwaway database')
+
+    workdir = tempfile.mkdtemp(prefix='bulk-bench-')
+    database_url = os.getenv('BENCH_DATABASE_URL', f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    app, token, store_ids = build_app(database_url, workdir)
+    app.config['BULK_STOCK_CHUNK_SIZE'] = args.chunk_size
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    print(f"{'rows':>10} {'pass':>8} {'seconds':>9} {'rows/s':>10}")
+    for size in args.sizes:
+        rows = payload(size, store_ids, offset=size)
+        for label in ('insert', 'update'):
+            started = time.perf_counter()
+            response = client.post('/api/store/stock/bulk', json=rows, headers=headers)
+            elapsed = time.perf_counter() - started
+            body = response.get_json()
+            assert response.status_code == 200 and body['failed'] == 0, body.get('message')
+            print(f"{size:>10} {label:>8} {elapsed:>9.2f} {size / elapsed:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
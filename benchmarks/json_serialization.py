@@ -0,0 +1,110 @@
+"""Serializing a stock listing: ORM objects + hand-built dicts + stdlib JSON vs Row tuples + Serializer + fast JSON.
+
+Usage:
+    python benchmarks/json_serialization.py --products 50000 --repeat 5
+
+Runs against a throwaway SQLite file unless BENCH_DATABASE_URL is set. Reports the
+best of ``--repeat`` runs for loading + building dicts, for encoding, and in total.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def build_app(database_url, products):
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('SECRET_KEY', 'benchmark-secret')
+    os.environ.setdefault('MAIL_USERNAME', 'benchmark')
+    os.environ.setdefault('MAIL_PASSWORD', 'benchmark')
+
+    from sqlalchemy import insert
+    from app import create_app, db
+    from app.models import User, Store, Product
+
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        merchant = User(username='bench-merchant', email='merchant@bench', password_hash='x', role='merchant')
+        db.session.add(merchant)
+        db.session.commit()
+        store = Store(name='Bench Store', merchant_id=merchant.id)
+        db.session.add(store)
+        db.session.commit()
+        db.session.execute(insert(Product.__table__), [{
+            'name': f'sku-{i}', 'buying_price': 10 + i % 7, 'selling_price': 15 + i % 9,
+            'stock_quantity': i % 500, 'spoiled_quantity': i % 3, 'payment_status': 'paid' if i % 2 else 'not paid',
+            'version': 1, 'store_id': store.id,
+        } for i in range(products)])
+        db.session.commit()
+        store_id = store.id
+    return app, store_id
+
+
+def current_path(query):
+    return [
+        {
+            "id": p.id,
+            "name": p.name,
+            "buying_price": float(p.buying_price),
+            "selling_price": float(p.selling_price),
+            "quantity": p.stock_quantity,
+            "spoiled_quantity": p.spoiled_quantity,
+            "payment_status": p.payment_status,
+            "version": p.version
+        } for p in query.all()
+    ]
+
+
+def serializer_path(query):
+    from app.serializers import STOCK_ITEM
+    return STOCK_ITEM.dump_many(query.with_entities(*STOCK_ITEM.columns()))
+
+
+def best_of(repeat, fn):
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=50_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    from flask.json.provider import DefaultJSONProvider
+    from app import db
+    from app.models import Product
+    from app.json_provider import FastJSONProvider, orjson
+
+    workdir = tempfile.mkdtemp(prefix='json-bench-')
+    app, store_id = build_app(os.getenv('BENCH_DATABASE_URL', f"sqlite:///{os.path.join(workdir, 'bench.db')}"),
+                              args.products)
+    stdlib, fast = DefaultJSONProvider(app), FastJSONProvider(app)
+
+    with app.test_request_context():
+        query = Product.query.filter_by(store_id=store_id)
+        variants = [
+            ('ORM + dicts + stdlib', lambda: current_path(query), stdlib),
+            ('Row + Serializer + ' + ('orjson' if orjson else 'stdlib'), lambda: serializer_path(query), fast),
+        ]
+        print(f"{args.products} products, best of {args.repeat}")
+        print(f"{'path':>32} {'build s':>9} {'encode s':>9} {'total s':>9} {'MB':>7}")
+        for label, build, provider in variants:
+            build_time, data = best_of(args.repeat, lambda: (db.session.expunge_all(), build())[1])
+            encode_time, response = best_of(args.repeat, lambda: provider.response({'stock': data}))
+            size = len(response.get_data()) / 1e6
+            print(f"{label:>32} {build_time:>9.3f} {encode_time:>9.3f} {build_time + encode_time:>9.3f} {size:>7.2f}")
+
+
+if __name__ == '__main__':
+    main()
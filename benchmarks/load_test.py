@@ -0,0 +1,362 @@
+"""Open-loop load test replaying the dashboard traffic mix against a running server.
+
+Usage:
+    flask seed --scale 1
+    gunicorn -w 4 --threads 8 -b 127.0.0.1:8000 'app:create_app()'    # or: python run.py
+    python benchmarks/load_test.py --base-url http://127.0.0.1:8000 --rate 50 --duration 60 -o after.json
+    python benchmarks/load_test.py --compare before.json after.json
+
+Accounts, stores and pending supply requests are read from DATABASE_URL (the database the
+server uses) and every seeded user logs in through /api/auth/login. Requests then arrive as
+a Poisson process at --rate per second no matter how slowly the server answers (open loop),
+so latency is measured from each request's scheduled start and includes any time it spent
+queued behind a saturated client.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_MIX = {
+    'stock_poll': 45,
+    'add_stock': 10,
+    'supply_request': 5,
+    'approve_supply': 5,
+    'store_report': 10,
+    'product_report': 10,
+    'graph_store_performance': 5,
+    'graph_top_products': 5,
+    'graph_spoiled_products': 5,
+}
+ITEMS_PER_STORE = 20  # Names add_stock and supply_request cycle through, so stock is restocked, not only created
+OK_STATUSES = {200, 201, 304}
+CONFLICT_STATUSES = {409}  # Lost a race (e.g. two approvals of one request): expected under load, reported apart
+
+
+class Client:
+    """Keep-alive HTTP connection per worker thread."""
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        for attempt in (1, 2):
+            connection = getattr(self._local, 'connection', None)
+            if connection is None:
+                connection = self._local.connection = self.connection_class(self.host, self.port, timeout=self.timeout)
+            try:
+                connection.request(method, path, payload, headers)
+                response = connection.getresponse()
+                data = response.read()
+                return response.status, response.headers, data
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                connection.close()
+                self._local.connection = None
+                if attempt == 2:
+                    raise  # Reused keep-alive socket was closed by the server: retry once on a fresh one
+
+
+def load_accounts(database_url, per_role):
+    """Seeded users, their stores and the pending supply requests, straight from the database."""
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(database_url)
+    with engine.connect() as connection:
+        accounts = defaultdict(list)
+        for role in ('merchant', 'admin', 'clerk'):
+            rows = connection.execute(text(
+                "SELECT id, email, store_id FROM users WHERE role = :role AND is_active "
+                "AND email LIKE '%@seed.myduka' ORDER BY id LIMIT :limit"
+            ), {'role': role, 'limit': per_role})
+            accounts[role] = [dict(row._mapping) for row in rows]
+        pending = [row.id for row in connection.execute(text(
+            "SELECT id FROM supply_requests WHERE status = 'pending' ORDER BY id"
+        ))]
+    engine.dispose()
+    return accounts, pending
+
+
+def log_in(client, accounts, password, recorder):
+    sessions = defaultdict(list)
+    for role, users in accounts.items():
+        for user in users:
+            started = time.perf_counter()
+            status, _, data = client.request('POST', '/api/auth/login', {'email': user['email'], 'password': password})
+            recorder.record('login', status, time.perf_counter() - started)
+            if status != 200:
+                raise SystemExit(f"Login failed for {user['email']} ({status}): {data[:200]!r}")
+            sessions[role].append({**user, 'headers': {'Authorization': f"Bearer {json.loads(data)['access_token']}"},
+                                   'etags': {}})
+    missing = [role for role in ('merchant', 'admin', 'clerk') if not sessions[role]]
+    if missing:
+        raise SystemExit(f"No seeded {', '.join(missing)} accounts; run `flask seed` first")
+    return sessions
+
+
+class Scenarios:
+    """One method per mix entry: pick a user, send one request, return its status."""
+
+    def __init__(self, client, sessions, pending, rng):
+        self.client = client
+        self.sessions = sessions
+        self.pending = list(pending)
+        self.pending_lock = threading.Lock()
+        self.rng = rng
+        self.rng_lock = threading.Lock()
+
+    def _pick(self, role):
+        with self.rng_lock:
+            return self.rng.choice(self.sessions[role]), self.rng.randrange(ITEMS_PER_STORE)
+
+    def _get(self, role, path):
+        user, _ = self._pick(role)
+        return self.client.request('GET', path, headers=user['headers'])[0]
+
+    def stock_poll(self):
+        user, _ = self._pick('clerk')
+        path = f"/api/store/stock/{user['store_id']}"
+        headers = dict(user['headers'])
+        if path in user['etags']:
+            headers['If-None-Match'] = user['etags'][path]  # Dashboards revalidate rather than refetch
+        status, response_headers, _ = self.client.request('GET', path, headers=headers)
+        if response_headers.get('ETag'):
+            user['etags'][path] = response_headers['ETag']
+        return status
+
+    def add_stock(self):
+        user, item = self._pick('clerk')
+        body = {'item': f"Load item {user['store_id']}-{item}", 'quantity': 5, 'buying_price': 10.0,
+                'selling_price': 15.0, 'store_id': user['store_id']}
+        return self.client.request('POST', '/api/store/stock', body, user['headers'])[0]
+
+    def supply_request(self):
+        user, item = self._pick('clerk')
+        body = {'product_name': f"Load item {user['store_id']}-{item}", 'store_id': user['store_id']}
+        status, _, data = self.client.request('POST', '/api/store/request', body, user['headers'])
+        if status == 201:
+            with self.pending_lock:
+                self.pending.append(json.loads(data)['request_id'])
+        return status
+
+    def approve_supply(self):
+        with self.pending_lock:
+            request_id = self.pending.pop() if self.pending else None
+        if request_id is None:
+            return None  # Nothing left to approve: not sent, not counted
+        user, _ = self._pick('admin')
+        with self.rng_lock:
+            decision = 'approved' if self.rng.random() < 0.8 else 'declined'
+        return self.client.request('PUT', f'/api/supply/request/{request_id}', {'status': decision},
+                                   user['headers'])[0]
+
+    def store_report(self):
+        return self._get('admin', '/api/report/store')
+
+    def product_report(self):
+        return self._get('merchant', '/api/report/products')
+
+    def graph_store_performance(self):
+        return self._get('merchant', '/api/graph/graph/store-performance')
+
+    def graph_top_products(self):
+        return self._get('merchant', '/api/graph/graph/top-products')
+
+    def graph_spoiled_products(self):
+        return self._get('merchant', '/api/graph/graph/spoiled-products')
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)  # endpoint -> [(status, latency_s, service_s)]
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, status, latency, service=None):
+        with self.lock:
+            self.samples[endpoint].append((status, latency, latency if service is None else service))
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarise(samples, elapsed):
+    def stats(rows):
+        latencies = sorted(latency for _, latency, _ in rows)
+        service = sorted(service for _, _, service in rows)
+        errors = sum(1 for status, _, _ in rows if status not in OK_STATUSES | CONFLICT_STATUSES)
+        conflicts = sum(1 for status, _, _ in rows if status in CONFLICT_STATUSES)
+        statuses = defaultdict(int)
+        for status, _, _ in rows:
+            statuses[str(status)] += 1
+        ms = lambda value: None if value is None else round(value * 1000, 2)
+        return {
+            'requests': len(rows),
+            'throughput_rps': round(len(rows) / elapsed, 2) if elapsed else None,
+            'errors': errors,
+            'error_rate': round(errors / len(rows), 4) if rows else 0,
+            'conflicts': conflicts,
+            'statuses': dict(sorted(statuses.items())),
+            'p50_ms': ms(percentile(latencies, 50)),
+            'p95_ms': ms(percentile(latencies, 95)),
+            'p99_ms': ms(percentile(latencies, 99)),
+            'max_ms': ms(latencies[-1] if latencies else None),
+            'service_p50_ms': ms(percentile(service, 50)),
+            'service_p99_ms': ms(percentile(service, 99)),
+        }
+
+    endpoints = {name: stats(rows) for name, rows in sorted(samples.items())}
+    everything = [row for name, rows in samples.items() if name != 'login' for row in rows]
+    return endpoints, stats(everything)
+
+
+def run(args):
+    mix = parse_mix(args.mix)
+    database_url = args.database_url or os.getenv('DATABASE_URL')
+    if not database_url:
+        raise SystemExit('Set DATABASE_URL (or --database-url) to the database the server uses')
+    if database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+
+    rng = random.Random(args.seed)
+    client = Client(args.base_url, args.timeout)
+    recorder = Recorder()
+    accounts, pending = load_accounts(database_url, args.users)
+    sessions = log_in(client, accounts, args.password, recorder)
+    scenarios = Scenarios(client, sessions, pending, random.Random(args.seed + 1))
+    names, weights = zip(*mix.items())
+
+    def fire(name, scheduled):
+        started = time.perf_counter()
+        try:
+            status = getattr(scenarios, name)()
+        except (OSError, http.client.HTTPException) as error:
+            status = f'error:{type(error).__name__}'
+        finished = time.perf_counter()
+        if status is not None and scheduled >= measure_from:
+            recorder.record(name, status, finished - scheduled, finished - started)
+
+    print(f"Driving {args.rate}/s for {args.duration}s (+{args.warmup}s warm-up) against {args.base_url}")
+    begin = time.perf_counter()
+    measure_from = begin + args.warmup
+    stop_at = measure_from + args.duration
+    scheduled = begin
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        while True:
+            scheduled += rng.expovariate(args.rate)  # Poisson arrivals, independent of response times
+            if scheduled >= stop_at:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(fire, rng.choices(names, weights)[0], scheduled)
+    elapsed = args.duration
+
+    endpoints, total = summarise(recorder.samples, elapsed)
+    result = {
+        'config': {'base_url': args.base_url, 'rate': args.rate, 'duration': args.duration, 'warmup': args.warmup,
+                   'concurrency': args.concurrency, 'users_per_role': args.users, 'seed': args.seed, 'mix': mix},
+        'finished_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'total': total,
+        'endpoints': endpoints,
+    }
+    print_table(endpoints, total)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+        print(f"Results written to {args.output}")
+    if args.max_error_rate is not None and total['error_rate'] > args.max_error_rate:
+        raise SystemExit(f"Error rate {total['error_rate']:.2%} is above {args.max_error_rate:.2%}")
+
+
+def parse_mix(spec):
+    if not spec:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if not hasattr(Scenarios, name) or name.startswith('_'):
+            raise SystemExit(f"Unknown scenario {name!r}; choose from {', '.join(DEFAULT_MIX)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def print_table(endpoints, total):
+    print(f"{'endpoint':>26} {'reqs':>7} {'rps':>8} {'err%':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, stats in list(endpoints.items()) + [('TOTAL', total)]:
+        print(f"{name:>26} {stats['requests']:>7} {stats['throughput_rps'] or 0:>8.1f} {stats['error_rate'] * 100:>6.2f} "
+              f"{stats['p50_ms'] or 0:>8.1f} {stats['p95_ms'] or 0:>8.1f} {stats['p99_ms'] or 0:>8.1f} "
+              f"{stats['max_ms'] or 0:>8.1f}")
+
+
+def compare(before_path, after_path):
+    """Per-endpoint change in latency percentiles and error rate between two result files."""
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"{'endpoint':>26} {'p50 ms':>17} {'p95 ms':>17} {'p99 ms':>17} {'err%':>13}")
+    rows = sorted(set(before['endpoints']) | set(after['endpoints']))
+    for name in rows + ['TOTAL']:
+        old = before['total'] if name == 'TOTAL' else before['endpoints'].get(name)
+        new = after['total'] if name == 'TOTAL' else after['endpoints'].get(name)
+        if not old or not new:
+            print(f"{name:>26} {'only in ' + (after_path if new else before_path):>17}")
+            continue
+        cells = []
+        for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            a, b = old[key] or 0, new[key] or 0
+            change = f"{(b - a) / a:+.0%}" if a else 'n/a'
+            cells.append(f"{a:>6.1f}→{b:<6.1f}{change:>4}")
+        cells.append(f"{old['error_rate'] * 100:>5.2f}→{new['error_rate'] * 100:<5.2f}")
+        print(f"{name:>26} " + ' '.join(f'{cell:>17}' for cell in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--rate', type=float, default=20, help='Target arrivals per second (open loop).')
+    parser.add_argument('--duration', type=float, default=30, help='Measured seconds.')
+    parser.add_argument('--warmup', type=float, default=5, help='Seconds of load before measuring.')
+    parser.add_argument('--concurrency', type=int, default=64, help='Most requests in flight at once.')
+    parser.add_argument('--mix', help='Weights, e.g. "stock_poll=60,add_stock=10,store_report=5" (default: all).')
+    parser.add_argument('--users', type=int, default=10, help='Seeded users logged in per role.')
+    parser.add_argument('--password', default='seed-password', help='Password `flask seed` gave the users.')
+    parser.add_argument('--database-url', help='Defaults to DATABASE_URL.')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for arrivals and request choices.')
+    parser.add_argument('--output', '-o', help='Write results as JSON.')
+    parser.add_argument('--max-error-rate', type=float, help='Exit non-zero above this error rate (e.g. 0.01).')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='Diff two result files and exit.')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
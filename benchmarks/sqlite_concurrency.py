@@ -0,0 +1,116 @@
+"""Reader/writer concurrency on SQLite: rollback journal vs the WAL engine profile.
+
+Usage:
+    python benchmarks/sqlite_concurrency.py --readers 8 --seconds 5
+
+One writer thread keeps updating stock and committing while reader threads run the
+store stock listing query. Each mode gets a fresh database file; the tuned mode uses
+the same connect-event settings as the app (WAL, synchronous=NORMAL, busy_timeout).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert, select, update
+from sqlalchemy.exc import OperationalError
+
+MODES = {
+    'rollback-journal': {'sqlite_journal_mode': 'DELETE', 'sqlite_synchronous': 'FULL'},
+    'wal': {'sqlite_journal_mode': 'WAL', 'sqlite_synchronous': 'NORMAL'},
+}
+
+
+def build_engine(path, settings, pool_size):
+    from app import db
+    from app.engine_tuning import tune_engine
+
+    engine = create_engine(f'sqlite:///{path}', pool_size=pool_size, max_overflow=0)
+    tune_engine(engine, dict(settings, statement_timeout_ms=None, sqlite_busy_timeout_ms=5000))
+    db.metadata.create_all(engine)
+    return engine
+
+
+def seed(engine, products):
+    from app.models import User, Store, Product
+
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__).values(id=1, username='bench', email='bench@bench',
+                                                   password_hash='x', role='merchant', is_active=True))
+        conn.execute(insert(Store.__table__).values(id=1, name='Bench Store', merchant_id=1))
+        conn.execute(insert(Product.__table__), [
+            {'name': f'sku-{i}', 'buying_price': 10, 'selling_price': 15, 'stock_quantity': 100,
+             'spoiled_quantity': 0, 'payment_status': 'not paid', 'version': 1, 'store_id': 1}
+            for i in range(products)
+        ])
+
+
+def run(mode, readers, seconds, products):
+    from app.models import Product
+
+    path = os.path.join(tempfile.mkdtemp(prefix='sqlite-bench-'), 'bench.db')
+    engine = build_engine(path, MODES[mode], pool_size=readers + 1)
+    seed(engine, products)
+
+    products_table = Product.__table__
+    stop = threading.Event()
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    def bump(key):
+        with lock:
+            counts[key] += 1
+
+    def reader():
+        query = select(products_table).where(products_table.c.store_id == 1)
+        while not stop.is_set():
+            try:
+                with engine.connect() as conn:
+                    conn.execute(query).fetchall()
+                bump('reads')
+            except OperationalError:
+                bump('errors')
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            try:
+                with engine.begin() as conn:
+                    conn.execute(update(products_table)
+                                 .where(products_table.c.id == 1 + i % products)
+                                 .values(stock_quantity=products_table.c.stock_quantity + 1))
+                bump('writes')
+            except OperationalError:
+                bump('errors')
+            i += 1
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)] + [threading.Thread(target=writer)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    return {key: value / seconds for key, value in counts.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--products', type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'mode':>18} {'reads/s':>10} {'writes/s':>10} {'errors/s':>10}")
+    for mode in MODES:
+        result = run(mode, args.readers, args.seconds, args.products)
+        print(f"{mode:>18} {result['reads']:>10.0f} {result['writes']:>10.0f} {result['errors']:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
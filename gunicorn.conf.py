@@ -0,0 +1,21 @@
+"""gunicorn settings: ``gunicorn -c gunicorn.conf.py wsgi:app``.
+
+The app is imported once in the master (preload_app) so workers start by
+forking instead of each importing Flask, SQLAlchemy and the models again.
+Connection pools are not fork-safe, so every worker drops the pool it
+inherited before serving.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+workers = int(os.getenv('WEB_CONCURRENCY', 2))  # Keep in step with the DB_WORKERS pool sizing
+threads = int(os.getenv('WEB_THREADS', 4))  # An open /api/store/stream holds one; SSE_MAX_STREAMS caps them
+worker_class = 'gthread'
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+
+
+def post_fork(server, worker):
+    from app.startup import dispose_engines
+
+    dispose_engines(server.app.wsgi())
@@ -0,0 +1,48 @@
+"""Add store inventory summary
+
+Revision ID: 4b7d2e91c0a3
+Revises: 1c1081e633e6
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b7d2e91c0a3'
+down_revision = '1c1081e633e6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('store_inventory_summary',
+    sa.Column('store_id', sa.Integer(), nullable=False),
+    sa.Column('total_stock_value', sa.Float(), nullable=False),
+    sa.Column('total_stock', sa.Integer(), nullable=False),
+    sa.Column('spoiled_stock', sa.Integer(), nullable=False),
+    sa.Column('paid_count', sa.Integer(), nullable=False),
+    sa.Column('unpaid_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['store_id'], ['stores.id'], ),
+    sa.PrimaryKeyConstraint('store_id')
+    )
+
+    # Backfill from the current products table
+    op.execute("""
+        INSERT INTO store_inventory_summary
+            (store_id, total_stock_value, total_stock, spoiled_stock, paid_count, unpaid_count)
+        SELECT s.id,
+               COALESCE(SUM(p.selling_price * p.stock_quantity), 0),
+               COALESCE(SUM(p.stock_quantity), 0),
+               COALESCE(SUM(p.spoiled_quantity), 0),
+               COALESCE(SUM(CASE WHEN p.payment_status = 'paid' THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN p.payment_status = 'not paid' THEN 1 ELSE 0 END), 0)
+        FROM stores s
+        LEFT OUTER JOIN products p ON p.store_id = s.id
+        GROUP BY s.id
+    """)
+
+
+def downgrade():
+    op.drop_table('store_inventory_summary')
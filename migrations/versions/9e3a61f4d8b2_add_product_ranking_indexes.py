@@ -0,0 +1,50 @@
+"""Add stored revenue column and product ranking indexes
+
+Revision ID: 9e3a61f4d8b2
+Revises: 4b7d2e91c0a3
+Create Date: 2026-10-18 10:03:17.552901
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e3a61f4d8b2'
+down_revision = '4b7d2e91c0a3'
+branch_labels = None
+depends_on = None
+
+
+RANKING_INDEXES = [
+    ('ix_products_revenue', ['revenue']),
+    ('ix_products_stock_quantity', ['stock_quantity']),
+    ('ix_products_spoiled_quantity', ['spoiled_quantity']),
+    ('ix_products_store_id_revenue', ['store_id', 'revenue']),
+    ('ix_products_store_id_stock_quantity', ['store_id', 'stock_quantity']),
+    ('ix_products_store_id_spoiled_quantity', ['store_id', 'spoiled_quantity']),
+]
+
+
+def _batch_products():
+    # SQLite cannot ALTER TABLE ADD a STORED generated column, so rebuild the table there
+    recreate = 'always' if op.get_bind().dialect.name == 'sqlite' else 'auto'
+    return op.batch_alter_table('products', schema=None, recreate=recreate)
+
+
+def upgrade():
+    with _batch_products() as batch_op:
+        batch_op.add_column(sa.Column('revenue', sa.Float(), sa.Computed('selling_price * stock_quantity', persisted=True), nullable=True))
+
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        for name, columns in RANKING_INDEXES:
+            batch_op.create_index(name, columns, unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        for name, _ in reversed(RANKING_INDEXES):
+            batch_op.drop_index(name)
+
+    with _batch_products() as batch_op:
+        batch_op.drop_column('revenue')
@@ -0,0 +1,27 @@
+"""Add product version column for optimistic concurrency
+
+Revision ID: c5f18a7b2e40
+Revises: 9e3a61f4d8b2
+Create Date: 2026-10-18 11:47:05.904311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5f18a7b2e40'
+down_revision = '9e3a61f4d8b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    # Plain ALTER TABLE DROP COLUMN (SQLite >= 3.35); a batch rebuild would try to copy
+    # the generated revenue column and fail
+    op.drop_column('products', 'version')
@@ -0,0 +1,61 @@
+"""Add product name search index (pg_trgm on PostgreSQL, FTS5 on SQLite)
+
+Revision ID: f2b6c84d1e93
+Revises: d3a9f0c61b57
+Create Date: 2026-10-18 16:41:06.208417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b6c84d1e93'
+down_revision = 'd3a9f0c61b57'
+branch_labels = None
+depends_on = None
+
+
+SQLITE_UPGRADE = [
+    "CREATE VIRTUAL TABLE products_search USING fts5("
+    "name, store, content='', prefix='1 2 3', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE VIRTUAL TABLE products_search_terms USING fts5vocab(products_search, 'col')",
+    "INSERT INTO products_search (rowid, name, store) SELECT id, name, 's' || store_id FROM products",
+    "CREATE TRIGGER products_search_insert AFTER INSERT ON products BEGIN "
+    "INSERT INTO products_search (rowid, name, store) VALUES (new.id, new.name, 's' || new.store_id); END",
+    "CREATE TRIGGER products_search_delete AFTER DELETE ON products BEGIN "
+    "INSERT INTO products_search (products_search, rowid, name, store) "
+    "VALUES ('delete', old.id, old.name, 's' || old.store_id); END",
+    "CREATE TRIGGER products_search_update AFTER UPDATE OF name, store_id ON products BEGIN "
+    "INSERT INTO products_search (products_search, rowid, name, store) "
+    "VALUES ('delete', old.id, old.name, 's' || old.store_id); "
+    "INSERT INTO products_search (rowid, name, store) VALUES (new.id, new.name, 's' || new.store_id); END",
+]
+
+SQLITE_DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS products_search_update",
+    "DROP TRIGGER IF EXISTS products_search_delete",
+    "DROP TRIGGER IF EXISTS products_search_insert",
+    "DROP TABLE IF EXISTS products_search_terms",
+    "DROP TABLE IF EXISTS products_search",
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.create_index('ix_products_name_trgm', 'products', ['name'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    elif dialect == 'sqlite':
+        for statement in SQLITE_UPGRADE:
+            op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.drop_index('ix_products_name_trgm', table_name='products')
+    elif dialect == 'sqlite':
+        for statement in SQLITE_DOWNGRADE:
+            op.execute(statement)
@@ -0,0 +1,146 @@
+import os
+from datetime import datetime, timedelta
+
+import jwt
+import pytest
+from flask import current_app
+
+os.environ.setdefault('SECRET_KEY', 'test-secret')
+os.environ.setdefault('FLASK_CONFIG', 'testing')
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('benchmark', 'endpoint benchmarks (tests/test_benchmarks.py)')
+    group.addoption('--benchmark', action='store_true', help='Run the endpoint benchmarks (skipped otherwise).')
+    group.addoption('--benchmark-update', action='store_true', help='Rewrite tests/baselines/ with this run.')
+    group.addoption('--benchmark-threshold', type=float, default=0.5,
+                    help='Allowed slowdown / memory growth before failing (0.5 = 50%%).')
+    group.addoption('--benchmark-sizes', default='small,medium', help='Comma-separated: small, medium, large.')
+    group.addoption('--benchmark-repeat', type=int, default=5, help='Timed calls per handler; the fastest counts.')
+    group.addoption('--benchmark-yes-drop', action='store_true',
+                    help="Confirm BENCHMARK_POSTGRES_URL is a throwaway database: its tables are dropped.")
+
+
+def pytest_configure(config):
+    config.pluginmanager.import_plugin('app.query_budget_plugin')
+    config.addinivalue_line('markers', 'benchmark: endpoint benchmark, only run with --benchmark')
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--benchmark') or config.getoption('--benchmark-update'):
+        return
+    skip = pytest.mark.skip(reason='benchmarks run with --benchmark')
+    for item in items:
+        if 'benchmark' in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # A file database so requests on other threads see the same data
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setenv('RESPONSE_CACHE_PATH', str(tmp_path / 'response_cache.db'))  # Versions are per cache file
+    monkeypatch.setenv('CHANGE_STREAM_PATH', str(tmp_path / 'change_stream.db'))
+
+    from app import create_app, db
+    from app.principal_cache import principal_cache
+
+    app = create_app()
+    app.config.update(TESTING=True, PASSWORD_HASH_WORKERS=0)
+    principal_cache.clear()
+
+    with app.app_context():
+        db.create_all(bind_key=None)  # Primary only; replica binds are never schema-managed
+        yield app
+        db.session.remove()
+        db.drop_all(bind_key=None)
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def seed(app):
+    """A merchant, an admin, one store and a clerk working in it."""
+    from app import db
+    from app.models import User, Store
+
+    merchant = User(username='merchant', email='merchant@example.com', password_hash='x', role='merchant')
+    admin = User(username='admin', email='admin@example.com', password_hash='x', role='admin')
+    db.session.add_all([merchant, admin])
+    db.session.commit()
+
+    store = Store(name='Main Store', merchant_id=merchant.id)
+    db.session.add(store)
+    db.session.commit()
+
+    clerk = User(username='clerk', email='clerk@example.com', password_hash='x', role='clerk', store_id=store.id)
+    db.session.add(clerk)
+    db.session.commit()
+
+    return {'merchant': merchant.id, 'admin': admin.id, 'clerk': clerk.id, 'store': store.id}
+
+
+@pytest.fixture
+def auth_headers():
+    """Bearer headers for a user of whichever app context is active."""
+    def make(user_id):
+        token = jwt.encode({'user_id': user_id, 'exp': datetime.utcnow() + timedelta(hours=1)},
+                           current_app.config['SECRET_KEY'], algorithm='HS256')
+        return {'Authorization': f'Bearer {token}'}
+    return make
+
+
+@pytest.fixture
+def smtp_server():
+    """A local debugging SMTP server; recipients containing 'bounce' are refused with a 550."""
+    import socketserver
+    import threading
+
+    class Handler(socketserver.StreamRequestHandler):
+        def reply(self, line):
+            self.wfile.write(f'{line}\r\n'.encode())
+
+        def handle(self):
+            server.connections += 1
+            self.reply('220 localhost debugging server')
+            recipients, reading_data, data = [], False, []
+            for raw in self.rfile:
+                line = raw.decode().rstrip('\r\n')
+                if reading_data:
+                    if line == '.':
+                        reading_data = False
+                        server.messages.append({'to': recipients, 'data': '\n'.join(data)})
+                        recipients, data = [], []
+                        self.reply('250 OK')
+                    else:
+                        data.append(line)
+                    continue
+                command = line[:4].upper()
+                if command in ('EHLO', 'HELO'):
+                    self.reply('250 localhost')
+                elif command == 'RCPT':
+                    if 'bounce' in line:
+                        self.reply('550 No such user')
+                    else:
+                        recipients.append(line.split(':', 1)[1].strip(' <>'))
+                        self.reply('250 OK')
+                elif command == 'DATA':
+                    reading_data = True
+                    self.reply('354 End data with <CR><LF>.<CR><LF>')
+                elif command == 'QUIT':
+                    self.reply('221 Bye')
+                    return
+                else:  # MAIL, RSET, NOOP
+                    self.reply('250 OK')
+
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    server.connections, server.messages = 0, []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
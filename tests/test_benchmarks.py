@@ -0,0 +1,215 @@
+"""Hot handlers timed through the test client against seeded databases, gated on stored baselines.
+
+    pytest tests/test_benchmarks.py --benchmark                  # compare with tests/baselines/
+    pytest tests/test_benchmarks.py --benchmark-update           # record new baselines
+    BENCHMARK_POSTGRES_URL=postgresql://... pytest ... --benchmark --benchmark-yes-drop  # PostgreSQL as well
+
+A handler fails when it runs more SQL than its baseline, or when its fastest time or peak
+traced memory grows by more than --benchmark-threshold (and by more than a small absolute
+floor, so sub-millisecond jitter never fails a run). Time baselines are machine-specific:
+record them on the machine that gates on them. The PostgreSQL database's tables are dropped
+and recreated, so point BENCHMARK_POSTGRES_URL at a throwaway database only.
+"""
+import gc
+import json
+import os
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import jwt
+import pytest
+from sqlalchemy import func
+
+from app.query_budget import QueryRecorder
+
+pytestmark = pytest.mark.benchmark
+
+BASELINE_DIR = Path(__file__).parent / 'baselines'
+SIZES = {'small': 0.1, 'medium': 1, 'large': 10}  # flask seed scale: 1k, 10k, 100k products
+TIME_FLOOR_MS = 1.0
+MEMORY_FLOOR_KIB = 64
+
+# name: (role making the call, method, path, JSON body); {placeholders} come from the seeded data
+HANDLERS = {
+    'view_stock_by_store': ('admin', 'GET', '/api/store/stock/{store_id}', None),
+    'search_store_products': ('clerk', 'GET', '/api/store/{store_id}/products/search?q=suga', None),
+    'get_products': ('merchant', 'GET', '/api/products', None),
+    'store_report': ('admin', 'GET', '/api/report/store', None),
+    'product_report': ('merchant', 'GET', '/api/report/products', None),
+    'graph_store_performance': ('merchant', 'GET', '/api/graph/graph/store-performance', None),
+    'graph_top_products': ('merchant', 'GET', '/api/graph/graph/top-products', None),
+    'graph_spoiled_products': ('merchant', 'GET', '/api/graph/graph/spoiled-products', None),
+    'login': (None, 'POST', '/api/auth/login', {'email': '{admin_email}', 'password': 'seed-password'}),
+    'add_stock': ('clerk', 'POST', '/api/store/stock', {'item': 'Benchmark item', 'quantity': 1, 'buying_price': 1.0,
+                                                        'selling_price': 2.0, 'store_id': '{store_id}'}),
+}
+
+
+def _backends():
+    backends = ['sqlite']
+    if os.getenv('BENCHMARK_POSTGRES_URL'):
+        backends.append('postgresql')
+    return backends
+
+
+def pytest_generate_tests(metafunc):
+    if 'dataset' in metafunc.fixturenames:
+        sizes = [size.strip() for size in metafunc.config.getoption('--benchmark-sizes').split(',') if size.strip()]
+        unknown = set(sizes) - set(SIZES)
+        if unknown:
+            raise pytest.UsageError(f"Unknown benchmark size(s): {', '.join(sorted(unknown))}")
+        datasets = [(backend, size) for backend in _backends() for size in sizes]
+        running = metafunc.config.getoption('--benchmark') or metafunc.config.getoption('--benchmark-update')
+        if running and 'postgresql' in _backends() and not metafunc.config.getoption('--benchmark-yes-drop'):
+            raise pytest.UsageError('The benchmarks drop every table in BENCHMARK_POSTGRES_URL; '
+                                    'pass --benchmark-yes-drop if it is a throwaway database')
+        metafunc.parametrize('dataset', datasets, ids=[f'{b}-{s}' for b, s in datasets], indirect=True, scope='module')
+
+
+@pytest.fixture(scope='module')
+def dataset(request, tmp_path_factory):
+    """An app over a database seeded at one size, plus the ids and tokens the handlers need."""
+    backend, size = request.param
+    workdir = tmp_path_factory.mktemp('bench')
+    if backend == 'sqlite':
+        url = f"sqlite:///{workdir / f'{size}.db'}"
+    else:
+        url = os.environ['BENCHMARK_POSTGRES_URL']
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv('DATABASE_URL', url)
+        patch.setenv('RESPONSE_CACHE_BACKEND', 'off')  # Measure the handlers, not cache hits
+        patch.setenv('CHANGE_STREAM_PATH', str(workdir / 'change_stream.db'))  # Not instance/ in the work tree
+
+        from app import create_app, db
+        from app.models import User, Store, Product
+        from app.principal_cache import principal_cache
+        from app.seeding import generate
+
+        app = create_app()
+        app.config.update(TESTING=True, PASSWORD_HASH_WORKERS=0)
+        principal_cache.clear()
+
+        with app.app_context():
+            if backend != 'sqlite':
+                db.drop_all(bind_key=None)
+            db.create_all(bind_key=None)
+            generate(SIZES[size], seed=1)
+
+            # The biggest store and the people who work with it: the worst case dashboards hit
+            store_id = (db.session.query(Product.store_id).group_by(Product.store_id)
+                        .order_by(func.count().desc()).limit(1).scalar())
+            merchant_id = db.session.get(Store, store_id).merchant_id
+            clerk = User.query.filter_by(role='clerk', store_id=store_id).first()
+            admin = User.query.filter_by(role='admin').first()
+
+            def token(user_id):
+                return jwt.encode({'user_id': user_id, 'exp': datetime.utcnow() + timedelta(hours=1)},
+                                  app.config['SECRET_KEY'], algorithm='HS256')
+
+            yield {
+                'name': f'{backend}-{size}',
+                'app': app,
+                'values': {'store_id': store_id, 'admin_email': admin.email},
+                'headers': {role: {'Authorization': f'Bearer {token(user_id)}'}
+                            for role, user_id in (('admin', admin.id), ('merchant', merchant_id),
+                                                  ('clerk', clerk.id))},
+            }
+            db.session.remove()
+            if backend != 'sqlite':
+                db.drop_all(bind_key=None)
+            for engine in db.engines.values():
+                engine.dispose()
+
+
+@pytest.fixture(scope='session')
+def baselines(request):
+    """Baseline files by dataset name; rewritten at the end of the session with --benchmark-update."""
+    loaded, results = {}, {}
+
+    def load(name):
+        if name not in loaded:
+            path = BASELINE_DIR / f'{name}.json'
+            loaded[name] = json.loads(path.read_text()) if path.exists() else {}
+        return loaded[name]
+
+    yield load, results
+
+    if request.config.getoption('--benchmark-update') and results:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        for name, handlers in results.items():
+            merged = dict(load(name), **handlers)
+            (BASELINE_DIR / f'{name}.json').write_text(json.dumps(merged, indent=2, sort_keys=True) + '\n')
+
+
+def _fill(template, values):
+    if isinstance(template, str):
+        value = template.format(**values)
+        return int(value) if template.startswith('{') and value.isdigit() else value
+    if isinstance(template, dict):
+        return {key: _fill(item, values) for key, item in template.items()}
+    return template
+
+
+def measure(client, call, repeat):
+    """Fastest of ``repeat`` timed calls, SQL statements of one call, peak traced allocation of one call."""
+    def send():
+        response = client.open(**call)
+        assert response.status_code in (200, 201), response.get_data(as_text=True)[:500]
+
+    send()  # Warm caches (principal, compiled statements, page cache)
+    timings = []
+    gc.collect()
+    gc.disable()  # As timeit does: a collection landing in one call is noise, not the handler
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            send()
+            timings.append(time.perf_counter() - started)
+    finally:
+        gc.enable()
+    with QueryRecorder() as queries:
+        send()
+    tracemalloc.start()
+    try:
+        send()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'time_ms': round(min(timings) * 1000, 3), 'sql': queries.count, 'peak_kib': round(peak / 1024, 1)}
+
+
+def regressions(result, baseline, threshold):
+    problems = []
+    if result['sql'] > baseline['sql']:
+        problems.append(f"SQL statements {baseline['sql']} -> {result['sql']}")
+    for key, floor, unit in (('time_ms', TIME_FLOOR_MS, 'ms'), ('peak_kib', MEMORY_FLOOR_KIB, 'KiB')):
+        before, after = baseline[key], result[key]
+        if after > before * (1 + threshold) and after - before > floor:
+            problems.append(f"{key} {before}{unit} -> {after}{unit} (+{(after - before) / before:.0%})")
+    return problems
+
+
+@pytest.mark.no_query_budget  # Budgets are asserted by the route tests; here the SQL count is the baseline's job
+@pytest.mark.parametrize('handler', list(HANDLERS))
+def test_handler_against_baseline(dataset, handler, baselines, request):
+    role, method, path, body = HANDLERS[handler]
+    values = dataset['values']
+    call = {'path': _fill(path, values), 'method': method, 'headers': dataset['headers'].get(role, {})}
+    if body is not None:
+        call['json'] = _fill(body, values)
+
+    with dataset['app'].test_client() as client:
+        result = measure(client, call, request.config.getoption('--benchmark-repeat'))
+
+    load, results = baselines
+    results.setdefault(dataset['name'], {})[handler] = result
+    if request.config.getoption('--benchmark-update'):
+        return
+    baseline = load(dataset['name']).get(handler)
+    if baseline is None:
+        pytest.skip(f"No baseline for {dataset['name']}/{handler}; record one with --benchmark-update")
+    problems = regressions(result, baseline, request.config.getoption('--benchmark-threshold'))
+    assert not problems, f"{handler} on {dataset['name']} regressed: " + '; '.join(problems)
@@ -0,0 +1,142 @@
+from datetime import datetime
+from decimal import Decimal
+
+from app import db
+from app.models import Product
+from app.serializers import STOCK_ITEM
+
+
+def test_serializer_dumps_instances_and_rows_alike(app, seed):
+    db.session.add(Product(name='Milk', buying_price=1.5, selling_price=2.5, stock_quantity=7, store_id=seed['store']))
+    db.session.commit()
+
+    query = Product.query.filter_by(store_id=seed['store'])
+    from_rows = STOCK_ITEM.dump_many(query.with_entities(*STOCK_ITEM.columns()))
+    assert from_rows == STOCK_ITEM.dump_many(query.all())
+    assert from_rows == [{'id': 1, 'name': 'Milk', 'buying_price': 1.5, 'selling_price': 2.5, 'quantity': 7,
+                          'spoiled_quantity': 0, 'payment_status': 'not paid', 'version': 1}]
+
+
+def test_json_provider_matches_flask_default_output(app):
+    from flask.json.provider import DefaultJSONProvider
+    payload = {'b': [1, 2.5, None], 'a': 'x', 'when': datetime(2024, 1, 2, 3, 4, 5), 'price': Decimal('9.90')}
+
+    with app.test_request_context():
+        assert app.json.response(payload).get_data() == DefaultJSONProvider(app).response(payload).get_data()
+    assert app.json.loads(app.json.dumps(payload))['when'] == 'Tue, 02 Jan 2024 03:04:05 GMT'
+
+
+def test_seed_generator_is_deterministic_and_skewed(app):
+    from sqlalchemy import func
+    from app.models import Store, SupplyRequest
+    from app.seeding import generate
+    from app.inventory_summary import find_drift
+
+    def run():
+        first_store = (db.session.query(func.max(Store.id)).scalar() or 0) + 1
+        first_product = (db.session.query(func.max(Product.id)).scalar() or 0) + 1
+        counts = generate(0.2, seed=7)
+        shape = [(p.buying_price, p.selling_price, p.stock_quantity, p.store_id - first_store)
+                 for p in Product.query.filter(Product.id >= first_product).order_by(Product.id)]
+        return counts, shape
+
+    counts, shape = run()
+    assert counts['products'] == 2_000 and counts['stores'] == 4
+    again_counts, again_shape = run()  # Appends after the first run with the same random stream
+    assert (again_counts, again_shape) == (counts, shape)
+
+    assert db.session.query(func.count(func.distinct(Product.name))).scalar() == 4_000
+    per_store = sorted(n for _, n in db.session.query(Product.store_id, func.count()).group_by(Product.store_id))
+    assert per_store[-1] > 3 * per_store[0]  # A few big stores, the rest small
+    assert SupplyRequest.query.count() == 800
+    assert find_drift() == []
+
+
+def test_grouped_store_report_matches_the_per_store_loop(app, seed):
+    from app.models import Store
+    from app.reports import aggregate_store_performance_rows, store_performance_rows
+
+    empty = Store(name='Empty Store', merchant_id=seed['merchant'])
+    other = Store(name='Other Store', merchant_id=seed['merchant'])
+    db.session.add_all([empty, other])
+    db.session.flush()
+    db.session.add_all([
+        Product(name='Milk', buying_price=1, selling_price=2.5, stock_quantity=4, spoiled_quantity=1,
+                payment_status='paid', store_id=seed['store']),
+        Product(name='Bread', buying_price=1, selling_price=1.25, stock_quantity=8, store_id=seed['store']),
+        Product(name='Soap', buying_price=1, selling_price=3, stock_quantity=0, spoiled_quantity=2, store_id=other.id),
+    ])
+    db.session.commit()
+
+    def loop_row(store):  # The report as it was computed before the grouped query
+        products = Product.query.filter_by(store_id=store.id).all()
+        return (store.id, store.name,
+                sum(p.selling_price * p.stock_quantity for p in products),
+                sum(p.stock_quantity for p in products),
+                sum(p.spoiled_quantity for p in products),
+                sum(1 for p in products if p.payment_status == 'paid'),
+                sum(1 for p in products if p.payment_status == 'not paid'))
+
+    expected = [loop_row(store) for store in Store.query.order_by(Store.id)]
+    assert [tuple(row) for row in aggregate_store_performance_rows()] == expected
+    assert [tuple(row) for row in store_performance_rows()] == expected
+    assert expected[1] == (empty.id, 'Empty Store', 0, 0, 0, 0, 0)
+
+
+def test_inventory_summary_follows_orm_writes_and_check_reports_drift(app, seed):
+    from app.models import Store, StoreInventorySummary
+    from app.inventory_summary import find_drift, inventory_summary_cli
+
+    def summary(store_id):
+        row = db.session.get(StoreInventorySummary, store_id)
+        db.session.refresh(row)
+        return (row.total_stock_value, row.total_stock, row.spoiled_stock, row.paid_count, row.unpaid_count)
+
+    other = Store(name='Other Store', merchant_id=seed['merchant'])
+    db.session.add(other)
+    db.session.commit()
+    assert summary(other.id) == (0, 0, 0, 0, 0)
+
+    milk = Product(name='Milk', buying_price=1, selling_price=2, stock_quantity=5, store_id=seed['store'])
+    db.session.add(milk)
+    db.session.commit()
+    assert summary(seed['store']) == (10, 5, 0, 0, 1)
+
+    milk.stock_quantity, milk.spoiled_quantity, milk.payment_status = 7, 2, 'paid'
+    db.session.commit()
+    assert summary(seed['store']) == (14, 7, 2, 1, 0)
+
+    milk.store_id = other.id  # Moves its whole contribution
+    db.session.commit()
+    assert summary(seed['store']) == (0, 0, 0, 0, 0)
+    assert summary(other.id) == (14, 7, 2, 1, 0)
+
+    db.session.delete(milk)
+    db.session.commit()
+    assert summary(other.id) == (0, 0, 0, 0, 0)
+    assert find_drift() == []
+
+    runner = app.test_cli_runner()
+    assert runner.invoke(inventory_summary_cli, ['check']).exit_code == 0
+    db.session.execute(db.update(StoreInventorySummary).where(StoreInventorySummary.store_id == other.id)
+                       .values(total_stock=3))
+    db.session.commit()
+    assert find_drift() == [(other.id, 'total_stock', 3, 0)]
+    result = runner.invoke(inventory_summary_cli, ['check'])
+    assert result.exit_code == 1 and f'store {other.id}: total_stock is 3, expected 0' in result.output
+
+    assert runner.invoke(inventory_summary_cli, ['rebuild']).exit_code == 0
+    assert runner.invoke(inventory_summary_cli, ['check']).exit_code == 0
+
+
+def test_sqlite_connections_get_the_profile_pragmas(app):
+    from app.config import TestingConfig
+
+    with db.engine.connect() as connection:
+        def pragma(name):
+            return connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+
+        assert pragma('journal_mode') == 'wal'
+        assert pragma('busy_timeout') == TestingConfig.SQLITE_BUSY_TIMEOUT_MS
+        assert pragma('synchronous') == 1  # NORMAL
+    assert app.config['SQLALCHEMY_ENGINE_OPTIONS']['pool_size'] == TestingConfig.DB_THREADS
@@ -0,0 +1,1018 @@
+import email
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from app import db
+from app.models import Product, SupplyRequest
+from app.inventory_summary import find_drift
+from app.startup import SchemaOutOfDate, check_schema
+
+BOOT_BUDGET_SECONDS = 1.5  # Import + create_app() in a fresh interpreter; ~0.6s on a laptop
+BOOT_SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+create_app()
+print(json.dumps({'seconds': time.perf_counter() - started,
+                  'loaded': [m for m in ('alembic', 'flask_migrate', 'flask_mail', 'dotenv') if m in sys.modules]}))
+'''
+
+RUN_PY_ROUTES_SCRIPT = '''
+import json
+import run
+from app import create_app
+rules = lambda app: sorted(f"{sorted(rule.methods)} {rule.rule}" for rule in app.url_map.iter_rules())
+print(json.dumps({'same': rules(run.app) == rules(create_app()), 'config': sorted(run.app.config)}))
+'''
+
+RUN_PY_REGISTER_SCRIPT = '''
+import json
+from datetime import datetime, timedelta
+import jwt
+import run
+from app import db
+from app.models import OutboxMessage, User
+with run.app.app_context():
+    db.create_all(bind_key=None)
+    merchant = User(username='merchant', email='merchant@example.com', password_hash='x', role='merchant')
+    db.session.add(merchant)
+    db.session.commit()
+    token = jwt.encode({'user_id': merchant.id, 'exp': datetime.utcnow() + timedelta(hours=1)},
+                       run.app.config['SECRET_KEY'], algorithm='HS256')
+response = run.app.test_client().post('/api/auth/register-admin', headers={'Authorization': f'Bearer {token}'},
+                                      json={'username': 'ann', 'email': 'ann@example.com', 'password': 'pw'})
+with run.app.app_context():
+    print(json.dumps({'status': response.status_code, 'bodies': [m.body for m in OutboxMessage.query]}))
+'''
+
+SEED_PY_SCRIPT = '''
+import json
+import seed
+from app.startup import check_schema
+seed.seed_database(0.01, 1)
+print(json.dumps(sorted(check_schema(seed.app))))
+'''
+
+
+def _run_py(script, tmp_path, **settings):
+    """Run ``script`` in a fresh interpreter from the repository root (where run.py and seed.py live), on a scratch database."""
+    env = {key: value for key, value in os.environ.items() if not key.startswith('MAIL_')}
+    env.update(settings)
+    env.update(DATABASE_URL=f"sqlite:///{tmp_path / 'run.db'}", RESPONSE_CACHE_PATH=str(tmp_path / 'cache.db'),
+               CHANGE_STREAM_PATH=str(tmp_path / 'stream.db'))
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, '-c', script], cwd=root, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])  # The script's own output comes last
+
+
+def _run_concurrently(target, threads):
+    workers = [threading.Thread(target=target) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def test_concurrent_add_stock_loses_no_updates(app, seed, auth_headers):
+    headers = auth_headers(seed['clerk'])
+    payload = {'item': 'Sugar', 'quantity': 1, 'buying_price': 1.0, 'selling_price': 2.0, 'store_id': seed['store']}
+    assert app.test_client().post('/api/store/stock', json=payload, headers=headers).status_code == 201
+
+    threads, per_thread = 8, 25
+    statuses = []
+
+    def receive():
+        client = app.test_client()
+        for _ in range(per_thread):
+            statuses.append(client.post('/api/store/stock', json=payload, headers=headers).status_code)
+
+    _run_concurrently(receive, threads)
+
+    assert statuses == [201] * threads * per_thread
+    product = db.session.execute(db.select(Product).filter_by(name='Sugar')).scalar_one()
+    assert product.stock_quantity == 1 + threads * per_thread
+    assert find_drift() == []
+
+
+def test_supply_request_is_applied_once_under_concurrent_approvals(app, seed, auth_headers):
+    product = Product(name='Rice', buying_price=1, selling_price=2, stock_quantity=5, store_id=seed['store'])
+    db.session.add(product)
+    db.session.flush()
+    supply_request = SupplyRequest(product_id=product.id, quantity_requested=10,
+                                   requested_by=seed['clerk'], store_id=seed['store'])
+    db.session.add(supply_request)
+    db.session.commit()
+    product_id, request_id = product.id, supply_request.id
+
+    headers = auth_headers(seed['admin'])
+    statuses = []
+
+    def approve():
+        response = app.test_client().put(f'/api/supply/request/{request_id}', json={'status': 'approved'}, headers=headers)
+        statuses.append(response.status_code)
+
+    _run_concurrently(approve, 6)
+
+    assert sorted(statuses) == [200] + [409] * 5
+    db.session.expire_all()
+    assert db.session.get(Product, product_id).stock_quantity == 15
+    assert db.session.get(SupplyRequest, request_id).approved_at is not None
+
+
+def test_bulk_supply_decisions_aggregate_stock_and_skip_decided_requests(app, client, seed, auth_headers):
+    rice = Product(name='Rice', buying_price=1, selling_price=2, stock_quantity=5, store_id=seed['store'])
+    beans = Product(name='Beans', buying_price=1, selling_price=2, stock_quantity=0, store_id=seed['store'])
+    db.session.add_all([rice, beans])
+    db.session.flush()
+    requests = [SupplyRequest(product_id=product.id, quantity_requested=quantity, requested_by=seed['clerk'],
+                              store_id=seed['store']) for product, quantity in ((rice, 10), (rice, 3), (beans, 4), (beans, 6))]
+    requests[1].status = 'declined'
+    db.session.add_all(requests)
+    db.session.commit()
+    rice_id, beans_id = rice.id, beans.id
+    ids = [request.id for request in requests]
+    headers = auth_headers(seed['admin'])
+
+    # Two admins approving the same batch at once: each request is applied exactly once
+    responses = []
+
+    def approve():
+        responses.append(app.test_client().post('/api/supply/requests/bulk', headers=headers,
+                                                json={'status': 'approved', 'ids': [ids[0], ids[1], ids[2], 999]}).json)
+
+    _run_concurrently(approve, 4)
+
+    assert sorted(response['approved'] for response in responses) == [0, 0, 0, 2]
+    winner = next(response for response in responses if response['approved'])
+    assert [result['status'] for result in winner['results']] == ['approved', 'skipped', 'approved', 'not_found']
+    assert winner['results'][1]['message'] == 'Supply request is already declined'
+
+    declined = client.post('/api/supply/requests/bulk', headers=headers,
+                           json={'status': 'declined', 'filter': {'store_id': seed['store']}})
+    assert declined.status_code == 200
+    assert [result['id'] for result in declined.json['results']] == [ids[3]]
+
+    db.session.expire_all()
+    assert db.session.get(Product, rice_id).stock_quantity == 15
+    assert db.session.get(Product, beans_id).stock_quantity == 4
+    assert db.session.get(SupplyRequest, ids[0]).approved_at is not None
+    assert db.session.get(SupplyRequest, ids[3]).approved_at is None
+    assert find_drift() == []
+
+
+def test_absolute_stock_update_rejects_stale_version(client, seed, auth_headers):
+    product = Product(name='Salt', buying_price=1, selling_price=2, stock_quantity=5, store_id=seed['store'])
+    db.session.add(product)
+    db.session.commit()
+    headers = auth_headers(seed['admin'])
+
+    first = client.put(f'/api/store/stock/{product.id}', json={'stock_quantity': 7, 'version': 1}, headers=headers)
+    assert first.status_code == 200 and first.json['version'] == 2
+
+    stale = client.put(f'/api/store/stock/{product.id}', json={'stock_quantity': 9, 'version': 1}, headers=headers)
+    assert stale.status_code == 409 and stale.json['version'] == 2
+
+    db.session.expire_all()
+    assert db.session.get(Product, product.id).stock_quantity == 7
+
+
+def test_read_endpoints_stay_within_query_budgets(client, seed, auth_headers, query_counter):
+    db.session.add_all([Product(name=f'Item {i}', buying_price=1, selling_price=2, stock_quantity=i, store_id=seed['store'])
+                        for i in range(20)])
+    db.session.commit()
+    headers = auth_headers(seed['admin'])
+
+    # The plugin fails the test if any of these exceed the budget declared on the view
+    for url in ['/api/report/store', '/api/report/products', '/api/graph/graph/store-performance',
+                f"/api/store/stock/{seed['store']}"]:
+        with query_counter() as queries:
+            assert client.get(url, headers=headers).status_code == 200
+        assert queries.repeated(max_repeats=1) == {}
+
+
+def test_query_budget_flags_n_plus_one(app, client, seed, auth_headers):
+    from app.routes import token_required
+    from app.query_budget import query_budget, violations, QueryBudgetExceeded
+
+    db.session.add_all([Product(name=f'Item {i}', buying_price=1, selling_price=2, store_id=seed['store']) for i in range(8)])
+    db.session.commit()
+
+    @app.route('/api/test/n-plus-one')
+    @query_budget(20, max_repeats=3)
+    @token_required
+    def n_plus_one(current_user):
+        ids = db.session.execute(db.select(Product.id)).scalars().all()
+        return {'names': [db.session.get(Product, product_id).name for product_id in ids]}
+
+    db.session.expunge_all()  # Force one SELECT per product
+    with pytest.raises(QueryBudgetExceeded, match='N\\+1'):
+        client.get('/api/test/n-plus-one', headers=auth_headers(seed['admin']))
+    violations.clear()
+
+
+@pytest.fixture
+def replica_app(tmp_path, monkeypatch):
+    """A primary and a replica SQLite file; the replica is a snapshot that never catches up."""
+    primary, replica = tmp_path / 'primary.db', tmp_path / 'replica.db'
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{primary}')
+    monkeypatch.setenv('DATABASE_REPLICA_URLS', f'sqlite:///{replica}')
+    monkeypatch.setenv('RESPONSE_CACHE_PATH', str(tmp_path / 'response_cache.db'))
+    monkeypatch.setenv('CHANGE_STREAM_PATH', str(tmp_path / 'change_stream.db'))
+
+    from app import create_app
+    from app.models import User, Store
+    from app.principal_cache import principal_cache
+
+    app = create_app()
+    app.config.update(TESTING=True, PASSWORD_HASH_WORKERS=0)
+    principal_cache.clear()
+    with app.app_context():
+        db.create_all()
+        admin = User(username='admin', email='admin@example.com', password_hash='x', role='admin')
+        db.session.add(admin)
+        db.session.commit()
+        store = Store(name='Main Store', merchant_id=admin.id)
+        db.session.add(store)
+        db.session.commit()
+        admin_id, store_id = admin.id, store.id
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()  # Checkpoint the WAL before copying the file
+        shutil.copy(primary, replica)
+        yield app, admin_id, store_id
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def test_read_only_endpoints_use_replica_until_the_client_writes(replica_app, auth_headers):
+    app, admin_id, store_id = replica_app
+    client = app.test_client()
+    headers = auth_headers(admin_id)
+    payload = {'item': 'Tea', 'quantity': 3, 'buying_price': 1.0, 'selling_price': 2.0, 'store_id': store_id}
+
+    # Written straight to the primary; the replica has not seen it
+    db.session.add(Product(name='Coffee', buying_price=1, selling_price=2, stock_quantity=1, store_id=store_id))
+    db.session.commit()
+    assert client.get(f'/api/store/stock/{store_id}', headers=headers).json['stock'] == []
+
+    # Read-your-writes: after a successful write this client reads from the primary
+    assert client.post('/api/store/stock', json=payload, headers=headers).status_code == 201
+    names = {p['name'] for p in client.get(f'/api/store/stock/{store_id}', headers=headers).json['stock']}
+    assert names == {'Coffee', 'Tea'}
+
+
+def test_product_search_reads_from_the_replica(replica_app, auth_headers):
+    app, admin_id, store_id = replica_app
+    db.session.add(Product(name='Coffee', buying_price=1, selling_price=2, stock_quantity=1, store_id=store_id))
+    db.session.commit()  # Primary only; the replica has not seen it
+
+    response = app.test_client().get(f'/api/store/{store_id}/products/search', query_string={'q': 'coffee'},
+                                     headers=auth_headers(admin_id))
+    assert response.status_code == 200 and response.json['results'] == []
+
+
+def test_cached_reports_are_filled_from_the_primary(replica_app, auth_headers):
+    app, admin_id, store_id = replica_app
+    db.session.add(Product(name='Coffee', buying_price=1, selling_price=2, stock_quantity=7, store_id=store_id))
+    db.session.commit()  # Bumps the data version; the replica has not caught up
+
+    response = app.test_client().get('/api/report/store', headers=auth_headers(admin_id))
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.json['store_performance'][0]['total_stock'] == 7
+
+
+def test_unhealthy_replica_falls_back_to_primary(replica_app, auth_headers):
+    app, admin_id, store_id = replica_app
+    db.session.add(Product(name='Coffee', buying_price=1, selling_price=2, stock_quantity=1, store_id=store_id))
+    db.session.commit()
+
+    with db.engines['replica_0'].begin() as conn:
+        conn.exec_driver_sql('DROP TABLE products')
+        conn.exec_driver_sql('DROP TABLE store_inventory_summary')
+        conn.exec_driver_sql('DROP TABLE users')  # Fails the health check
+    app.extensions['db_replicas'].check_interval = 0
+
+    response = app.test_client().get(f'/api/store/stock/{store_id}', headers=auth_headers(admin_id))
+    assert [p['name'] for p in response.json['stock']] == ['Coffee']
+    assert app.extensions['db_replicas'].status() == {'replica_0': False}
+
+
+def test_replica_error_mid_request_is_retried_on_the_primary(replica_app, auth_headers):
+    app, admin_id, store_id = replica_app
+    db.session.add(Product(name='Coffee', buying_price=1, selling_price=2, stock_quantity=1, store_id=store_id))
+    db.session.commit()
+
+    with db.engines['replica_0'].begin() as conn:
+        conn.exec_driver_sql('DROP TABLE products')  # Passes the health check, fails the listing query
+    app.config['QUERY_BUDGET_MODE'] = 'warn'  # The failed replica statement counts towards the budget too
+
+    response = app.test_client().get(f'/api/store/stock/{store_id}', headers=auth_headers(admin_id))
+    assert response.status_code == 200
+    assert [p['name'] for p in response.json['stock']] == ['Coffee']
+    assert app.extensions['db_replicas'].status() == {'replica_0': False}
+
+
+def test_stock_listing_answers_304_until_stock_changes(client, seed, auth_headers, query_counter):
+    headers = auth_headers(seed['clerk'])
+    payload = {'item': 'Flour', 'quantity': 2, 'buying_price': 1.0, 'selling_price': 2.0, 'store_id': seed['store']}
+    assert client.post('/api/store/stock', json=payload, headers=headers).status_code == 201
+    url = f"/api/store/stock/{seed['store']}"
+
+    first = client.get(url, headers=headers)
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and first.headers['Cache-Control'] == 'private, no-cache'
+
+    with query_counter() as queries:
+        cached = client.get(url, headers={**headers, 'If-None-Match': etag})
+    assert cached.status_code == 304 and cached.data == b''
+    assert not any('products.name' in statement for statement in queries.statements)  # No row load
+
+    assert client.post('/api/store/stock', json=payload, headers=headers).status_code == 201
+    changed = client.get(url, headers={**headers, 'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+    assert changed.json['stock'][0]['quantity'] == 4
+
+    # A delete never moves Last-Modified forward, so If-Modified-Since alone is not trusted
+    salt = Product(name='Salt', buying_price=1, selling_price=2, stock_quantity=1, store_id=seed['store'])
+    db.session.add(salt)
+    db.session.commit()
+    listed = client.get(url, headers=headers)
+    assert client.delete(f'/api/store/stock/{salt.id}', headers=auth_headers(seed['admin'])).status_code == 200
+    after = client.get(url, headers={**headers, 'If-Modified-Since': listed.headers['Last-Modified']})
+    assert after.status_code == 200 and [item['name'] for item in after.json['stock']] == ['Flour']
+
+
+def test_product_and_payment_listings_revalidate_through_the_app_factory(client, seed, auth_headers):
+    product = Product(name='Flour', buying_price=1, selling_price=2, stock_quantity=2, store_id=seed['store'])
+    db.session.add(product)
+    db.session.commit()
+    admin, merchant = auth_headers(seed['admin']), auth_headers(seed['merchant'])
+
+    def revalidate(url, headers, etag):
+        return client.get(url, headers={**headers, 'If-None-Match': etag})
+
+    products = client.get('/api/products', headers=merchant)
+    payments = client.get('/api/payments', headers=admin)
+    assert products.status_code == payments.status_code == 200
+    assert [p['name'] for p in payments.json['unpaid_products']] == ['Flour']
+    assert revalidate('/api/products', merchant, products.headers['ETag']).status_code == 304
+    assert revalidate('/api/payments', admin, payments.headers['ETag']).status_code == 304
+    assert client.get('/api/products', headers=admin).headers['ETag'] != products.headers['ETag']  # Per user
+
+    assert client.put(f'/api/payments/{product.id}', headers=admin).status_code == 200
+    changed = revalidate('/api/payments', admin, payments.headers['ETag'])
+    assert changed.status_code == 200 and [p['name'] for p in changed.json['paid_products']] == ['Flour']
+
+    update = client.put(f'/api/stock/{product.id}', json={'stock_quantity': 9}, headers=auth_headers(seed['clerk']))
+    assert update.status_code == 200
+    changed = revalidate('/api/products', merchant, products.headers['ETag'])
+    assert changed.status_code == 200 and changed.json[0]['stock_quantity'] == 9
+
+
+def test_report_cache_is_invalidated_by_product_writes(app, client, seed, auth_headers, tmp_path):
+    from app.response_cache import ResponseCache, SQLiteBackend
+    app.extensions['response_cache'] = ResponseCache(SQLiteBackend(str(tmp_path / 'cache.db')))
+    admin, clerk = auth_headers(seed['admin']), auth_headers(seed['clerk'])
+    payload = {'item': 'Beans', 'quantity': 4, 'buying_price': 1.0, 'selling_price': 3.0, 'store_id': seed['store']}
+
+    first = client.get('/api/report/store', headers=admin)
+    second = client.get('/api/report/store', headers=admin)
+    assert (first.headers['X-Cache'], second.headers['X-Cache']) == ('MISS', 'HIT')
+    assert second.json == first.json
+
+    assert client.post('/api/store/stock', json=payload, headers=clerk).status_code == 201
+    fresh = client.get('/api/report/store', headers=admin)
+    assert fresh.headers['X-Cache'] == 'MISS'
+    assert fresh.json['store_performance'][0]['total_stock'] == 4
+
+    # A second worker sharing the file sees the same data version
+    other_worker = ResponseCache(SQLiteBackend(str(tmp_path / 'cache.db')))
+    assert other_worker.backend.version() == app.extensions['response_cache'].backend.version() == 1
+
+
+def test_response_cache_entries_expire_and_follow_cli_rebuilds(app, client, seed, auth_headers):
+    from flask import Flask
+    from app.inventory_summary import rebuild_summary
+    from app.response_cache import init_response_cache
+
+    cache = app.extensions['response_cache']
+    cache.backend.ttl = 0.2
+    headers = auth_headers(seed['admin'])
+
+    def x_cache():
+        return client.get('/api/report/store', headers=headers).headers['X-Cache']
+
+    assert [x_cache(), x_cache()] == ['MISS', 'HIT']
+    time.sleep(0.25)
+    assert x_cache() == 'MISS'  # Expired even though nothing was written
+
+    version = cache.backend.version()
+    rebuild_summary()  # What `flask seed` and `flask inventory-summary rebuild` run, outside any request
+    assert cache.backend.version() == version + 1
+
+    shared_nothing = Flask(__name__)
+    shared_nothing.config.update(RESPONSE_CACHE_BACKEND='memory', WORKER_PROCESSES=2)
+    with pytest.raises(ValueError, match='single worker'):
+        init_response_cache(shared_nothing)
+
+
+def test_response_cache_computes_a_miss_once(app):
+    from app.response_cache import ResponseCache, MemoryBackend
+    cache = ResponseCache(MemoryBackend())
+    calls = []
+    start = threading.Barrier(8)
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.05)
+        return b'{"ok": true}', True
+
+    results = []
+
+    def fetch():
+        start.wait()
+        results.append(cache.get_or_compute('report', compute))
+
+    _run_concurrently(fetch, 8)
+    assert len(calls) == 1 and results == [b'{"ok": true}'] * 8
+
+
+def test_cors_preflight_is_answered_before_routing(client, seed, auth_headers, query_counter):
+    preflight = {'Origin': 'http://localhost:3000', 'Access-Control-Request-Method': 'POST',
+                 'Access-Control-Request-Headers': 'Authorization, Content-Type'}
+    with query_counter() as queries:
+        response = client.options('/api/store/stock', headers=preflight)
+    assert response.status_code == 204 and queries.count == 0
+    assert response.headers['Access-Control-Allow-Origin'] == 'http://localhost:3000'
+    assert response.headers['Access-Control-Max-Age'] == '7200'
+    assert client.options('/api/auth/login', headers={**preflight, 'Origin': 'https://evil.example'}) \
+        .headers.get('Access-Control-Allow-Origin') is None
+
+    actual = client.get(f"/api/store/stock/{seed['store']}",
+                        headers={**auth_headers(seed['admin']), 'Origin': 'http://localhost:3000'})
+    assert actual.status_code == 200
+    assert actual.headers.getlist('Access-Control-Allow-Origin') == ['http://localhost:3000']
+
+
+def _read_stream(response):
+    """Frames up to the first heartbeat, i.e. everything already queued for this client."""
+    frames = []
+    for chunk in response.response:
+        frame = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if frame.startswith(': heartbeat'):
+            break
+        frames.append(frame)
+    response.close()
+    return frames
+
+
+def test_change_stream_replays_only_the_clients_store(app, client, seed, auth_headers):
+    from app.models import Store
+
+    app.config['SSE_HEARTBEAT'] = 0.05
+    other = Store(name='Other Store', merchant_id=seed['merchant'])
+    db.session.add(other)
+    db.session.commit()
+    db.session.add(Product(name='Elsewhere', buying_price=1, selling_price=2, store_id=other.id))
+    db.session.commit()
+
+    payload = {'item': 'Salt', 'quantity': 3, 'buying_price': 1.0, 'selling_price': 2.0, 'store_id': seed['store']}
+    assert client.post('/api/store/stock', json=payload, headers=auth_headers(seed['clerk'])).status_code == 201
+    product_id = db.session.execute(db.select(Product.id).filter_by(name='Salt')).scalar_one()
+    assert client.put(f'/api/store/stock/payment/{product_id}', json={'payment_status': 'paid'},
+                      headers=auth_headers(seed['admin'])).status_code == 200
+
+    ticket = client.post('/api/store/stream/ticket', headers=auth_headers(seed['clerk'])).json['ticket']
+    response = client.get(f'/api/store/stream?ticket={ticket}', headers={'Last-Event-ID': '0'}, buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    frames = _read_stream(response)
+
+    assert frames[0].startswith('retry:')
+    events = [frame for frame in frames[1:] if 'event: product' in frame]
+    assert len(events) == 2 and all(f'"id": {product_id}' in frame for frame in events)
+    assert '"payment_status": "paid"' in events[-1]
+
+    last_id = events[0].split('\n')[0].split(': ')[1]
+    resumed = _read_stream(client.get('/api/store/stream', headers={**auth_headers(seed['clerk']),
+                                                                      'Last-Event-ID': last_id}, buffered=False))
+    assert resumed[1:] == events[1:]
+
+
+def test_streams_are_capped_and_end_when_the_session_does(app, client, seed, auth_headers):
+    from datetime import datetime, timedelta
+    import jwt
+    from app.models import User
+    from app.principal_cache import principal_cache
+
+    app.config.update(SSE_HEARTBEAT=0.05, SSE_AUTH_RECHECK=0.05)
+    headers = auth_headers(seed['clerk'])
+    token = headers['Authorization'].split()[1]
+    assert client.get(f'/api/store/stream?access_token={token}').status_code == 401  # Bearer tokens stay out of URLs
+    ticket = client.post('/api/store/stream/ticket', headers=headers).json['ticket']
+    assert client.get('/api/store/stock/1', headers={'Authorization': f'Bearer {ticket}'}).status_code == 401
+
+    # One stream per process here: the second client is turned away instead of taking a thread
+    app.extensions['change_bus'].max_subscribers = 1
+    first = client.get(f'/api/store/stream?ticket={ticket}', buffered=False)
+    busy = client.get('/api/store/stream', headers=headers)
+    assert busy.status_code == 503 and busy.headers['Retry-After'] == '3'
+    first.close()
+    second = client.get('/api/store/stream', headers=headers, buffered=False)
+    assert second.status_code == 200  # Closing the first freed its slot
+    second.close()
+    app.extensions['change_bus'].max_subscribers = None
+
+    # The stream ends with the bearer token it was opened with...
+    expiring = jwt.encode({'user_id': seed['clerk'], 'exp': datetime.utcnow() + timedelta(seconds=1)},
+                          app.config['SECRET_KEY'], algorithm='HS256')
+    started = time.monotonic()
+    frames = list(client.get('/api/store/stream', headers={'Authorization': f'Bearer {expiring}'}).response)
+    assert frames[-1] == b'event: reauth\ndata: {}\n\n' and time.monotonic() - started < 5
+
+    # ...or once the user is deactivated
+    response = client.get(f'/api/store/stream?ticket={ticket}', buffered=False)
+    stream = iter(response.response)
+    assert next(stream).startswith(b'retry:')
+    db.session.get(User, seed['clerk']).is_active = False
+    db.session.commit()
+    principal_cache.invalidate(seed['clerk'])
+    assert list(stream)[-1] == b'event: reauth\ndata: {}\n\n'
+    response.close()
+
+
+def test_slow_stream_client_is_told_to_resync():
+    from app.change_stream import ChangeBus, ChangeEvent, RESYNC
+
+    bus = ChangeBus(history=3, buffer_size=2)
+    subscription = bus.subscribe({1})
+    bus.publish([ChangeEvent(None, 'product', 1, {'id': n}) for n in range(3)])
+    assert subscription.next(0) is RESYNC  # Backlog was dropped rather than grown
+    assert subscription.next(0) is None
+
+    bus.publish([ChangeEvent(None, 'product', 2, {'id': 9})])
+    assert subscription.next(0) is None  # Another store's change never reaches it
+
+    assert bus.subscribe({1}, last_event_id=0).next(0) is RESYNC  # Event 1 fell out of history
+
+
+def test_sole_subscriber_on_the_sqlite_log_gets_live_events_once(tmp_path):
+    from app.change_stream import ChangeBus, ChangeEvent, SQLiteChangeLog
+
+    log = SQLiteChangeLog(str(tmp_path / 'stream' / 'change_stream.db'))
+    assert not (tmp_path / 'stream').exists()  # Opened on first use, not at create_app time
+    bus = ChangeBus(log, poll_interval=0.01)
+    bus.publish([ChangeEvent(None, 'product', 1, {'id': 1})])
+
+    first = bus.subscribe({1})  # The only subscriber: the tail must still see it
+    bus.publish([ChangeEvent(None, 'product', 1, {'id': 2})])
+    live = first.next(2)
+    assert live is not None and live.data == {'id': 2}
+
+    resumed = bus.subscribe({1}, last_event_id=live.id - 1)
+    bus.publish([ChangeEvent(None, 'product', 1, {'id': 3})])
+    assert [resumed.next(2).data, resumed.next(2).data] == [{'id': 2}, {'id': 3}]
+    assert resumed.next(0.1) is None  # Replayed once, never again by the tail
+
+    bus.unsubscribe(first)
+    bus.unsubscribe(resumed)
+
+
+def test_invite_mail_is_queued_and_sent_in_one_smtp_session(app, client, seed, auth_headers, smtp_server):
+    from app.models import OutboxMessage
+    from app.mail_outbox import OutboxSender
+
+    app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=smtp_server.server_address[1], MAIL_USE_TLS=False,
+                      MAIL_USERNAME=None, MAIL_DEFAULT_SENDER='noreply@example.com')
+    for n in range(3):
+        response = client.post('/api/invite/admin', json={'email': f'admin{n}@example.com'},
+                               headers=auth_headers(seed['merchant']))
+        assert response.status_code == 200
+
+    assert smtp_server.messages == []  # The request only wrote an outbox row
+    assert OutboxSender(app).run(once=True) == {'sent': 3, 'retried': 0, 'failed': 0}
+    assert smtp_server.connections == 1
+    assert [m['to'] for m in smtp_server.messages] == [[f'admin{n}@example.com'] for n in range(3)]
+    body = email.message_from_string(smtp_server.messages[-1]['data']).get_payload(decode=True).decode()
+    assert response.get_json()['token'] in body
+    db.session.expire_all()
+    assert {m.status for m in OutboxMessage.query} == {'sent'}
+
+
+def test_outbox_retries_with_backoff_and_fails_bounces(app, smtp_server):
+    from datetime import datetime
+    from app.models import OutboxMessage
+    from app.mail_outbox import OutboxSender, queue_mail
+
+    app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=smtp_server.server_address[1], MAIL_USE_TLS=False,
+                      MAIL_USERNAME=None, MAIL_DEFAULT_SENDER='noreply@example.com', MAIL_OUTBOX_BACKOFF_BASE=30)
+    queue_mail('bounce@example.com', 'Hi', 'Body')
+    queue_mail('ok@example.com', 'Hi', 'Body')
+    db.session.commit()
+
+    assert OutboxSender(app).run(once=True) == {'sent': 1, 'retried': 0, 'failed': 1}
+
+    queue_mail('later@example.com', 'Hi', 'Body')
+    db.session.commit()
+    app.config['MAIL_PORT'] = 1  # Nothing listens there
+    started = datetime.utcnow()
+    assert OutboxSender(app).run(once=True) == {'sent': 0, 'retried': 1, 'failed': 0}
+
+    db.session.expire_all()
+    later = OutboxMessage.query.filter_by(recipient='later@example.com').one()
+    assert later.status == 'pending' and later.attempts == 1 and later.last_error
+    assert 29 <= (later.next_attempt_at - started).total_seconds() <= 31
+    assert OutboxMessage.query.filter_by(recipient='bounce@example.com').one().status == 'failed'
+
+
+def test_outbox_sender_survives_a_failed_round(app, smtp_server):
+    from sqlalchemy.exc import OperationalError
+    from app.mail_outbox import OutboxSender, queue_mail
+
+    app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=smtp_server.server_address[1], MAIL_USE_TLS=False,
+                      MAIL_USERNAME=None, MAIL_DEFAULT_SENDER='noreply@example.com', MAIL_OUTBOX_POLL_INTERVAL=0.05)
+    queue_mail('ok@example.com', 'Hi', 'Body')
+    db.session.commit()
+
+    sender = OutboxSender(app)
+    claim, calls = sender.claim, []
+
+    def locked_once():
+        calls.append(1)
+        if len(calls) == 1:
+            raise OperationalError('UPDATE outbox', {}, Exception('database is locked'))
+        return claim()
+
+    sender.claim = locked_once
+    with pytest.raises(OperationalError):
+        sender.run(once=True)  # The CLI reports the error instead of looping on it
+
+    calls.clear()
+    stop = threading.Event()
+    thread = threading.Thread(target=sender.run, kwargs={'stop': stop}, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while not smtp_server.messages and time.monotonic() < deadline:
+        time.sleep(0.02)
+    stop.set()
+    thread.join(5)
+
+    assert [m['to'] for m in smtp_server.messages] == [['ok@example.com']]
+    assert len(calls) >= 2 and not thread.is_alive()
+
+
+def test_boot_is_fast_and_side_effect_free(tmp_path):
+    database = tmp_path / 'boot.db'
+    env = {key: value for key, value in os.environ.items() if not key.startswith('MAIL_')}  # No mail credentials
+    env['DATABASE_URL'] = f'sqlite:///{database}'
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    runs = [json.loads(subprocess.run([sys.executable, '-c', BOOT_SCRIPT], cwd=root, env=env, check=True,
+                                      capture_output=True, text=True).stdout) for _ in range(3)]
+
+    assert min(run['seconds'] for run in runs) < BOOT_BUDGET_SECONDS, runs
+    assert runs[0]['loaded'] == []  # Alembic, Flask-Mail and dotenv stay out of the serving path
+    assert not database.exists()  # No connection, no create_all
+
+
+def test_run_py_serves_the_app_factory_app(tmp_path):
+    result = _run_py(RUN_PY_ROUTES_SCRIPT, tmp_path)
+
+    assert result['same']  # Same routes: nothing is registered only in run.py, or missing from it
+    assert {'FRONTEND_URL', 'PRINCIPAL_CACHE_TTL', 'RESPONSE_CACHE_BACKEND', 'MAIL_OUTBOX_WORKER'} <= set(result['config'])
+
+
+def test_registration_mail_under_run_py_links_the_frontend(tmp_path):
+    result = _run_py(RUN_PY_REGISTER_SCRIPT, tmp_path, FRONTEND_URL='https://shop.example.com')
+
+    assert result['status'] == 201
+    assert len(result['bodies']) == 1 and 'Sign in at https://shop.example.com/login' in result['bodies'][0]
+
+
+def test_seed_py_leaves_a_database_at_the_migration_head(tmp_path):
+    from app.startup import migration_heads
+
+    assert _run_py(SEED_PY_SCRIPT, tmp_path) == sorted(migration_heads())
+    assert _run_py(SEED_PY_SCRIPT, tmp_path) == sorted(migration_heads())  # Seeding again appends to it
+
+
+def test_schema_check_rejects_an_unmigrated_database(app):
+    with pytest.raises(SchemaOutOfDate, match='flask db upgrade'):
+        check_schema(app)
+
+
+def test_product_search_ranks_prefix_and_typo_matches_in_one_store(client, seed, auth_headers):
+    from app.models import Store
+
+    other = Store(name='Other Store', merchant_id=seed['merchant'])
+    db.session.add(other)
+    db.session.commit()
+    names = ['Rice', 'Rice 1kg', 'Brown Rice 2kg', 'Rich Tea Biscuits', 'Sugar 1kg', 'Price Tags']
+    db.session.add_all([Product(name=name, buying_price=1, selling_price=2, store_id=seed['store']) for name in names])
+    db.session.add(Product(name='Rice 5kg', buying_price=1, selling_price=2, store_id=other.id))
+    db.session.commit()
+    headers = auth_headers(seed['clerk'])
+
+    def search(query, **params):
+        response = client.get(f"/api/store/{seed['store']}/products/search", query_string={'q': query, **params},
+                              headers=headers)
+        assert response.status_code == 200
+        return [(result['name'], result['match']) for result in response.get_json()['results']]
+
+    assert search('rice') == [('Rice', 'exact'), ('Rice 1kg', 'prefix'), ('Brown Rice 2kg', 'words'),
+                              ('Rich Tea Biscuits', 'fuzzy')]
+    assert search('ric', limit=1) == [('Rice', 'prefix')]
+    assert search('sugr 1k') == [('Sugar 1kg', 'fuzzy')]
+    assert search('rice 5') == []  # Only in the other store
+
+    # Triggers keep the index in step with renames and deletes
+    product = Product.query.filter_by(name='Price Tags').one()
+    product.name = 'Maize Flour'
+    db.session.delete(Product.query.filter_by(name='Rice 1kg').one())
+    db.session.commit()
+    assert search('maize') == [('Maize Flour', 'prefix')]
+    assert search('price') == []
+    assert ('Rice 1kg', 'prefix') not in search('rice')
+
+    assert client.get(f"/api/store/{other.id}/products/search?q=rice", headers=headers).status_code == 403
+    assert client.get(f"/api/store/{seed['store']}/products/search", headers=headers).status_code == 400
+
+
+def test_product_report_rankings_respect_limit_scope_and_tie_order(client, seed, auth_headers):
+    from werkzeug.datastructures import MultiDict
+    from app.models import Store
+    from app.reports import ranking_args, MAX_RANKING_LIMIT
+
+    other = Store(name='Other Store', merchant_id=seed['merchant'])
+    db.session.add(other)
+    db.session.flush()
+    stock = [3, 3, 3, 1, 9, 9, 2]
+    products = [Product(name=f'Item {i}', buying_price=1, selling_price=1, stock_quantity=quantity,
+                        spoiled_quantity=i % 2, store_id=seed['store']) for i, quantity in enumerate(stock)]
+    products.append(Product(name='Elsewhere', buying_price=1, selling_price=1, stock_quantity=0, spoiled_quantity=5,
+                            store_id=other.id))
+    db.session.add_all(products)
+    db.session.commit()
+    ids = [product.id for product in products]
+    headers = auth_headers(seed['admin'])
+
+    def report(**params):
+        response = client.get('/api/report/products', query_string=params, headers=headers)
+        return response.status_code, response.get_json()
+
+    status, body = report()
+    assert status == 200 and all(len(body[key]) == 5 for key in ('top_selling', 'low_stock', 'spoiled_products'))
+
+    # Equal values keep id order, whatever order the index hands them back in
+    status, body = report(store_id=seed['store'])
+    assert [p['id'] for p in body['low_stock']] == [ids[3], ids[6], ids[0], ids[1], ids[2]]
+    assert [p['id'] for p in body['top_selling']] == [ids[4], ids[5], ids[0], ids[1], ids[2]]
+    assert [p['id'] for p in body['spoiled_products']][:3] == [ids[1], ids[3], ids[5]]
+
+    status, body = report(store_id=other.id, limit=2)
+    assert [p['name'] for p in body['low_stock']] == ['Elsewhere']
+    assert len(report(limit=2)[1]['top_selling']) == 2
+
+    for params in ({'limit': 0}, {'limit': 'ten'}, {'store_id': 'main'}):
+        status, body = report(**params)
+        assert status == 400, params
+    assert ranking_args(MultiDict({'limit': '100000'}))[0] == MAX_RANKING_LIMIT
+
+
+def test_principal_cache_hits_expires_and_rejects_deactivated_users(app, client, seed, auth_headers):
+    from app.models import User
+    from app.principal_cache import principal_cache
+
+    app.config['PRINCIPAL_CACHE_TTL'] = 0.2
+    headers = auth_headers(seed['admin'])
+    clerk_headers = auth_headers(seed['clerk'])
+
+    before = principal_cache.stats()
+    assert client.get('/api/users', headers=headers).status_code == 200
+    assert client.get('/api/users', headers=headers).status_code == 200
+    after = principal_cache.stats()
+    assert (after['misses'] - before['misses'], after['hits'] - before['hits']) == (1, 1)
+
+    # Deactivated through the API: this process drops the cached principal at once
+    assert client.get('/api/users', headers=clerk_headers).status_code == 403  # Role check, principal now cached
+    assert client.put(f"/api/user/{seed['clerk']}/status", json={'is_active': False}, headers=headers).status_code == 200
+    response = client.get(f"/api/store/stock/{seed['store']}", headers=clerk_headers)
+    assert response.status_code == 403 and response.get_json()['message'] == 'Account is deactivated!'
+
+    # Changed behind this process's back (another worker): admitted until the TTL runs out, never longer
+    db.session.execute(db.update(User).where(User.id == seed['clerk']).values(is_active=True))
+    db.session.commit()
+    assert client.get(f"/api/store/stock/{seed['store']}", headers=clerk_headers).status_code == 403
+    time.sleep(0.25)
+    assert client.get(f"/api/store/stock/{seed['store']}", headers=clerk_headers).status_code == 200
+
+
+def test_login_rehashes_passwords_made_with_old_parameters(app, client, seed):
+    from werkzeug.security import generate_password_hash
+    from app.models import User
+
+    user = db.session.get(User, seed['admin'])
+    user.password_hash = generate_password_hash('s3cret', 'pbkdf2:sha256:1000')
+    db.session.commit()
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+
+    assert client.post('/api/auth/login', json={'email': 'admin@example.com', 'password': 's3cret'}).status_code == 200
+    db.session.expire_all()
+    assert db.session.get(User, seed['admin']).password_hash.startswith('pbkdf2:sha256:2000$')
+    assert client.post('/api/auth/login', json={'email': 'admin@example.com', 'password': 's3cret'}).status_code == 200
+    assert client.post('/api/auth/login', json={'email': 'admin@example.com', 'password': 'wrong'}).status_code == 401
+
+
+def test_saturated_hashing_pool_answers_503_and_keeps_the_slot_until_the_worker_finishes(app, client, seed):
+    from werkzeug.security import generate_password_hash
+    from app.models import User
+    from app.password_hashing import password_hasher, HashingPoolBusy
+
+    user = db.session.get(User, seed['admin'])
+    user.password_hash = generate_password_hash('s3cret', 'pbkdf2:sha256:2000000')  # ~1s to verify
+    db.session.commit()
+    app.config.update(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_MAX_PENDING=1, PASSWORD_HASH_TIMEOUT=0.05,
+                      PASSWORD_HASH_RETRY_AFTER=3)
+    try:
+        response = client.post('/api/auth/login', json={'email': 'admin@example.com', 'password': 's3cret'})
+        assert response.status_code == 503 and response.headers['Retry-After'] == '3'
+
+        # The timed-out verify is still running in the pool, so its slot is still taken
+        app.config['PASSWORD_HASH_TIMEOUT'] = 30
+        started = time.monotonic()
+        with pytest.raises(HashingPoolBusy):
+            password_hasher.hash('other')
+        assert time.monotonic() - started < 0.5
+
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                assert password_hasher.verify(generate_password_hash('x', 'pbkdf2:sha256:1000'), 'x')
+                break
+            except HashingPoolBusy:
+                assert time.monotonic() < deadline, 'slot was never released'
+                time.sleep(0.05)
+    finally:
+        password_hasher.shutdown()
+
+
+def test_listings_paginate_by_cursor_and_project_fields(client, seed, auth_headers):
+    from app.pagination import MAX_PAGE_SIZE, encode_cursor
+    from app.models import User
+
+    db.session.add_all([Product(name=f'Item {i:02}', buying_price=1, selling_price=2, stock_quantity=i,
+                                store_id=seed['store']) for i in range(7)])
+    db.session.add_all([User(username=f'clerk{i}', email=f'clerk{i}@example.com', password_hash='x', role='clerk')
+                        for i in range(4)])
+    db.session.commit()
+    headers = auth_headers(seed['merchant'])
+
+    def get(url, **params):
+        response = client.get(url, query_string=params, headers=headers)
+        return response.status_code, response.get_json()
+
+    # Walk every page: each product once, in id order, until has_more is false
+    seen, cursor = [], None
+    while True:
+        status, page = get('/api/products', limit=3, fields='id,name', **({'cursor': cursor} if cursor else {}))
+        assert status == 200 and all(set(item) == {'id', 'name'} for item in page['items'])
+        seen += [item['name'] for item in page['items']]
+        cursor = page['pagination']['next_cursor']
+        assert page['pagination']['has_more'] == (cursor is not None)
+        if cursor is None:
+            break
+    assert seen == [f'Item {i:02}' for i in range(7)]
+    assert len(page['items']) == 1
+
+    status, page = get('/api/users', role='clerk', limit=2)
+    assert [user['username'] for user in page['items']] == ['clerk', 'clerk0']
+    status, page = get('/api/users', role='clerk', limit=2, cursor=page['pagination']['next_cursor'])
+    assert [user['username'] for user in page['items']] == ['clerk1', 'clerk2']
+    assert set(page['items'][0]) == {'id', 'username', 'email', 'role', 'is_active'}
+
+    assert get('/api/products', limit=10**6)[1]['pagination']['limit'] == MAX_PAGE_SIZE
+    assert get('/api/products')[1][0].keys() == {'id', 'name', 'buying_price', 'selling_price', 'stock_quantity',
+                                                 'store_id'}  # No pagination args: the plain list as before
+    for params in ({'cursor': 'not-a-cursor'}, {'limit': 0}, {'limit': 'ten'}, {'fields': 'id,password_hash'}):
+        assert get('/api/products', **params)[0] == 400, params
+    for key in ('3', [3], {'id': 3}, True, 1.5, None):  # Well-formed cursors with a tampered key
+        assert get('/api/products', cursor=encode_cursor(key))[0] == 400, key
+    assert get('/api/users', fields='password_hash')[0] == 400
+
+
+def test_exports_stream_every_row_as_ndjson_csv_and_gzip(app, client, seed, auth_headers, tmp_path):
+    import csv
+    import io
+    import zlib
+    from app.exports import EXPORT_BATCH_SIZE, export_command
+
+    total = 2 * EXPORT_BATCH_SIZE + 17  # Crosses yield_per partitions and output batches
+    db.session.execute(db.insert(Product), [
+        {'name': f'Item {i}', 'buying_price': 1, 'selling_price': 2, 'stock_quantity': i, 'store_id': seed['store']}
+        for i in range(total)
+    ])
+    db.session.commit()
+    headers = auth_headers(seed['admin'])
+
+    response = client.get('/api/export/products', headers=headers)
+    assert response.status_code == 200 and response.is_streamed
+    assert response.mimetype == 'application/x-ndjson'
+    ndjson = response.get_data()
+    rows = [json.loads(line) for line in ndjson.decode().splitlines()]
+    assert [row['name'] for row in rows] == [f'Item {i}' for i in range(total)]
+    assert rows[5]['stock_quantity'] == 5 and rows[5]['updated_at'].startswith('20')
+
+    response = client.get('/api/export/products?format=csv', headers=headers)
+    assert response.mimetype == 'text/csv'
+    table = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert table[0][:2] == ['id', 'name'] and len(table) == total + 1
+    assert len({row[0] for row in table[1:]}) == total
+
+    response = client.get('/api/export/products?gzip=1', headers=headers)
+    assert response.mimetype == 'application/gzip'
+    assert response.headers['Content-Disposition'] == 'attachment; filename="products.ndjson.gz"'
+    assert zlib.decompress(response.get_data(), 31) == ndjson
+
+    assert client.get('/api/export/products?format=xml', headers=headers).status_code == 400
+    assert client.get('/api/export/supply-requests', headers=auth_headers(seed['merchant'])).status_code == 403
+
+    output = tmp_path / 'products.csv.gz'
+    result = app.test_cli_runner().invoke(export_command, ['products', '--format', 'csv', '--gzip', '-o', str(output)])
+    assert result.exit_code == 0, result.output
+    assert zlib.decompress(output.read_bytes(), 31).decode() == '\r\n'.join(','.join(row) for row in table) + '\r\n'
+
+
+def test_bulk_stock_reports_each_row_and_merges_duplicate_items(client, seed, auth_headers):
+    import io
+
+    sugar = Product(name='Sugar', buying_price=1, selling_price=2, stock_quantity=None, store_id=seed['store'])
+    db.session.add(sugar)
+    db.session.commit()
+    headers = auth_headers(seed['clerk'])
+    row = {'buying_price': 1.5, 'selling_price': 3.0, 'store_id': seed['store']}
+
+    response = client.post('/api/store/stock/bulk', headers=headers, json={'items': [
+        dict(row, item='Sugar', quantity=2),
+        dict(row, item='Flour', quantity=4),
+        dict(row, item='Sugar', quantity=3),
+        dict(row, item='Salt', quantity='lots'),
+        {'item': 'Oil'},
+    ]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['created'], body['updated'], body['failed']) == (1, 2, 2)
+    assert [result['status'] for result in body['results']] == ['updated', 'created', 'updated', 'error', 'error']
+    assert body['results'][0]['product_id'] == body['results'][2]['product_id'] == sugar.id
+    assert body['results'][4]['message'].startswith('Missing field')
+
+    db.session.expire_all()
+    assert db.session.get(Product, sugar.id).stock_quantity == 5  # A NULL stock counts as 0, not as "unknown"
+    assert Product.query.filter_by(name='Flour').one().stock_quantity == 4
+
+    csv_text = f"item,quantity,buying_price,selling_price,store_id\nFlour,6,1.5,3.0,{seed['store']}\n"
+    upload = {'file': (io.BytesIO(csv_text.encode('utf-8-sig')), 'stock.csv')}  # With the BOM Excel writes
+    assert client.post('/api/store/stock/bulk', headers=headers, data=upload).get_json()['updated'] == 1
+    response = client.post('/api/store/stock/bulk', headers=headers, data=csv_text, content_type='text/csv')
+    assert [(r['row'], r['status']) for r in response.get_json()['results']] == [(0, 'updated')]
+    db.session.expire_all()
+    assert Product.query.filter_by(name='Flour').one().stock_quantity == 16
+
+    latin1 = 'item,quantity,buying_price,selling_price,store_id\nCafé,1,1,2,1\n'.encode('latin-1')
+    response = client.post('/api/store/stock/bulk', headers=headers, data={'file': (io.BytesIO(latin1), 'stock.csv')})
+    assert response.status_code == 400
+    assert client.post('/api/store/stock/bulk', headers=headers, json=[]).status_code == 400
+    assert find_drift() == []
+
+
+def test_requests_are_timed_and_metrics_need_the_scrape_token(app, client, seed, auth_headers):
+    import re
+
+    def count(text):
+        match = re.search(r'http_request_sql_statements_count\{[^}]*endpoint="store.view_stock_by_store"'
+                          r',method="GET",status="200"\} (\d+)', text)
+        return int(match.group(1)) if match else 0
+
+    assert client.get('/metrics').status_code == 404  # Off until a token is configured
+    app.config['METRICS_TOKEN'] = 'scrape-me'
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    scrape = {'Authorization': 'Bearer scrape-me'}
+    before = count(client.get('/metrics', headers=scrape).get_data(as_text=True))
+
+    response = client.get(f"/api/store/stock/{seed['store']}", headers=auth_headers(seed['admin']))
+    assert response.status_code == 200
+    assert re.fullmatch(r'app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries"', response.headers['Server-Timing'])
+
+    response = client.get('/metrics', headers=scrape)
+    assert response.status_code == 200 and response.mimetype == 'text/plain'
+    assert count(response.get_data(as_text=True)) == before + 1
+    assert 'http_request_duration_seconds_bucket{blueprint="store",endpoint="store.view_stock_by_store"' \
+        in response.get_data(as_text=True)
@@ -0,0 +1,16 @@
+"""WSGI entry point: ``gunicorn -c gunicorn.conf.py wsgi:app``.
+
+Loads .env, builds the app and checks the schema revision once. With
+``preload_app`` (the default in gunicorn.conf.py) that happens in the master
+only, and workers fork from an app that is already built.
+"""
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app import create_app  # noqa: E402 (after .env is loaded)
+from app.startup import check_schema, dispose_engines  # noqa: E402
+
+app = create_app()
+check_schema(app)
+dispose_engines(app)  # Don't hand the schema check's connection down to the workers